@@ -0,0 +1,265 @@
+"""Utilization and demand analytics over the loan history (needs NumPy).
+
+All loans overlapping the analysed period are read in one pass per ledger
+table straight into NumPy arrays (np.fromiter over the cursor, dates
+already turned into day numbers by SQLite), and every figure is computed
+with array operations instead of per-row Python:
+
+* utilization per item and per location: unit-days on loan divided by
+  unit-days owned over the period;
+* loan durations of returned loans: percentiles and a histogram;
+* peak concurrent demand per item: a sweep over +quantity/-quantity
+  events sorted per item, where one cumulative sum gives the running
+  demand of every item at once;
+* overdue rate per borrower.
+
+A returned loan ends on the day it was returned (returned_at, also kept
+when the loan is archived). Loans closed without that date, e.g. imported
+or merged from another station, are assumed to have come back on their
+due date, so they never count as overdue. Open loans run until the end of
+the period.
+
+    python src/analytics.py --db inventaris.db --days 180
+    python src/analytics.py --json analitik.json --csv analitik/
+"""
+import argparse
+import csv
+import json
+import os
+import sqlite3
+from datetime import date, timedelta
+
+import numpy as np
+
+DEFAULT_PERIOD_DAYS = 365
+
+# Stock advice: an item that was fully lent out at some point is short,
+# one that is rarely used and never more than half out has too many units
+SHORT_PEAK_RATIO = 1.0
+SURPLUS_UTILIZATION = 0.10
+SURPLUS_PEAK_RATIO = 0.5
+ADVICE_SHORT = 'kurang'
+ADVICE_SURPLUS = 'berlebih'
+ADVICE_OK = 'cukup'
+
+DURATION_BINS = (0, 1, 2, 4, 8, 15, 31)
+DURATION_PERCENTILES = (50, 90, 99)
+
+LOAN_DTYPE = np.dtype([('item', 'i8'), ('borrower', 'i8'), ('quantity', 'i8'),
+                       ('start', 'i8'), ('end', 'i8'), ('due', 'i8'), ('returned', 'i1')])
+
+# Day numbers (julian day) so intervals are plain integer arithmetic
+_DAY = "CAST(julianday({}) AS INTEGER)"
+_RETURNED = _DAY.format('COALESCE(returned_at, due_date, date)')
+_LOANS = f'''
+    SELECT item_id, COALESCE(borrower_id, 0), quantity, {_DAY.format('date')},
+           CASE WHEN returned = 1 THEN {_RETURNED} ELSE :period_end END,
+           COALESCE({_DAY.format('due_date')}, -1), returned
+    FROM {{table}}
+    WHERE type = 'borrow' AND date <= :end_date
+      AND (returned = 0 OR {_RETURNED} >= :period_start)
+'''
+
+
+def _day(value):
+    """Same day number as _DAY gives in SQL"""
+    return date.fromisoformat(value).toordinal() + 1721424
+
+
+def load_loans(conn, start, end):
+    """Loans overlapping [start, end] (YYYY-MM-DD) as a structured array, hot and archived.
+
+    end is the day a returned loan came back; open loans get the day after
+    the period.
+    """
+    params = {'end_date': end, 'period_start': _day(start), 'period_end': _day(end) + 1}
+    parts = []
+    for table in ('transactions', 'transactions_archive'):
+        cursor = conn.execute(_LOANS.format(table=table), params)
+        parts.append(np.fromiter(cursor, dtype=LOAN_DTYPE))
+    return np.concatenate(parts)
+
+
+def load_items(conn):
+    """Active items: ids (sorted), names, locations and owned units (stock + on loan)"""
+    rows = conn.execute('''
+        SELECT i.id, i.name, COALESCE(i.location, ''), i.quantity + COALESCE((
+            SELECT SUM(t.quantity) FROM transactions t
+            WHERE t.item_id = i.id AND t.type = 'borrow' AND t.returned = 0
+        ), 0)
+        FROM items i WHERE i.deleted_at IS NULL ORDER BY i.id
+    ''').fetchall()
+    ids = np.array([row[0] for row in rows], dtype=np.int64)
+    owned = np.array([row[3] for row in rows], dtype=np.int64)
+    return ids, [row[1] for row in rows], [row[2] for row in rows], owned
+
+
+def _item_index(ids, item):
+    """Position of each loan's item in ids, -1 for items that are gone"""
+    index = np.searchsorted(ids, item)
+    index = np.minimum(index, max(len(ids) - 1, 0))
+    found = (ids[index] == item) if len(ids) else np.zeros(len(item), dtype=bool)
+    return np.where(found, index, -1)
+
+
+def peak_demand(index, start, end, quantity, count):
+    """Highest number of units lent out at the same time, per item index"""
+    peaks = np.zeros(count, dtype=np.int64)
+    if not len(index):
+        return peaks
+    items = np.concatenate([index, index])
+    days = np.concatenate([start, end])
+    deltas = np.concatenate([quantity, -quantity])
+    # Per item, by day; on the same day returns (-) come before new loans (+)
+    order = np.lexsort((deltas, days, items))
+    items, deltas = items[order], deltas[order]
+    # Every item's events sum to zero, so one cumulative sum is the running
+    # demand of each item within its own group
+    running = np.cumsum(deltas)
+    starts = np.flatnonzero(np.r_[True, items[1:] != items[:-1]])
+    peaks[items[starts]] = np.maximum.reduceat(running, starts)
+    return peaks
+
+
+def analyse(conn, start=None, end=None):
+    """Compute every figure for [start, end]; defaults to the last DEFAULT_PERIOD_DAYS days"""
+    end = end or date.today().isoformat()
+    start = start or (date.fromisoformat(end) - timedelta(days=DEFAULT_PERIOD_DAYS)).isoformat()
+    period_start, period_end = _day(start), _day(end) + 1
+    period_days = period_end - period_start
+
+    ids, names, locations, owned = load_items(conn)
+    loans = load_loans(conn, start, end)
+    index = _item_index(ids, loans['item'])
+    known = index >= 0
+    loans, index = loans[known], index[known]
+
+    # Part of each loan inside the period; a loan returned the day it was
+    # taken still kept the unit for that day
+    first = np.maximum(loans['start'], period_start)
+    last = np.minimum(np.maximum(loans['end'], loans['start'] + 1), period_end)
+    inside = last > first
+    unit_days = loans['quantity'] * np.where(inside, last - first, 0)
+
+    used = np.bincount(index, weights=unit_days, minlength=len(ids))
+    capacity = owned * period_days
+    with np.errstate(divide='ignore', invalid='ignore'):
+        utilization = np.where(capacity > 0, used / capacity, 0.0)
+    peaks = peak_demand(index[inside], first[inside], last[inside],
+                        loans['quantity'][inside], len(ids))
+
+    short = peaks >= np.maximum(owned * SHORT_PEAK_RATIO, 1)
+    surplus = ~short & (utilization < SURPLUS_UTILIZATION) & (peaks <= owned * SURPLUS_PEAK_RATIO)
+    advice = np.where(short, ADVICE_SHORT, np.where(surplus, ADVICE_SURPLUS, ADVICE_OK))
+    items = [{
+        'item_id': int(ids[i]), 'name': names[i], 'location': locations[i],
+        'owned': int(owned[i]), 'utilization': round(float(utilization[i]), 4),
+        'peak_demand': int(peaks[i]), 'advice': str(advice[i]),
+    } for i in range(len(ids))]
+
+    # Per location: the same ratio over all its items
+    location_names, location_index = np.unique(np.array(locations, dtype=object).astype(str),
+                                               return_inverse=True)
+    location_used = np.bincount(location_index, weights=used, minlength=len(location_names))
+    location_capacity = np.bincount(location_index, weights=capacity, minlength=len(location_names))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        location_utilization = np.where(location_capacity > 0, location_used / location_capacity, 0.0)
+    by_location = [{'location': str(location_names[i]),
+                    'utilization': round(float(location_utilization[i]), 4)}
+                   for i in range(len(location_names))]
+
+    # Durations of loans returned inside the period
+    closed = (loans['returned'] == 1) & (loans['end'] <= period_end)
+    durations = loans['end'][closed] - loans['start'][closed]
+    edges = list(DURATION_BINS) + [max(DURATION_BINS[-1], int(durations.max(initial=0))) + 1]
+    counts, _ = np.histogram(durations, bins=edges)
+    bins = [f"{low}-{high - 1}" for low, high in zip(DURATION_BINS, DURATION_BINS[1:])]
+    bins.append(f">={DURATION_BINS[-1]}")
+    duration_summary = {
+        'loans': int(len(durations)),
+        'mean_days': round(float(durations.mean()), 2) if len(durations) else None,
+        **{f'p{p}_days': float(np.percentile(durations, p)) if len(durations) else None
+           for p in DURATION_PERCENTILES},
+        'histogram': dict(zip(bins, (int(c) for c in counts))),
+    }
+
+    # Overdue: returned after the due date, or still out past it
+    has_due = loans['due'] >= 0
+    today = min(_day(date.today().isoformat()), period_end)
+    overdue = has_due & np.where(loans['returned'] == 1, loans['end'] > loans['due'],
+                                 today > loans['due'])
+    borrower_ids, borrower_index = np.unique(loans['borrower'], return_inverse=True)
+    loan_counts = np.bincount(borrower_index, minlength=len(borrower_ids))
+    overdue_counts = np.bincount(borrower_index, weights=overdue, minlength=len(borrower_ids))
+    borrower_names = dict(conn.execute('SELECT id, name FROM borrowers'))
+    by_borrower = sorted(({
+        'borrower_id': int(borrower_ids[i]),
+        'name': borrower_names.get(int(borrower_ids[i]), '-'),
+        'loans': int(loan_counts[i]),
+        'overdue': int(overdue_counts[i]),
+        'overdue_rate': round(float(overdue_counts[i] / loan_counts[i]), 4),
+    } for i in range(len(borrower_ids))), key=lambda row: (-row['overdue_rate'], -row['loans']))
+
+    return {
+        'period': {'start': start, 'end': end, 'days': int(period_days)},
+        'items': items,
+        'locations': by_location,
+        'durations': duration_summary,
+        'borrowers': by_borrower,
+    }
+
+
+def export_json(report, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=4, ensure_ascii=False)
+
+
+def export_csv(report, directory):
+    """One CSV per table (items, locations, borrowers) in directory"""
+    os.makedirs(directory, exist_ok=True)
+    for table in ('items', 'locations', 'borrowers'):
+        rows = report[table]
+        with open(os.path.join(directory, f'{table}.csv'), 'w', newline='', encoding='utf-8-sig') as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]) if rows else ['-'])
+            writer.writeheader()
+            writer.writerows(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analitik pemakaian dan permintaan barang")
+    parser.add_argument('--db', default='inventaris.db')
+    parser.add_argument('--start', help='YYYY-MM-DD')
+    parser.add_argument('--end', help='YYYY-MM-DD (default hari ini)')
+    parser.add_argument('--days', type=int, help='periode dalam hari sampai --end')
+    parser.add_argument('--json', metavar='FILE')
+    parser.add_argument('--csv', metavar='DIR')
+    args = parser.parse_args()
+
+    start = args.start
+    if args.days and not start:
+        end = args.end or date.today().isoformat()
+        start = (date.fromisoformat(end) - timedelta(days=args.days)).isoformat()
+    conn = sqlite3.connect(args.db)
+    try:
+        report = analyse(conn, start, args.end)
+    except sqlite3.Error as e:
+        raise SystemExit(f"Gagal: {e}")
+    finally:
+        conn.close()
+
+    period = report['period']
+    print(f"Periode {period['start']} s.d. {period['end']} ({period['days']} hari)")
+    for row in report['items']:
+        if row['advice'] != ADVICE_OK:
+            print(f"  {row['name']} ({row['location']}): pemakaian {row['utilization']:.0%}, "
+                  f"puncak {row['peak_demand']}/{row['owned']} -> stok {row['advice']}")
+    durations = report['durations']
+    print(f"Lama pinjam: {durations['loans']} peminjaman, median {durations['p50_days']} hari")
+    if args.json:
+        export_json(report, args.json)
+    if args.csv:
+        export_csv(report, args.csv)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+"""Online backups and compact snapshots of inventaris.db.
+
+Backups are copied with SQLite's online backup API a few pages at a time, so
+other connections keep working while the copy runs. Snapshots use
+VACUUM INTO and produce a defragmented copy. Every file is written under a
+temporary name, checked with PRAGMA integrity_check and only then renamed,
+and older files are rotated away. Files go to a backups folder next to the
+database unless another folder is given.
+
+Run once, or keep running on a schedule:
+
+    python src/backup.py --db inventaris.db --dir backups --keep 7
+    python src/backup.py --snapshot --every 1440
+"""
+import argparse
+import glob
+import logging
+import os
+import sqlite3
+import time
+from datetime import datetime
+
+# Folder name, next to the database
+DEFAULT_BACKUP_DIR = 'backups'
+DEFAULT_KEEP = 7
+DEFAULT_PAGES_PER_STEP = 64
+DEFAULT_STEP_PAUSE = 0.005
+
+
+class BackupError(Exception):
+    """A backup or snapshot could not be created or failed verification"""
+
+
+def verify_database(path):
+    """Return True when PRAGMA integrity_check reports 'ok' for path"""
+    conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    try:
+        rows = conn.execute('PRAGMA integrity_check').fetchall()
+        return rows == [('ok',)]
+    except sqlite3.DatabaseError:
+        return False
+    finally:
+        conn.close()
+
+
+class BackupManager:
+    def __init__(self, db_name, backup_dir=None, keep=DEFAULT_KEEP,
+                 pages_per_step=DEFAULT_PAGES_PER_STEP, step_pause=DEFAULT_STEP_PAUSE):
+        self.db_name = db_name
+        # Not the working directory: the app can be started from anywhere
+        self.backup_dir = backup_dir or os.path.join(
+            os.path.dirname(os.path.abspath(db_name)), DEFAULT_BACKUP_DIR)
+        self.keep = keep
+        self.pages_per_step = pages_per_step
+        self.step_pause = step_pause
+
+    def _target_path(self, kind):
+        base = os.path.splitext(os.path.basename(self.db_name))[0]
+        # Microseconds, and a counter for clocks too coarse for them, so two
+        # backups in the same second do not replace each other
+        timestamp = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+        path = os.path.join(self.backup_dir, f'{base}-{kind}-{timestamp}.db')
+        counter = 1
+        while os.path.exists(path) or os.path.exists(path + '.tmp'):
+            path = os.path.join(self.backup_dir, f'{base}-{kind}-{timestamp}-{counter}.db')
+            counter += 1
+        return path
+
+    def _pattern(self, kind):
+        base = os.path.splitext(os.path.basename(self.db_name))[0]
+        return os.path.join(self.backup_dir, f'{base}-{kind}-*.db')
+
+    def online_backup(self, progress=None):
+        """Copy the live database with the backup API; returns the new file path"""
+        return self._create('backup', lambda tmp: self._copy_pages(tmp, progress))
+
+    def snapshot(self):
+        """Write a compacted copy with VACUUM INTO; returns the new file path"""
+        return self._create('snapshot', self._vacuum_into)
+
+    def _copy_pages(self, tmp_path, progress):
+        def step(status, remaining, total):
+            if progress:
+                progress(total - remaining, total)
+            # Give other connections a chance at the lock between steps
+            time.sleep(self.step_pause)
+
+        source = sqlite3.connect(self.db_name)
+        target = sqlite3.connect(tmp_path)
+        try:
+            source.backup(target, pages=self.pages_per_step, progress=step)
+        finally:
+            target.close()
+            source.close()
+
+    def _vacuum_into(self, tmp_path):
+        conn = sqlite3.connect(self.db_name)
+        try:
+            conn.execute('VACUUM INTO ?', (tmp_path,))
+        finally:
+            conn.close()
+
+    def _create(self, kind, write):
+        os.makedirs(self.backup_dir, exist_ok=True)
+        path = self._target_path(kind)
+        tmp_path = path + '.tmp'
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+        started = time.perf_counter()
+        try:
+            write(tmp_path)
+            if not verify_database(tmp_path):
+                raise BackupError(f"Verifikasi integritas gagal untuk {path}")
+            os.replace(tmp_path, path)
+        except (sqlite3.Error, OSError) as e:
+            raise BackupError(str(e)) from e
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        logging.info(f"{kind} {path} selesai dalam {time.perf_counter() - started:.2f} detik")
+        self.rotate(kind)
+        return path
+
+    def list_backups(self, kind='backup'):
+        """Existing files of one kind, newest first"""
+        return sorted(glob.glob(self._pattern(kind)), reverse=True)
+
+    def rotate(self, kind='backup'):
+        """Delete all but the newest `keep` files of one kind; returns removed paths"""
+        removed = self.list_backups(kind)[self.keep:]
+        for path in removed:
+            os.remove(path)
+        return removed
+
+    def run(self, snapshot=False, progress=None):
+        return self.snapshot() if snapshot else self.online_backup(progress)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backup database inventaris")
+    parser.add_argument('--db', default='inventaris.db')
+    parser.add_argument('--dir', help=f'folder backup (default: {DEFAULT_BACKUP_DIR} di samping database)')
+    parser.add_argument('--keep', type=int, default=DEFAULT_KEEP,
+                        help='jumlah backup yang disimpan')
+    parser.add_argument('--snapshot', action='store_true',
+                        help='buat snapshot ringkas dengan VACUUM INTO')
+    parser.add_argument('--verify', metavar='FILE',
+                        help='hanya periksa integritas file backup')
+    parser.add_argument('--every', type=float, metavar='MENIT',
+                        help='ulangi backup setiap sekian menit')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.verify:
+        ok = verify_database(args.verify)
+        print("OK" if ok else "RUSAK")
+        raise SystemExit(0 if ok else 1)
+
+    manager = BackupManager(args.db, args.dir, args.keep)
+    while True:
+        try:
+            print(manager.run(snapshot=args.snapshot))
+        except BackupError as e:
+            logging.error(f"Backup gagal: {e}")
+            if not args.every:
+                raise SystemExit(1)
+        if not args.every:
+            break
+        time.sleep(args.every * 60)
+
+
+if __name__ == '__main__':
+    main()
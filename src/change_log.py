@@ -0,0 +1,182 @@
+"""Incremental exports driven by the change_log table.
+
+Triggers created by DatabaseHandler append (table, row id, op) to change_log
+for every insert, update and delete on items and transactions. An export
+target (for example the foundation office) remembers the last change_log seq
+it received; the next export only reads the rows touched after that point
+and then moves the watermark forward.
+
+Entries every target has received are dropped after each export. So the log
+cannot grow without bound when nobody exports, maintenance also keeps it to
+the newest keep_rows entries. A target whose watermark falls below what was
+dropped gets a full export next time.
+
+    python src/change_log.py perubahan.json --target yayasan
+    python src/change_log.py semua.json --target yayasan --full
+"""
+import argparse
+import json
+import sqlite3
+
+DEFAULT_TARGET = 'yayasan'
+# Entries maintenance keeps even when no target has received them yet
+DEFAULT_KEEP_ROWS = 100000
+# settings key: highest seq dropped from change_log so far
+PRUNED_SETTING = 'change_log_pruned_seq'
+
+ITEM_FIELDS = ('id', 'name', 'barcode', 'quantity', 'location', 'condition',
+               'status', 'photo_path', 'created_at', 'updated_at')
+TRANSACTION_FIELDS = ('id', 'item_id', 'type', 'borrower', 'purpose', 'date',
+                      'due_date', 'returned', 'quantity', 'updated_at')
+
+
+def get_watermark(conn, target):
+    row = conn.execute('SELECT seq FROM export_watermarks WHERE target = ?', (target,)).fetchone()
+    return row[0] if row else 0
+
+
+def get_pruned_seq(conn):
+    row = conn.execute('SELECT value FROM settings WHERE key = ?', (PRUNED_SETTING,)).fetchone()
+    return int(row[0]) if row else 0
+
+
+def _changed_rows(conn, table, fields, since, until):
+    """Current rows changed in (since, until] plus ids deleted in that window"""
+    columns = ', '.join(f'r.{field}' for field in fields)
+    active_filter = 'AND r.deleted_at IS NULL' if table == 'items' else ''
+    changed = conn.execute(f'''
+        SELECT {columns} FROM {table} r
+        WHERE r.id IN (
+            SELECT row_id FROM change_log
+            WHERE table_name = ? AND seq > ? AND seq <= ?
+        ) {active_filter}
+        ORDER BY r.id
+    ''', (table, since, until))
+    rows = [dict(zip(fields, row)) for row in changed]
+
+    if table == 'items':
+        # Soft-deleted items are logged as updates but exported as deletions
+        deleted_filter = "AND row_id NOT IN (SELECT id FROM items WHERE deleted_at IS NULL)"
+        ops = "op IN ('D', 'U')"
+    else:
+        # Archiving deletes from the hot table; those rows still exist
+        deleted_filter = ('AND row_id NOT IN (SELECT id FROM transactions) '
+                          'AND row_id NOT IN (SELECT id FROM transactions_archive)')
+        ops = "op = 'D'"
+    deleted = conn.execute(f'''
+        SELECT DISTINCT row_id FROM change_log
+        WHERE table_name = ? AND {ops} AND seq > ? AND seq <= ?
+          {deleted_filter}
+        ORDER BY row_id
+    ''', (table, since, until))
+    return rows, [row[0] for row in deleted]
+
+
+def collect_changes(conn, target=DEFAULT_TARGET, full=False):
+    """Read everything changed since the target's watermark from one snapshot"""
+    since = 0 if full else get_watermark(conn, target)
+    # Entries this target has not received were pruned: only a full export is complete
+    if since < get_pruned_seq(conn):
+        full, since = True, 0
+    # sqlite_sequence still knows the last seq after the log has been pruned
+    row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'change_log'").fetchone()
+    until = max(since, row[0] if row else 0)
+
+    if full:
+        items = [dict(zip(ITEM_FIELDS, row)) for row in
+                 conn.execute(f"SELECT {', '.join(ITEM_FIELDS)} FROM items "
+                              "WHERE deleted_at IS NULL ORDER BY id")]
+        transactions = [dict(zip(TRANSACTION_FIELDS, row)) for row in
+                        conn.execute(f"SELECT {', '.join(TRANSACTION_FIELDS)} FROM transactions ORDER BY id")]
+        deleted_items, deleted_transactions = [], []
+    else:
+        items, deleted_items = _changed_rows(conn, 'items', ITEM_FIELDS, since, until)
+        transactions, deleted_transactions = _changed_rows(
+            conn, 'transactions', TRANSACTION_FIELDS, since, until)
+
+    return {
+        'target': target,
+        'full': full,
+        'since_seq': since,
+        'until_seq': until,
+        'items': items,
+        'deleted_items': deleted_items,
+        'transactions': transactions,
+        'deleted_transactions': deleted_transactions,
+    }
+
+
+# The newest entry per table stays, so MAX(seq) per table never goes back
+# (report_cache.py uses it as a change counter)
+PRUNABLE = 'seq <= ? AND seq NOT IN (SELECT MAX(seq) FROM change_log GROUP BY table_name)'
+
+
+def _keep_rows_boundary(conn, keep_rows):
+    newest = conn.execute('SELECT MAX(seq) FROM change_log').fetchone()[0] or 0
+    return newest - keep_rows
+
+
+def count_excess(conn, keep_rows):
+    """Entries prune_change_log(conn, keep_rows) would drop beyond the newest keep_rows"""
+    return conn.execute(f'SELECT COUNT(*) FROM change_log WHERE {PRUNABLE}',
+                        (_keep_rows_boundary(conn, keep_rows),)).fetchone()[0]
+
+
+def prune_change_log(conn, keep_rows=None):
+    """Drop log entries every export target has already received and, with
+    keep_rows, everything but the newest keep_rows entries"""
+    low = conn.execute('SELECT MIN(seq) FROM export_watermarks').fetchone()[0]
+    if keep_rows is not None:
+        low = max(low or 0, _keep_rows_boundary(conn, keep_rows))
+    if not low:
+        return 0
+    removed = conn.execute(f'DELETE FROM change_log WHERE {PRUNABLE}', (low,)).rowcount
+    if removed and low > get_pruned_seq(conn):
+        conn.execute('INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)', (PRUNED_SETTING, str(low)))
+    return removed
+
+
+def export_changes(db_name, path, target=DEFAULT_TARGET, full=False, busy_timeout=5000):
+    """Write the changes since the last export for target to a JSON file"""
+    conn = sqlite3.connect(db_name, timeout=busy_timeout / 1000.0)
+    try:
+        # A read transaction so the rows and until_seq come from one snapshot
+        conn.execute('BEGIN')
+        changes = collect_changes(conn, target, full)
+        conn.commit()
+
+        with open(path, 'w') as f:
+            json.dump(changes, f, indent=4)
+
+        # Only advance once the file is safely written
+        conn.execute('BEGIN IMMEDIATE')
+        conn.execute('''
+            INSERT INTO export_watermarks (target, seq, exported_at)
+            VALUES (?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(target) DO UPDATE SET seq = excluded.seq, exported_at = excluded.exported_at
+        ''', (target, changes['until_seq']))
+        prune_change_log(conn)
+        conn.commit()
+        return changes
+    finally:
+        if conn.in_transaction:
+            conn.rollback()
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export perubahan data inventaris sejak export terakhir")
+    parser.add_argument('file')
+    parser.add_argument('--db', default='inventaris.db')
+    parser.add_argument('--target', default=DEFAULT_TARGET, help='nama penerima export')
+    parser.add_argument('--full', action='store_true', help='export semua data dan reset watermark')
+    args = parser.parse_args()
+
+    changes = export_changes(args.db, args.file, args.target, args.full)
+    print(f"{len(changes['items'])} barang, {len(changes['transactions'])} transaksi, "
+          f"{len(changes['deleted_items']) + len(changes['deleted_transactions'])} dihapus "
+          f"(seq {changes['since_seq']} -> {changes['until_seq']})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,242 @@
+"""Whole-database transfer between machines using .invdb snapshot files.
+
+An .invdb file is a plain SQLite copy of inventaris.db written with
+VACUUM INTO. Importing ATTACHes the file and merges it with a handful of
+set-based INSERT ... SELECT statements: item ids are remapped through a
+temporary table, items whose barcode already exists are either matched to
+the existing row or imported under a new barcode, and transactions follow
+their items. Nothing is copied row by row in Python.
+
+An item that was imported before (same barcode, or that barcode with a
+rename suffix, and the same created_at) is matched in both modes, so
+importing a file again adds nothing twice. Open loans added to a matched
+item take their units out of its stock, as a borrow would have.
+
+    python src/invdb_transfer.py export gudang.invdb
+    python src/invdb_transfer.py import gudang.invdb --on-conflict rename
+"""
+import argparse
+import os
+import sqlite3
+from datetime import datetime
+
+from backup import verify_database
+
+FORMAT_VERSION = '1'
+
+ITEM_COLUMNS = ('name', 'barcode', 'quantity', 'location', 'condition',
+                'status', 'photo_path', 'created_at')
+TRANSACTION_COLUMNS = ('type', 'borrower', 'purpose', 'date', 'due_date',
+                       'returned', 'quantity')
+
+# What to do with an imported item whose barcode is already in the database
+CONFLICT_KEEP = 'keep'      # same barcode = same item, reuse the existing row
+CONFLICT_RENAME = 'rename'  # import as a separate item with a suffixed barcode
+CONFLICT_POLICIES = (CONFLICT_KEEP, CONFLICT_RENAME)
+
+
+class TransferError(Exception):
+    """The .invdb file could not be written or is not an inventory database"""
+
+
+def export_database(db_name, path):
+    """Write a compact, verified copy of db_name to path"""
+    tmp_path = path + '.tmp'
+    for stale in (tmp_path, path):
+        if os.path.exists(stale):
+            os.remove(stale)
+
+    conn = sqlite3.connect(db_name)
+    try:
+        conn.execute('VACUUM INTO ?', (tmp_path,))
+    finally:
+        conn.close()
+
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.execute('CREATE TABLE IF NOT EXISTS invdb_info (key TEXT PRIMARY KEY, value TEXT)')
+        conn.executemany('INSERT OR REPLACE INTO invdb_info VALUES (?, ?)', [
+            ('format', FORMAT_VERSION),
+            ('exported_at', datetime.now().isoformat(timespec='seconds')),
+            ('source', os.path.abspath(db_name)),
+        ])
+        conn.commit()
+    finally:
+        conn.close()
+
+    if not verify_database(tmp_path):
+        os.remove(tmp_path)
+        raise TransferError(f"Verifikasi integritas gagal untuk {path}")
+    os.replace(tmp_path, path)
+    return path
+
+
+def _has_table(conn, schema, table):
+    row = conn.execute(
+        f"SELECT 1 FROM {schema}.sqlite_master WHERE type = 'table' AND name = ?", (table,)
+    ).fetchone()
+    return row is not None
+
+
+def import_database(db_name, path, on_conflict=CONFLICT_KEEP, busy_timeout=5000):
+    """Merge an .invdb file into db_name; returns a dict of counts"""
+    if on_conflict not in CONFLICT_POLICIES:
+        raise ValueError(f"on_conflict harus salah satu dari {CONFLICT_POLICIES}")
+    if not os.path.exists(path):
+        raise TransferError(f"File tidak ditemukan: {path}")
+
+    conn = sqlite3.connect(db_name, timeout=busy_timeout / 1000.0)
+    try:
+        conn.execute('ATTACH DATABASE ? AS src', (path,))
+        if not _has_table(conn, 'src', 'items') or not _has_table(conn, 'src', 'transactions'):
+            raise TransferError("File bukan database inventaris")
+
+        conn.execute('BEGIN IMMEDIATE')
+        report = _merge(conn, on_conflict)
+        conn.commit()
+        return report
+    except sqlite3.Error as e:
+        if conn.in_transaction:
+            conn.rollback()
+        raise TransferError(str(e)) from e
+    finally:
+        conn.close()
+
+
+def _has_column(conn, schema, table, column):
+    return column in [row[1] for row in conn.execute(f'PRAGMA {schema}.table_info({table})')]
+
+
+def _merge(conn, on_conflict):
+    report = {}
+    # Items deleted in the source are not carried over
+    source_items = 'src.items'
+    if _has_column(conn, 'src', 'items', 'deleted_at'):
+        source_items = '(SELECT * FROM src.items WHERE deleted_at IS NULL)'
+    # A deleted item's barcode is free to use again
+    in_use = 'm.deleted_at IS NULL' if _has_column(conn, 'main', 'items', 'deleted_at') else '1'
+    conn.execute('DROP TABLE IF EXISTS temp.item_map')
+    conn.execute('''
+        CREATE TEMP TABLE item_map (
+            src_id INTEGER PRIMARY KEY,
+            new_id INTEGER NOT NULL,
+            matched INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+
+    # The same item imported earlier, possibly under a renamed barcode
+    report['items_matched'] = conn.execute(f'''
+        INSERT INTO item_map (src_id, new_id, matched)
+        SELECT s.id, MIN(m.id), 1 FROM {source_items} s
+        JOIN main.items m ON m.created_at = s.created_at AND (
+            m.barcode = s.barcode
+            OR substr(m.barcode, 1, length(s.barcode) + 1) = s.barcode || '-')
+        GROUP BY s.id
+    ''').rowcount
+    if on_conflict == CONFLICT_KEEP:
+        report['items_matched'] += conn.execute(f'''
+            INSERT INTO item_map (src_id, new_id, matched)
+            SELECT s.id, m.id, 1 FROM {source_items} s
+            JOIN main.items m ON m.barcode = s.barcode AND {in_use}
+            WHERE s.id NOT IN (SELECT src_id FROM item_map)
+        ''').rowcount
+
+    # New rows keep their relative order by shifting source ids past every
+    # id the destination has used, so the mapping is plain arithmetic.
+    offset = conn.execute('''
+        SELECT MAX(COALESCE((SELECT MAX(id) FROM main.items), 0),
+                   COALESCE((SELECT seq FROM main.sqlite_sequence WHERE name = 'items'), 0))
+    ''').fetchone()[0]
+    suffix = datetime.now().strftime('%Y%m%d%H%M%S')
+    columns = ', '.join(ITEM_COLUMNS)
+    selected = ', '.join(
+        f'''CASE WHEN EXISTS (SELECT 1 FROM main.items m WHERE m.barcode = s.barcode AND {in_use})
+                 THEN s.barcode || '-' || :suffix ELSE s.barcode END'''
+        if column == 'barcode' else f's.{column}'
+        for column in ITEM_COLUMNS
+    )
+    report['items_added'] = conn.execute(f'''
+        INSERT INTO main.items (id, {columns})
+        SELECT s.id + :offset, {selected}
+        FROM {source_items} s
+        WHERE s.id NOT IN (SELECT src_id FROM item_map)
+        ORDER BY s.id
+    ''', {'offset': offset, 'suffix': suffix}).rowcount
+    conn.execute(f'''
+        INSERT INTO item_map (src_id, new_id)
+        SELECT s.id, s.id + ? FROM {source_items} s
+        WHERE s.id NOT IN (SELECT src_id FROM item_map)
+    ''', (offset,))
+
+    # Archived history is merged into the hot table; the next archive pass
+    # moves it back out, and it gets fresh ids from the destination.
+    sources = ['src.transactions']
+    if _has_table(conn, 'src', 'transactions_archive'):
+        sources.append('src.transactions_archive')
+
+    # Files from before returned_at only say that a loan was closed
+    copied = TRANSACTION_COLUMNS
+    if (_has_column(conn, 'src', 'transactions', 'returned_at')
+            and _has_column(conn, 'main', 'transactions', 'returned_at')):
+        copied += ('returned_at',)
+    columns = ', '.join(copied)
+    selected = ', '.join(f't.{column}' for column in copied)
+    last_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM main.transactions').fetchone()[0]
+    report['transactions_added'] = 0
+    for source in sources:
+        # Rows already present (e.g. the same file imported twice) are skipped
+        report['transactions_added'] += conn.execute(f'''
+            INSERT INTO main.transactions (item_id, {columns})
+            SELECT m.new_id, {selected}
+            FROM {source} t
+            JOIN item_map m ON m.src_id = t.item_id
+            WHERE NOT EXISTS (
+                SELECT 1 FROM main.transactions x
+                WHERE x.item_id = m.new_id AND x.date = t.date AND x.type = t.type
+                  AND x.borrower = t.borrower AND x.quantity IS t.quantity
+                  AND x.due_date IS t.due_date
+            )
+            ORDER BY t.date, t.id
+        ''').rowcount
+
+    # New items bring their stock with them; matched ones still count the
+    # units of the open loans just added as in stock
+    added_loans = '''
+        SELECT item_id, SUM(quantity) AS qty FROM main.transactions
+        WHERE id > :last_id AND type = 'borrow' AND returned = 0
+        GROUP BY item_id
+    '''
+    report['stock_adjusted'] = conn.execute(f'''
+        UPDATE main.items SET quantity = MAX(quantity - (
+            SELECT a.qty FROM ({added_loans}) a WHERE a.item_id = items.id
+        ), 0)
+        WHERE id IN (SELECT new_id FROM item_map WHERE matched = 1)
+          AND id IN (SELECT item_id FROM ({added_loans}))
+    ''', {'last_id': last_id}).rowcount
+
+    conn.execute('DROP TABLE temp.item_map')
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export/import database inventaris (.invdb)")
+    parser.add_argument('action', choices=('export', 'import'))
+    parser.add_argument('file')
+    parser.add_argument('--db', default='inventaris.db')
+    parser.add_argument('--on-conflict', choices=CONFLICT_POLICIES, default=CONFLICT_KEEP,
+                        help='barcode yang sudah ada: pakai barang lama (keep) atau buat barcode baru (rename)')
+    args = parser.parse_args()
+
+    try:
+        if args.action == 'export':
+            print(export_database(args.db, args.file))
+        else:
+            report = import_database(args.db, args.file, args.on_conflict)
+            for key, value in report.items():
+                print(f"{key}: {value}")
+    except TransferError as e:
+        raise SystemExit(f"Gagal: {e}")
+
+
+if __name__ == '__main__':
+    main()
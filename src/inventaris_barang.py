@@ -4,30 +4,207 @@ from tkinter.ttk import Notebook
 import sqlite3
 import os
 import json
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from fpdf import FPDF
-import barcode
-from barcode.writer import ImageWriter
 import tempfile
 from PIL import Image, ImageTk
 from tkcalendar import DateEntry
 import logging
+import argparse
+import contextlib
+import functools
+import multiprocessing
+import random
+import threading
+import queue
+import time
+import uuid
+from collections import OrderedDict, defaultdict, deque
+from itertools import islice
+
+from backup import BackupManager
+from maintenance import MaintenanceManager
+import spreadsheet
+import invdb_transfer
+import labels
+import change_log
+import records
+import reservations
+import stock_history
+import units
+from report_cache import ReportCache
+from records import TRANSACTION_COLUMNS
+
+# Shared-database tuning: how long SQLite waits on a held lock, and how often
+# a write transaction is retried (with exponential backoff) after that.
+DEFAULT_BUSY_TIMEOUT_MS = 5000
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_RETRY_BACKOFF = 0.05
+
+# PRAGMA synchronous per durability level: 'full' flushes every commit to
+# disk; 'normal' flushes less often and may lose the last commits on a
+# power cut. Only in WAL mode (the server) is that all it can do: desks
+# sharing the file use the rollback journal, where a power cut at the wrong
+# moment can also corrupt it. 'off' leaves flushing to the operating system.
+DURABILITY_LEVELS = {'full': 'FULL', 'normal': 'NORMAL', 'off': 'OFF'}
+
+# Closed loans older than this move to transactions_archive
+DEFAULT_ARCHIVE_RETENTION_DAYS = 365
+
+# Soft-deleted items are purged for good after this many days
+DEFAULT_PURGE_AFTER_DAYS = 30
+# What happens to the history of purged items
+PURGE_ARCHIVE = 'archive'   # move it to transactions_archive
+PURGE_CASCADE = 'cascade'   # delete it with the item
+PURGE_POLICIES = (PURGE_ARCHIVE, PURGE_CASCADE)
+# Shown for history rows whose item no longer exists
+DELETED_ITEM_NAME = "(barang dihapus)"
+
+# Rows fetched per round trip by the iter_* generators
+DEFAULT_BATCH_SIZE = 500
+
+# Columns that can be used as facet filters on the items view
+ITEM_FACETS = ('location', 'condition', 'status')
+TEXT_SORT_COLUMNS = ('name', 'barcode', 'location', 'condition', 'status')
+TRANSACTION_FILTERS = ('type', 'borrower', 'borrower_id', 'date_from', 'date_to')
+# Columns that can be changed on many selected items at once
+BULK_EDIT_FIELDS = ('location', 'condition', 'status')
+ALL_FILTER = "Semua"
+# Facet value standing for "not filled in" (NULL or ''), as a filter and in item_facets
+EMPTY_FACET = "(kosong)"
+
+# Columns kept by triggers and migrations; setting them alone is bookkeeping,
+# not a change, so it neither stamps updated_at nor adds to change_log
+CHANGE_LOG_BOOKKEEPING = {
+    'items': ('id', 'updated_at', 'version', 'station_id', 'uid'),
+    'transactions': ('id', 'updated_at', 'uid', 'borrower_id'),
+}
+
+# Column projections used by the views
+RESULT_COLUMNS = ('id', 'name', 'quantity', 'location', 'condition', 'status')
+EXPORT_COLUMNS = ('name', 'barcode', 'quantity', 'location', 'condition', 'status', 'photo_path')
+HISTORY_COLUMNS = ('id', 'item_name', 'type', 'borrower', 'date', 'due_date', 'quantity')
+DETAIL_HISTORY_COLUMNS = ('type', 'borrower', 'date', 'due_date', 'quantity')
+BORROWED_COLUMNS = ('id', 'item_name', 'borrower', 'due_date', 'quantity')
+BORROWER_LOAN_COLUMNS = ('id', 'item_name', 'date', 'due_date', 'quantity')
+
+# Suggestions shown while typing a borrower name
+BORROWER_SUGGESTIONS = 10
+
+# Item detail panel: newest history rows shown, photo size, how long a
+# selection must stay before it is prefetched and how many items are kept
+DETAIL_HISTORY_PAGE = 50
+DETAIL_THUMBNAIL_SIZE = (200, 200)
+DETAIL_PREFETCH_DELAY_MS = 150
+DETAIL_CACHE_SIZE = 32
+
+# Automatic online backup while the app is open (milliseconds)
+AUTO_BACKUP_INTERVAL_MS = 6 * 60 * 60 * 1000
+# How often the app checks whether a stock checkpoint is due
+STOCK_CHECKPOINT_CHECK_MS = 24 * 60 * 60 * 1000
+# Database maintenance runs once nobody has touched the app for a while
+MAINTENANCE_CHECK_MS = 60 * 1000
+MAINTENANCE_IDLE_SECONDS = 5 * 60
+
+class InsufficientStockError(Exception):
+    """Raised inside a write transaction when stock would go negative"""
+
+class ReservationConflictError(InsufficientStockError):
+    """Raised when the units asked for are already reserved in that period"""
+
+class StaleItemError(Exception):
+    """Raised when an item's stock changed after the edit form read it"""
 
 class DatabaseHandler:
-    def __init__(self):
-        self.db_name = "inventaris.db"
+    # Time of the write being run, per thread; a mirror sets it so a write
+    # replayed on the file sees the time it first ran at (memory_mirror.py)
+    _clock = threading.local()
+    # Errors reported on a worker thread are kept here until the Tk thread
+    # can show them (see collect_errors)
+    _collected = threading.local()
+
+    def __init__(self, db_name=units.DEFAULT_DB, busy_timeout=DEFAULT_BUSY_TIMEOUT_MS,
+                 max_retries=DEFAULT_MAX_RETRIES, retry_backoff=DEFAULT_RETRY_BACKOFF,
+                 durability=None):
+        if durability is not None and durability not in DURABILITY_LEVELS:
+            raise ValueError(f"durability harus salah satu dari {tuple(DURABILITY_LEVELS)}")
+        self.db_name = db_name
+        self.busy_timeout = busy_timeout
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        # None keeps SQLite's default (FULL)
+        self.durability = durability
         self.initialize_database()
 
+    def _connect(self):
+        """Open a connection that waits busy_timeout ms for locks held by other stations"""
+        conn = sqlite3.connect(self.db_name, timeout=self.busy_timeout / 1000.0)
+        conn.execute(f'PRAGMA busy_timeout = {int(self.busy_timeout)}')
+        # Every child column has an index, so the checks are index lookups
+        conn.execute('PRAGMA foreign_keys = ON')
+        if self.durability:
+            conn.execute(f'PRAGMA synchronous = {DURABILITY_LEVELS[self.durability]}')
+        return conn
+
+    def _now(self):
+        """Local time of the current write"""
+        moment = getattr(self._clock, 'time', None)
+        return datetime.fromtimestamp(moment) if moment is not None else datetime.now()
+
+    def _utc_stamp(self):
+        """_now() as CURRENT_TIMESTAMP writes it (UTC)"""
+        return self._now().astimezone(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+    @staticmethod
+    def _is_busy_error(error):
+        message = str(error).lower()
+        return 'locked' in message or 'busy' in message
+
+    def _run_write(self, operation, connect=None):
+        """Run operation(cursor) inside BEGIN IMMEDIATE, retrying with backoff on lock errors"""
+        attempt = 0
+        while True:
+            conn = (connect or self._connect)()
+            try:
+                conn.execute('BEGIN IMMEDIATE')
+                result = operation(conn.cursor())
+                conn.commit()
+                return result
+            except sqlite3.OperationalError as e:
+                if conn.in_transaction:
+                    conn.rollback()
+                if not self._is_busy_error(e) or attempt >= self.max_retries:
+                    raise
+            except Exception:
+                if conn.in_transaction:
+                    conn.rollback()
+                raise
+            finally:
+                conn.close()
+
+            delay = self.retry_backoff * (2 ** attempt)
+            time.sleep(delay + random.uniform(0, delay))
+            attempt += 1
+
     def initialize_database(self):
-        conn = sqlite3.connect(self.db_name)
+        conn = self._connect()
         cursor = conn.cursor()
 
+        # Only has an effect on a new, empty file; lets maintenance shrink
+        # the file a few pages at a time instead of a full VACUUM
+        cursor.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        # Only possible outside a transaction; _initialize_barcodes drops the
+        # table transactions and reservations point at (ids are kept)
+        cursor.execute('PRAGMA foreign_keys = OFF')
+        # Migrations and trigger changes land together, or not at all
+        cursor.execute('BEGIN IMMEDIATE')
+
         # Create items table
         cursor.execute('''
         CREATE TABLE IF NOT EXISTS items (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             name TEXT NOT NULL,
-            barcode TEXT UNIQUE,
+            barcode TEXT,
             quantity INTEGER NOT NULL,
             location TEXT,
             condition TEXT,
@@ -53,215 +230,1146 @@ class DatabaseHandler:
         )
         ''')
 
+        # Cold storage for closed loans; same columns, ids are kept
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS transactions_archive (
+            id INTEGER PRIMARY KEY,
+            item_id INTEGER NOT NULL,
+            type TEXT NOT NULL,
+            borrower TEXT NOT NULL,
+            purpose TEXT,
+            date TEXT NOT NULL,
+            due_date TEXT,
+            returned INTEGER DEFAULT 0,
+            quantity INTEGER DEFAULT 1,
+            archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''')
+
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_transactions_item ON transactions (item_id, date)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_transactions_open ON transactions (type, returned, due_date)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_transactions_archive_item ON transactions_archive (item_id, date)')
+
+        # Transaction filters and sortable columns
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_transactions_date ON transactions (date)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_transactions_borrower ON transactions (borrower)')
+
+        # Update triggers of older versions fire on every column, so the
+        # backfills below would stamp and log each row they touch; they are
+        # put back by _initialize_change_log once the migrations are done
+        cursor.execute('''
+        SELECT name FROM sqlite_master
+        WHERE type = 'trigger' AND name IN ('trg_items_update', 'trg_transactions_update')
+          AND sql NOT LIKE '%AFTER UPDATE OF%'
+        ''')
+        for (name,) in cursor.fetchall():
+            cursor.execute(f'DROP TRIGGER {name}')
+
+        self._initialize_barcodes(cursor)
+        self._initialize_replication(cursor)
+        self._initialize_borrowers(cursor)
+        self._initialize_returns(cursor)
+        self._initialize_reservations(cursor)
+        self._initialize_soft_delete(cursor)
+        self._initialize_stock_history(cursor)
+        self._initialize_change_log(cursor)
+
         conn.commit()
         conn.close()
 
-    def add_item(self, item_data):
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
-        
+    @staticmethod
+    def _ensure_column(cursor, table, column, definition):
+        """Add a column to an existing table; returns True if it was missing"""
+        cursor.execute(f'PRAGMA table_info({table})')
+        if column in [row[1] for row in cursor.fetchall()]:
+            return False
+        cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+        return True
+
+    @staticmethod
+    def _replace_trigger(cursor, name, sql):
+        """Create a trigger, or replace it when its definition has changed"""
+        sql = sql.strip()
+        cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = ?", (name,))
+        row = cursor.fetchone()
+        if row and row[0] == sql:
+            return
+        cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+        cursor.execute(sql)
+
+    def _initialize_change_log(self, cursor):
+        """updated_at stamps plus an append-only change_log, both kept by triggers"""
+        # ALTER TABLE cannot add a CURRENT_TIMESTAMP default, so old rows are
+        # backfilled here and new ones are stamped by the triggers below.
+        if self._ensure_column(cursor, 'items', 'updated_at', 'TIMESTAMP'):
+            cursor.execute('UPDATE items SET updated_at = created_at')
+        if self._ensure_column(cursor, 'transactions', 'updated_at', 'TIMESTAMP'):
+            cursor.execute('UPDATE transactions SET updated_at = date')
+
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS change_log (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            table_name TEXT NOT NULL,
+            row_id INTEGER NOT NULL,
+            op TEXT NOT NULL
+        )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_change_log_table ON change_log (table_name, seq)')
+
+        # Last change_log seq delivered to each export target
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS export_watermarks (
+            target TEXT PRIMARY KEY,
+            seq INTEGER NOT NULL,
+            exported_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''')
+
+        for table in ('items', 'transactions'):
+            cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_insert AFTER INSERT ON {table}
+            BEGIN
+                UPDATE {table} SET updated_at = CURRENT_TIMESTAMP WHERE id = NEW.id;
+                INSERT INTO change_log (table_name, row_id, op) VALUES ('{table}', NEW.id, 'I');
+            END
+            ''')
+            # Runs after every migration: the column list covers all columns
+            # except the bookkeeping ones, including columns added later
+            cursor.execute(f'PRAGMA table_info({table})')
+            columns = ', '.join(row[1] for row in cursor.fetchall()
+                                if row[1] not in CHANGE_LOG_BOOKKEEPING[table])
+            self._replace_trigger(cursor, f'trg_{table}_update', f'''
+            CREATE TRIGGER trg_{table}_update AFTER UPDATE OF {columns} ON {table}
+            WHEN NEW.updated_at IS OLD.updated_at
+            BEGIN
+                UPDATE {table} SET updated_at = CURRENT_TIMESTAMP WHERE id = NEW.id;
+                INSERT INTO change_log (table_name, row_id, op) VALUES ('{table}', NEW.id, 'U');
+            END
+            ''')
+            cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_delete AFTER DELETE ON {table}
+            BEGIN
+                INSERT INTO change_log (table_name, row_id, op) VALUES ('{table}', OLD.id, 'D');
+            END
+            ''')
+
+    def _initialize_barcodes(self, cursor):
+        """Drop the table-level UNIQUE on barcode of older files.
+
+        It kept the barcode of a soft-deleted item taken; uniqueness among
+        items in use is kept by idx_items_active_barcode instead. SQLite
+        cannot drop a column constraint, so items is rebuilt once; its
+        indexes and triggers go with the old table and are created again
+        by the steps that follow.
+        """
+        cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'items'")
+        sql = cursor.fetchone()[0]
+        if 'barcode TEXT UNIQUE' not in sql:
+            return
+        cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'items'")
+        row = cursor.fetchone()
+        cursor.execute(sql.replace('CREATE TABLE items', 'CREATE TABLE items_rebuild', 1)
+                          .replace('barcode TEXT UNIQUE', 'barcode TEXT', 1))
+        cursor.execute('INSERT INTO items_rebuild SELECT * FROM items')
+        cursor.execute('DROP TABLE items')
+        cursor.execute('ALTER TABLE items_rebuild RENAME TO items')
+        # Ids of items deleted for good are not handed out again
+        if row:
+            cursor.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'items'", row)
+
+    def _initialize_replication(self, cursor):
+        """Station id and per-row version stamps used by replica_merge.py"""
+        cursor.execute('CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT)')
+        cursor.execute(
+            "INSERT OR IGNORE INTO settings (key, value) VALUES ('station_id', ?)",
+            (uuid.uuid4().hex[:12],)
+        )
+        station = "(SELECT value FROM settings WHERE key = 'station_id')"
+
+        self._ensure_column(cursor, 'items', 'version', 'INTEGER NOT NULL DEFAULT 1')
+        if self._ensure_column(cursor, 'items', 'station_id', 'TEXT'):
+            cursor.execute(f'UPDATE items SET station_id = {station}')
+        # Items and transactions get a globally unique "<station>:<local id>"
+        # so merged copies of the same item or loan can be recognised
+        for table in ('items', 'transactions', 'transactions_archive'):
+            if self._ensure_column(cursor, table, 'uid', 'TEXT'):
+                cursor.execute(f"UPDATE {table} SET uid = {station} || ':' || id")
+            cursor.execute(f'CREATE UNIQUE INDEX IF NOT EXISTS idx_{table}_uid ON {table} (uid) WHERE uid IS NOT NULL')
+
+        cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_items_station AFTER INSERT ON items
+        WHEN NEW.station_id IS NULL
+        BEGIN
+            UPDATE items SET station_id = {station} WHERE id = NEW.id;
+        END
+        ''')
+        # Only real edits of the descriptive fields bump the version; stock
+        # moves do not, since merges recompute stock from the ledger.
+        cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_items_version
+        AFTER UPDATE OF name, location, condition, status, photo_path ON items
+        WHEN NEW.version IS OLD.version AND (
+            NEW.name IS NOT OLD.name OR NEW.location IS NOT OLD.location OR
+            NEW.condition IS NOT OLD.condition OR NEW.status IS NOT OLD.status OR
+            NEW.photo_path IS NOT OLD.photo_path)
+        BEGIN
+            UPDATE items SET version = OLD.version + 1, station_id = {station} WHERE id = NEW.id;
+        END
+        ''')
+        for table in ('items', 'transactions'):
+            cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_uid AFTER INSERT ON {table}
+            WHEN NEW.uid IS NULL
+            BEGIN
+                UPDATE {table} SET uid = {station} || ':' || NEW.id WHERE id = NEW.id;
+            END
+            ''')
+
+    def _initialize_borrowers(self, cursor):
+        """Borrower registry; transactions point at it through borrower_id"""
+        # NOCASE makes "pak budi" and "Pak Budi" one borrower and lets prefix
+        # LIKE searches use the unique index
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS borrowers (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE COLLATE NOCASE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''')
+        for table in ('transactions', 'transactions_archive'):
+            if self._ensure_column(cursor, table, 'borrower_id', 'INTEGER REFERENCES borrowers (id)'):
+                # Intern the free-text names already recorded on borrows
+                cursor.execute(f'''
+                INSERT OR IGNORE INTO borrowers (name)
+                SELECT TRIM(borrower) FROM {table}
+                WHERE type = 'borrow' AND TRIM(borrower) != ''
+                ORDER BY id
+                ''')
+                cursor.execute(f'''
+                UPDATE {table} SET borrower_id = (
+                    SELECT b.id FROM borrowers b WHERE b.name = TRIM({table}.borrower)
+                )
+                WHERE type = 'borrow'
+                ''')
+        cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_transactions_borrower_id
+        ON transactions (borrower_id, type, returned)
+        ''')
+        cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_transactions_archive_borrower_id
+        ON transactions_archive (borrower_id)
+        ''')
+        # Borrows inserted without an id (imports, merges) are interned here
+        cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_transactions_borrower AFTER INSERT ON transactions
+        WHEN NEW.borrower_id IS NULL AND NEW.type = 'borrow' AND TRIM(NEW.borrower) != ''
+        BEGIN
+            INSERT OR IGNORE INTO borrowers (name) VALUES (TRIM(NEW.borrower));
+            UPDATE transactions SET borrower_id = (
+                SELECT id FROM borrowers WHERE name = TRIM(NEW.borrower)
+            ) WHERE id = NEW.id;
+        END
+        ''')
+
+    def _initialize_returns(self, cursor):
+        """returned_at on borrows: the day the loan was closed"""
+        added = [self._ensure_column(cursor, table, 'returned_at', 'TEXT')
+                 for table in ('transactions', 'transactions_archive')]
+        if not any(added):
+            return
+        # Older versions only recorded the close as a return row (same item
+        # and quantity, later id); each one closes the oldest returned borrow
+        # still waiting for its return
+        cursor.execute('''
+        SELECT 'transactions', id, item_id, quantity, type, date FROM transactions
+        WHERE type = 'return' OR (type = 'borrow' AND returned = 1)
+        UNION ALL
+        SELECT 'transactions_archive', id, item_id, quantity, type, date FROM transactions_archive
+        WHERE type = 'return' OR (type = 'borrow' AND returned = 1)
+        ORDER BY 2
+        ''')
+        waiting = defaultdict(deque)
+        closed = defaultdict(list)
+        for table, row_id, item_id, quantity, kind, day in cursor.fetchall():
+            loans = waiting[(item_id, quantity)]
+            if kind == 'borrow':
+                loans.append((table, row_id))
+            elif loans:
+                borrow_table, borrow_id = loans.popleft()
+                closed[borrow_table].append((day, borrow_id))
+        for table, rows in closed.items():
+            cursor.executemany(f'UPDATE {table} SET returned_at = ? WHERE id = ? AND returned_at IS NULL', rows)
+
+    def _initialize_reservations(self, cursor):
+        """Future bookings; see reservations.py for the availability sweep"""
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS reservations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            item_id INTEGER NOT NULL REFERENCES items (id),
+            borrower TEXT NOT NULL,
+            borrower_id INTEGER REFERENCES borrowers (id),
+            purpose TEXT,
+            start_date TEXT NOT NULL,
+            end_date TEXT NOT NULL,
+            quantity INTEGER NOT NULL,
+            status TEXT NOT NULL DEFAULT 'active',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''')
+        # Bookings that end before a window are skipped by the index range
+        cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_reservations_item_end
+        ON reservations (item_id, status, end_date)
+        ''')
+        cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_reservations_borrower
+        ON reservations (borrower_id, item_id, status)
+        ''')
+        cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_transactions_item_open
+        ON transactions (item_id) WHERE type = 'borrow' AND returned = 0
+        ''')
+
+    def _initialize_soft_delete(self, cursor):
+        """deleted_at marker on items; active-item indexes leave deleted rows out"""
+        self._ensure_column(cursor, 'items', 'deleted_at', 'TIMESTAMP')
+        # Facet filters and sortable columns, only over items still in use
+        for column in ITEM_FACETS:
+            cursor.execute(f'DROP INDEX IF EXISTS idx_items_{column}')
+            cursor.execute(f'''
+            CREATE INDEX IF NOT EXISTS idx_items_active_{column}
+            ON items ({column}) WHERE deleted_at IS NULL
+            ''')
+        cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_items_active_name
+        ON items (name COLLATE NOCASE) WHERE deleted_at IS NULL
+        ''')
+        # A deleted item gives its barcode back; merges and imports also look
+        # up deleted items by barcode, hence the second index
+        cursor.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_items_active_barcode
+        ON items (barcode) WHERE deleted_at IS NULL
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_items_barcode ON items (barcode)')
+        # The purge job only visits deleted rows
+        cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_items_deleted
+        ON items (deleted_at) WHERE deleted_at IS NOT NULL
+        ''')
+
+    def _initialize_stock_history(self, cursor):
+        """Stock checkpoints; see stock_history.py for the ledger replay"""
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS stock_checkpoints (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            as_of TEXT NOT NULL,
+            last_transaction_id INTEGER NOT NULL,
+            taken_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_stock_checkpoints_as_of ON stock_checkpoints (as_of)')
+        # No foreign key to items: checkpoints outlive purged items
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS stock_checkpoint_items (
+            checkpoint_id INTEGER NOT NULL REFERENCES stock_checkpoints (id) ON DELETE CASCADE,
+            item_id INTEGER NOT NULL,
+            quantity INTEGER NOT NULL,
+            PRIMARY KEY (checkpoint_id, item_id)
+        ) WITHOUT ROWID
+        ''')
+
+    def report_error(self, title, message):
+        """Show a database error to the user; headless handlers override this"""
+        errors = getattr(self._collected, 'errors', None)
+        if errors is not None:
+            errors.append((title, message))
+            return
+        messagebox.showerror(title, message)
+
+    @contextlib.contextmanager
+    def collect_errors(self):
+        """Keep errors reported on this thread in a list instead of showing them.
+
+        Tk may only be called from its own thread, so worker threads read
+        inside this and hand the list back to be reported from there.
+        """
+        errors = []
+        self._collected.errors = errors
         try:
+            yield errors
+        finally:
+            self._collected.errors = None
+
+    def flush(self):
+        """Wait until every write is in the database file; they already are here"""
+        return True
+
+    def close(self):
+        """Release what the handler holds between calls; plain handlers hold nothing"""
+
+    def _write(self, operation, *args):
+        """Run the named _do_<operation>(cursor, *args) as one write transaction"""
+        do = getattr(self, f'_do_{operation}')
+        return self._run_write(lambda cursor: do(cursor, *args))
+
+    # Write operations. Each _do_* works on a cursor that is already inside a
+    # write transaction, so callers decide how operations are committed.
+    def _do_add_item(self, cursor, item_data):
+        cursor.execute('''
+        INSERT INTO items (name, barcode, quantity, location, condition, status, photo_path, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            item_data['name'],
+            item_data['barcode'],
+            item_data['quantity'],
+            item_data['location'],
+            item_data['condition'],
+            item_data['status'],
+            item_data['photo_path'],
+            self._utc_stamp()
+        ))
+        return cursor.lastrowid
+
+    def _do_update_item(self, cursor, item_id, item_data):
+        # Borrows and returns move the stock while the form is open: it is
+        # only written when the form changed it, and only if it still holds
+        # the value the form was opened with (original_quantity)
+        original = item_data.get('original_quantity', item_data['quantity'])
+        quantity = None
+        if item_data['quantity'] != original:
+            row = cursor.execute('SELECT quantity FROM items WHERE id=?', (item_id,)).fetchone()
+            if row is not None and row[0] != original:
+                raise StaleItemError(item_id)
+            quantity = item_data['quantity']
+        cursor.execute('''
+        UPDATE items 
+        SET name=?, quantity=COALESCE(?, quantity), location=?, condition=?, status=?, photo_path=?
+        WHERE id=?
+        ''', (
+            item_data['name'],
+            quantity,
+            item_data['location'],
+            item_data['condition'],
+            item_data['status'],
+            item_data['photo_path'],
+            item_id
+        ))
+        return cursor.rowcount > 0
+
+    def _do_delete_item(self, cursor, item_id):
+        # Soft delete: history keeps its item until purge_deleted_items
+        cursor.execute(
+            'UPDATE items SET deleted_at = ? WHERE id=? AND deleted_at IS NULL',
+            (self._utc_stamp(), item_id)
+        )
+        if cursor.rowcount == 0:
+            return False
+        cursor.execute(
+            'UPDATE reservations SET status = ? WHERE item_id = ? AND status = ?',
+            (reservations.CANCELLED, item_id, reservations.ACTIVE)
+        )
+        return True
+
+    def _do_update_items(self, cursor, item_ids, changes):
+        """Set the same BULK_EDIT_FIELDS values on every listed item"""
+        fields = [field for field in BULK_EDIT_FIELDS if field in changes]
+        if not fields or not item_ids:
+            return 0
+        assignments = ', '.join(f'{field}=?' for field in fields)
+        # The ids travel as one JSON array, so any number of them is one statement
+        cursor.execute(f'''
+        UPDATE items SET {assignments}
+        WHERE id IN (SELECT value FROM json_each(?)) AND deleted_at IS NULL
+        ''', [changes[field] for field in fields] + [json.dumps(item_ids)])
+        return cursor.rowcount
+
+    def _do_delete_items(self, cursor, item_ids):
+        """Soft-delete every listed item and cancel their reservations"""
+        ids = json.dumps(item_ids)
+        cursor.execute('''
+        UPDATE items SET deleted_at = ?
+        WHERE id IN (SELECT value FROM json_each(?)) AND deleted_at IS NULL
+        ''', (self._utc_stamp(), ids))
+        deleted = cursor.rowcount
+        cursor.execute('''
+        UPDATE reservations SET status = ?
+        WHERE item_id IN (SELECT value FROM json_each(?)) AND status = ?
+        ''', (reservations.CANCELLED, ids, reservations.ACTIVE))
+        return deleted
+
+    def _do_purge_deleted_items(self, cursor, older_than_days, policy):
+        """Remove items deleted long enough ago, plus history orphaned by old hard deletes"""
+        # Items with units still on loan wait until those come back; deleted_at
+        # is in UTC, like CURRENT_TIMESTAMP
+        cursor.execute('DROP TABLE IF EXISTS temp.purge_items')
+        cursor.execute('''
+        CREATE TEMP TABLE purge_items AS
+        SELECT id FROM items
+        WHERE deleted_at IS NOT NULL AND deleted_at <= datetime(?, ?)
+          AND id NOT IN (SELECT item_id FROM transactions WHERE type = 'borrow' AND returned = 0)
+        ''', (self._utc_stamp(), f'-{int(older_than_days)} days'))
+        doomed = 'item_id IN (SELECT id FROM temp.purge_items) OR item_id NOT IN (SELECT id FROM items)'
+
+        counts = {'items': 0, 'transactions': 0}
+        if policy == PURGE_ARCHIVE:
+            columns = ', '.join(TRANSACTION_COLUMNS + ('uid', 'borrower_id', 'returned_at'))
+            cursor.execute(f'''
+            INSERT OR REPLACE INTO transactions_archive ({columns})
+            SELECT {columns} FROM transactions WHERE {doomed}
+            ''')
+            cursor.execute(f'DELETE FROM transactions WHERE {doomed}')
+            counts['transactions'] = cursor.rowcount
+        else:
+            cursor.execute(f'DELETE FROM transactions WHERE {doomed}')
+            counts['transactions'] = cursor.rowcount
+            cursor.execute(f'DELETE FROM transactions_archive WHERE {doomed}')
+            counts['transactions'] += cursor.rowcount
+        cursor.execute(f'DELETE FROM reservations WHERE {doomed}')
+        cursor.execute('DELETE FROM items WHERE id IN (SELECT id FROM temp.purge_items)')
+        counts['items'] = cursor.rowcount
+        cursor.execute('DROP TABLE temp.purge_items')
+        return counts
+
+    def _do_add_transaction(self, cursor, transaction_data):
+        quantity = transaction_data.get('quantity', 1)
+        item_id = transaction_data['item_id']
+
+        borrower_id = None
+        if transaction_data['type'] == 'borrow':
+            borrower_id = self._do_intern_borrower(cursor, transaction_data['borrower'])
+            self._do_check_reservations(cursor, item_id, borrower_id, quantity,
+                                        transaction_data.get('due_date'))
+
+        # Stock is changed with a conditional update so two stations can
+        # never both take the last units; the check and the decrement are
+        # one statement inside the same IMMEDIATE transaction.
+        if transaction_data['type'] == 'borrow':
             cursor.execute('''
-            INSERT INTO items (name, barcode, quantity, location, condition, status, photo_path)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                item_data['name'],
-                item_data['barcode'],
-                item_data['quantity'],
-                item_data['location'],
-                item_data['condition'],
-                item_data['status'],
-                item_data['photo_path']
-            ))
-            conn.commit()
-            return cursor.lastrowid
+                UPDATE items SET quantity = quantity - ?
+                WHERE id = ? AND quantity >= ?
+            ''', (quantity, item_id, quantity))
+            if cursor.rowcount == 0:
+                raise InsufficientStockError(item_id)
+        elif transaction_data['type'] == 'return':
+            cursor.execute('''
+                UPDATE items SET quantity = quantity + ? WHERE id = ?
+            ''', (quantity, item_id))
+
+        cursor.execute('''
+            INSERT INTO transactions (item_id, type, borrower, borrower_id, purpose, date, due_date, quantity)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            item_id,
+            transaction_data['type'],
+            transaction_data['borrower'],
+            borrower_id,
+            transaction_data['purpose'],
+            transaction_data['date'],
+            transaction_data['due_date'],
+            quantity
+        ))
+        return cursor.lastrowid
+
+    def _do_process_return(self, cursor, trans_id, purpose):
+        # Only the first station to flip returned 0 -> 1 restores stock
+        returned_on = self._now().strftime('%Y-%m-%d')
+        cursor.execute('''
+        UPDATE transactions SET returned = 1, returned_at = ?
+        WHERE id = ? AND type = 'borrow' AND returned = 0
+        ''', (returned_on, trans_id))
+        if cursor.rowcount == 0:
+            return None
+
+        cursor.execute('SELECT item_id, quantity, borrower_id FROM transactions WHERE id=?', (trans_id,))
+        item_id, quantity, borrower_id = cursor.fetchone()
+
+        # The return row keeps pointing at the borrower of the loan
+        cursor.execute('''
+        INSERT INTO transactions (item_id, type, borrower, borrower_id, purpose, date, due_date, quantity)
+        VALUES (?, 'return', 'System', ?, ?, ?, NULL, ?)
+        ''', (item_id, borrower_id, purpose, returned_on, quantity))
+        return_id = cursor.lastrowid
+
+        cursor.execute('''
+        UPDATE items SET quantity = quantity + ?, status = CASE 
+            WHEN quantity + ? > 0 THEN 'Tersedia' 
+            ELSE status 
+        END WHERE id = ?
+        ''', (quantity, quantity, item_id))
+        return return_id
+
+    def _do_intern_borrower(self, cursor, name):
+        """Id of the borrower called name, registering it on first use"""
+        name = name.strip()
+        cursor.execute('INSERT OR IGNORE INTO borrowers (name) VALUES (?)', (name,))
+        cursor.execute('SELECT id FROM borrowers WHERE name = ?', (name,))
+        return cursor.fetchone()[0]
+
+    def _do_check_reservations(self, cursor, item_id, borrower_id, quantity, due_date):
+        """Make sure a borrow until due_date leaves every reservation covered.
+
+        A reservation of the same borrower for this item that covers today is
+        used up by the borrow (marked fulfilled) instead of counting against it.
+        """
+        today = self._now().strftime('%Y-%m-%d')
+        cursor.execute('''
+        UPDATE reservations SET status = ?
+        WHERE id = (
+            SELECT id FROM reservations
+            WHERE borrower_id = ? AND item_id = ? AND status = ?
+              AND start_date <= ? AND end_date >= ?
+            ORDER BY start_date LIMIT 1
+        )
+        ''', (reservations.FULFILLED, borrower_id, item_id, reservations.ACTIVE, today, today))
+        until = max(due_date or reservations.FAR_FUTURE, today)
+        if reservations.free_units(cursor, item_id, today, until, today) >= quantity:
+            return
+        # Not enough stock right now is reported by the stock update instead
+        cursor.execute('SELECT quantity FROM items WHERE id = ?', (item_id,))
+        row = cursor.fetchone()
+        if row and row[0] >= quantity:
+            raise ReservationConflictError(item_id)
+
+    def _do_add_reservation(self, cursor, reservation_data):
+        item_id = reservation_data['item_id']
+        quantity = reservation_data['quantity']
+        start, end = reservation_data['start_date'], reservation_data['end_date']
+        if quantity <= 0 or start > end:
+            raise ValueError("Rentang tanggal atau jumlah reservasi tidak valid")
+        # Checked and inserted in one IMMEDIATE transaction, like borrows
+        if reservations.free_units(cursor, item_id, start, end) < quantity:
+            raise ReservationConflictError(item_id)
+
+        cursor.execute('''
+        INSERT INTO reservations (item_id, borrower, borrower_id, purpose, start_date, end_date, quantity)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            item_id,
+            reservation_data['borrower'],
+            self._do_intern_borrower(cursor, reservation_data['borrower']),
+            reservation_data.get('purpose'),
+            start,
+            end,
+            quantity
+        ))
+        return cursor.lastrowid
+
+    def _do_cancel_reservation(self, cursor, reservation_id):
+        cursor.execute(
+            'UPDATE reservations SET status = ? WHERE id = ? AND status = ?',
+            (reservations.CANCELLED, reservation_id, reservations.ACTIVE)
+        )
+        return cursor.rowcount > 0
+
+    def _do_take_stock_checkpoint(self, cursor, if_due):
+        today = self._now().strftime('%Y-%m-%d')
+        if if_due and not stock_history.checkpoint_due(cursor, on_date=today):
+            return None
+        return stock_history.take_checkpoint(cursor, as_of=today)
+
+    def _do_import_items(self, cursor, items):
+        success_count = 0
+        duplicate_count = 0
+        # (position in items, message) of every item the database rejected
+        failed = []
+        for position, item in enumerate(items):
+            try:
+                # Cek apakah barcode sudah dipakai barang yang belum dihapus
+                cursor.execute("SELECT id FROM items WHERE barcode=? AND deleted_at IS NULL",
+                               (item.get('barcode'),))
+                if cursor.fetchone() is None:  # Barcode belum ada
+                    cursor.execute('''
+                        INSERT INTO items (name, barcode, quantity, location, condition, status, photo_path, created_at)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    ''', (
+                        item['name'],
+                        item['barcode'],
+                        item['quantity'],
+                        item.get('location', ''),
+                        item.get('condition', 'Baik'),
+                        item.get('status', 'Tersedia'),
+                        item.get('photo_path'),
+                        self._utc_stamp()
+                    ))
+                    success_count += 1
+                else:
+                    duplicate_count += 1
+            except sqlite3.Error as e:
+                logging.error(f"Gagal impor item {item.get('name')}: {str(e)}")
+                failed.append((position, str(e)))
+        return success_count, duplicate_count, failed
+
+    def add_item(self, item_data):
+        try:
+            return self._write('add_item', item_data)
         except sqlite3.Error as e:
-            messagebox.showerror("Database Error", str(e))
+            self.report_error("Database Error", str(e))
             return None
-        finally:
-            conn.close()
     
     def update_item(self, item_id, item_data):
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
-        
         try:
-            cursor.execute('''
-            UPDATE items 
-            SET name=?, quantity=?, location=?, condition=?, status=?, photo_path=?
-            WHERE id=?
-            ''', (
-                item_data['name'],
-                item_data['quantity'],
-                item_data['location'],
-                item_data['condition'],
-                item_data['status'],
-                item_data['photo_path'],
-                item_id
-            ))
-            conn.commit()
-            return cursor.rowcount > 0
+            return self._write('update_item', item_id, item_data)
+        except StaleItemError:
+            self.report_error("Error", "Jumlah barang berubah sejak form dibuka (ada peminjaman atau "
+                                       "pengembalian). Pilih barang lagi lalu ulangi perubahan.")
+            return False
         except sqlite3.Error as e:
-            messagebox.showerror("Database Error", str(e))
+            self.report_error("Database Error", str(e))
             return False
-        finally:
-            conn.close()
     
     def delete_item(self, item_id):
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
-        
         try:
-            cursor.execute('DELETE FROM items WHERE id=?', (item_id,))
-            conn.commit()
-            return cursor.rowcount > 0
+            return self._write('delete_item', item_id)
         except sqlite3.Error as e:
-            messagebox.showerror("Database Error", str(e))
+            self.report_error("Database Error", str(e))
             return False
-        finally:
-            conn.close()
-    
-    def get_item(self, item_id):
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
-        
+
+    def update_items(self, item_ids, changes):
+        """Bulk edit in one transaction; returns the number of items changed or None"""
         try:
-            cursor.execute('SELECT * FROM items WHERE id=?', (item_id,))
-            return cursor.fetchone()
+            return self._write('update_items', list(item_ids), changes)
         except sqlite3.Error as e:
-            messagebox.showerror("Database Error", str(e))
+            self.report_error("Database Error", str(e))
             return None
-        finally:
-            conn.close()
+
+    def delete_items(self, item_ids):
+        """Bulk delete in one transaction; returns the number of items deleted or None"""
+        try:
+            return self._write('delete_items', list(item_ids))
+        except sqlite3.Error as e:
+            self.report_error("Database Error", str(e))
+            return None
+
+    def purge_deleted_items(self, older_than_days=DEFAULT_PURGE_AFTER_DAYS, policy=PURGE_ARCHIVE):
+        """Permanently remove items soft-deleted more than older_than_days ago.
+
+        Their history (and history left behind by old hard deletes) is moved
+        to transactions_archive or, with PURGE_CASCADE, deleted. Returns
+        {'items': n, 'transactions': n}.
+        """
+        if policy not in PURGE_POLICIES:
+            raise ValueError(f"policy harus salah satu dari {PURGE_POLICIES}")
+        try:
+            return self._write('purge_deleted_items', older_than_days, policy)
+        except sqlite3.Error as e:
+            self.report_error("Database Error", str(e))
+            return {'items': 0, 'transactions': 0}
+
+    def import_items(self, items):
+        """Insert items whose barcode is not in use yet.
+
+        Returns (imported, duplicates, failed), failed holding a (position in
+        items, message) pair for every item the database rejected.
+        """
+        try:
+            return self._write('import_items', items)
+        except sqlite3.Error as e:
+            self.report_error("Database Error", str(e))
+            return 0, 0, []
     
-    def search_items(self, search_term):
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
-        
+    def _iter_query(self, query, params, record, batch_size=DEFAULT_BATCH_SIZE):
+        """Yield `record` rows for query, fetching batch_size rows at a time"""
+        conn = self._connect()
+        conn.row_factory = records.row_factory(record)
         try:
-            cursor.execute('''
-            SELECT * FROM items 
-            WHERE name LIKE ? OR barcode LIKE ?
-            ''', (f'%{search_term}%', f'%{search_term}%'))
-            return cursor.fetchall()
+            cursor = conn.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield from rows
         except sqlite3.Error as e:
-            messagebox.showerror("Database Error", str(e))
-            return []
+            self.report_error("Database Error", str(e))
         finally:
             conn.close()
+
+    def get_item(self, item_id):
+        rows = self._iter_query(
+            f"SELECT {', '.join(records.ITEM_FIELDS)} FROM items WHERE id=? AND deleted_at IS NULL",
+            (item_id,), records.Item
+        )
+        item = next(rows, None)
+        rows.close()
+        return item
     
-    def get_all_items(self):
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
-        
+    @staticmethod
+    def _item_conditions(search_term=None, filters=None, exclude=None):
+        """WHERE clause for the free-text search plus facet filters.
+
+        filters maps a facet column to a value or a list of values, where
+        EMPTY_FACET matches NULL and ''; the facet named by exclude is left
+        out (used for that facet's own counts).
+        """
+        conditions, params = ['deleted_at IS NULL'], []
+        if search_term:
+            conditions.append('(name LIKE ? OR barcode LIKE ?)')
+            params += [f'%{search_term}%', f'%{search_term}%']
+        for column, value in (filters or {}).items():
+            if column not in ITEM_FACETS:
+                raise ValueError(f"Filter barang tidak dikenal: {column}")
+            if column == exclude or value in (None, '', []):
+                continue
+            values = value if isinstance(value, (list, tuple)) else [value]
+            filled = [v for v in values if v != EMPTY_FACET]
+            matches = []
+            if filled:
+                matches.append(f"{column} IN ({', '.join('?' * len(filled))})")
+                params += filled
+            if len(filled) < len(values):
+                matches.append(f"{column} IS NULL OR {column} = ''")
+            conditions.append(f"({' OR '.join(matches)})")
+        where = f"WHERE {' AND '.join(conditions)}"
+        return where, params
+
+    def iter_items(self, columns=None, search_term=None, filters=None, order_by='id',
+                   descending=False, batch_size=DEFAULT_BATCH_SIZE):
+        """Stream items as records holding only the requested columns.
+
+        Filtering (see _item_conditions) and sorting happen in SQL.
+        """
+        record = records.item_record(columns)
+        if order_by not in records.ITEM_FIELDS:
+            raise ValueError(f"Kolom urutan tidak dikenal: {order_by}")
+        where, params = self._item_conditions(search_term, filters)
+        direction = 'DESC' if descending else 'ASC'
+        collate = ' COLLATE NOCASE' if order_by in TEXT_SORT_COLUMNS else ''
+        # id breaks ties so equal values keep a stable order
+        return self._iter_query(
+            f"SELECT {', '.join(record._fields)} FROM items {where} "
+            f"ORDER BY {order_by}{collate} {direction}, id {direction}",
+            params, record, batch_size
+        )
+
+    def list_items(self, columns=None, search_term=None, filters=None, order_by='id',
+                   descending=False):
+        """iter_items as a list (for callers that cannot stream, e.g. the server)"""
+        return list(self.iter_items(columns, search_term, filters, order_by, descending))
+
+    def item_facets(self, search_term=None, filters=None):
+        """Counts per location, condition and status in one grouped query.
+
+        Each facet is counted with every other filter applied but not its own,
+        so the user can still see the alternatives. Returns
+        {facet: [(value, count), ...]}, with NULL and '' counted together as
+        EMPTY_FACET.
+        """
+        parts, params = [], []
+        for facet in ITEM_FACETS:
+            where, facet_params = self._item_conditions(search_term, filters, exclude=facet)
+            parts.append(f'''
+                SELECT '{facet}' AS facet, {facet} AS value, COUNT(*) AS total
+                FROM items {where} GROUP BY {facet}
+            ''')
+            params += facet_params
+        facets = {facet: [] for facet in ITEM_FACETS}
+        conn = self._connect()
         try:
-            cursor.execute('SELECT * FROM items')
-            return cursor.fetchall()
+            rows = conn.execute(
+                ' UNION ALL '.join(parts) + ' ORDER BY facet, value', params
+            ).fetchall()
+            for facet, value, total in rows:
+                if value in (None, ''):
+                    # Both sort first, so the other one is the entry before
+                    value = EMPTY_FACET
+                    if facets[facet] and facets[facet][-1][0] == EMPTY_FACET:
+                        total += facets[facet].pop()[1]
+                facets[facet].append((value, total))
         except sqlite3.Error as e:
-            messagebox.showerror("Database Error", str(e))
-            return []
+            self.report_error("Database Error", str(e))
         finally:
             conn.close()
+        return facets
+    
+    def search_items(self, search_term):
+        return list(self.iter_items(search_term=search_term))
+    
+    def get_all_items(self):
+        return list(self.iter_items())
     
     def add_transaction(self, transaction_data):
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
-        
         try:
-            # Add transaction to table
-            cursor.execute('''
-                INSERT INTO transactions (item_id, type, borrower, purpose, date, due_date, quantity)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                transaction_data['item_id'],
-                transaction_data['type'],
-                transaction_data['borrower'],
-                transaction_data['purpose'],
-                transaction_data['date'],
-                transaction_data['due_date'],
-                transaction_data.get('quantity', 1)
-            ))
-            
-            # Update item stock
-            quantity = transaction_data.get('quantity', 1)
-            item_id = transaction_data['item_id']
-
-            if transaction_data['type'] == 'borrow':
-                cursor.execute('''
-                    UPDATE items SET quantity = quantity - ? WHERE id = ?
-                ''', (quantity, item_id))
-            elif transaction_data['type'] == 'return':
-                cursor.execute('''
-                    UPDATE items SET quantity = quantity + ? WHERE id = ?
-                ''', (quantity, item_id))
-            
-            conn.commit()
-            return cursor.lastrowid
+            return self._write('add_transaction', transaction_data)
+        except ReservationConflictError:
+            self.report_error("Error", "Barang sudah direservasi pada rentang tanggal tersebut")
+            return None
+        except InsufficientStockError:
+            self.report_error("Error", "Jumlah barang tidak mencukupi")
+            return None
         except sqlite3.Error as e:
-            conn.rollback()
-            messagebox.showerror("Database Error", str(e))
+            self.report_error("Database Error", str(e))
             return None
-        finally:
-            conn.close()
+
+    def process_return(self, trans_id, purpose):
+        """Record the return of a borrow transaction and restore its stock"""
+        try:
+            return_id = self._write('process_return', trans_id, purpose)
+        except sqlite3.Error as e:
+            self.report_error("Database Error", str(e))
+            return None
+        if return_id is None:
+            self.report_error("Error", "Transaksi sudah dikembalikan atau tidak ditemukan")
+        return return_id
     
-    def get_transactions(self, item_id=None):
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
-        
+    @staticmethod
+    def _prefix_pattern(prefix):
+        """LIKE pattern for names starting with prefix; use with ESCAPE '\\'"""
+        # Escape LIKE wildcards so the search stays a plain index range scan
+        return prefix.strip().replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+    def iter_transactions(self, item_id=None, include_archive=False, columns=None,
+                          open_only=False, due_before=None, filters=None,
+                          order_by='date', descending=True, batch_size=DEFAULT_BATCH_SIZE):
+        """Stream transactions (joined with the item name), newest first by default.
+
+        open_only limits to borrows not yet returned, due_before to those due
+        before a YYYY-MM-DD date. filters may hold 'type', 'borrower'
+        (start of the borrower's name, any case; matches their returns too),
+        'borrower_id', 'date_from' and 'date_to' (YYYY-MM-DD, inclusive).
+        Only the hot table is read unless include_archive is set.
+        """
+        record = records.transaction_record(columns)
+        if order_by not in records.TRANSACTION_FIELDS:
+            raise ValueError(f"Kolom urutan tidak dikenal: {order_by}")
+        # LEFT JOIN: history of purged items stays visible
+        item_name = f"COALESCE(i.name, '{DELETED_ITEM_NAME}')"
+        select = ', '.join(
+            f'{item_name} AS item_name' if column == 'item_name' else f't.{column} AS {column}'
+            for column in record._fields
+        )
+        sort_key = item_name if order_by == 'item_name' else f't.{order_by}'
+        conditions, params = [], []
+        if item_id:
+            conditions.append('t.item_id = ?')
+            params.append(item_id)
+        if open_only or due_before:
+            conditions.append("t.type = 'borrow' AND t.returned = 0")
+        if due_before:
+            conditions.append('t.due_date < ?')
+            params.append(due_before)
+        filters = filters or {}
+        unknown = set(filters) - set(TRANSACTION_FILTERS)
+        if unknown:
+            raise ValueError(f"Filter transaksi tidak dikenal: {', '.join(sorted(unknown))}")
+        if filters.get('type'):
+            conditions.append('t.type = ?')
+            params.append(filters['type'])
+        if filters.get('borrower'):
+            # Through the borrower registry: its NOCASE index takes the prefix
+            # LIKE and idx_*_borrower_id the matching ids
+            conditions.append("t.borrower_id IN (SELECT id FROM borrowers WHERE name LIKE ? ESCAPE '\\')")
+            params.append(self._prefix_pattern(filters['borrower']))
+        if filters.get('borrower_id'):
+            conditions.append('t.borrower_id = ?')
+            params.append(filters['borrower_id'])
+        if filters.get('date_from'):
+            conditions.append('t.date >= ?')
+            params.append(filters['date_from'])
+        if filters.get('date_to'):
+            conditions.append('t.date <= ?')
+            params.append(filters['date_to'])
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+
+        tables = ['transactions'] + (['transactions_archive'] if include_archive else [])
+        parts = [f'''
+            SELECT {select}, {sort_key} AS sort_key, t.id AS sort_id
+            FROM {table} t
+            LEFT JOIN items i ON t.item_id = i.id
+            {where}
+        ''' for table in tables]
+        direction = 'DESC' if descending else 'ASC'
+        query = f'''
+            SELECT {', '.join(record._fields)}
+            FROM ({' UNION ALL '.join(parts)})
+            ORDER BY sort_key {direction}, sort_id {direction}
+        '''
+        return self._iter_query(query, params * len(tables), record, batch_size)
+
+    def list_transactions(self, item_id=None, include_archive=False, columns=None,
+                          open_only=False, due_before=None, filters=None,
+                          order_by='date', descending=True):
+        """iter_transactions as a list (for callers that cannot stream)"""
+        return list(self.iter_transactions(item_id, include_archive, columns, open_only,
+                                           due_before, filters, order_by, descending))
+
+    def get_transactions(self, item_id=None, include_archive=False):
+        """Transactions joined with the item name, newest first.
+
+        Only the hot table is read unless include_archive is set.
+        """
+        return list(self.iter_transactions(item_id, include_archive))
+
+    def _do_archive_transactions(self, cursor, cutoff):
+        # Loans closed before the cutoff: returned borrows by the day they
+        # came back (a long loan is not archived the day it is returned),
+        # return rows by their own date, which is that same day
+        condition = '''
+            (type = 'borrow' AND returned = 1 AND COALESCE(returned_at, due_date, date) < :cutoff)
+            OR (type = 'return' AND date < :cutoff)
+        '''
+        columns = ', '.join(TRANSACTION_COLUMNS + ('uid', 'borrower_id', 'returned_at'))
+        cursor.execute(f'''
+        INSERT OR REPLACE INTO transactions_archive ({columns})
+        SELECT {columns} FROM transactions WHERE {condition}
+        ''', {'cutoff': cutoff})
+        cursor.execute(f'DELETE FROM transactions WHERE {condition}', {'cutoff': cutoff})
+        return cursor.rowcount
+
+    def archive_transactions(self, retention_days=DEFAULT_ARCHIVE_RETENTION_DAYS):
+        """Move loans closed more than retention_days ago to the archive; returns the count"""
+        cutoff = (datetime.now() - timedelta(days=retention_days)).strftime('%Y-%m-%d')
         try:
-            if item_id:
-                cursor.execute('''
-                SELECT t.*, i.name 
-                FROM transactions t
-                JOIN items i ON t.item_id = i.id
-                WHERE t.item_id = ?
-                ORDER BY t.date DESC
-                ''', (item_id,))
-            else:
-                cursor.execute('''
-                SELECT t.*, i.name 
-                FROM transactions t
-                JOIN items i ON t.item_id = i.id
-                ORDER BY t.date DESC
-                ''')
-            return cursor.fetchall()
+            return self._write('archive_transactions', cutoff)
         except sqlite3.Error as e:
-            messagebox.showerror("Database Error", str(e))
-            return []
-        finally:
-            conn.close()
+            self.report_error("Database Error", str(e))
+            return 0
     
     def get_overdue_transactions(self):
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
-        
+        today = datetime.now().strftime('%Y-%m-%d')
+        return list(self.iter_transactions(due_before=today))
+
+    def add_reservation(self, reservation_data):
+        """Book units of an item for [start_date, end_date]; returns the id or None"""
         try:
-            today = datetime.now().strftime('%Y-%m-%d')
-            cursor.execute('''
-            SELECT t.*, i.name 
-            FROM transactions t
-            JOIN items i ON t.item_id = i.id
-            WHERE t.type = 'borrow' AND t.returned = 0 AND t.due_date < ?
-            ''', (today,))
-            return cursor.fetchall()
+            return self._write('add_reservation', reservation_data)
+        except ReservationConflictError:
+            self.report_error("Error", "Jumlah barang yang tersedia pada rentang tanggal tersebut tidak mencukupi")
+            return None
+        except (sqlite3.Error, ValueError) as e:
+            self.report_error("Database Error", str(e))
+            return None
+
+    def cancel_reservation(self, reservation_id):
+        try:
+            return self._write('cancel_reservation', reservation_id)
         except sqlite3.Error as e:
-            messagebox.showerror("Database Error", str(e))
+            self.report_error("Database Error", str(e))
+            return False
+
+    def _read_with(self, read, default):
+        """Run read(conn) against a fresh connection, reporting errors"""
+        conn = self._connect()
+        try:
+            return read(conn)
+        except sqlite3.Error as e:
+            self.report_error("Database Error", str(e))
+            return default
+        finally:
+            conn.close()
+
+    def get_available_units(self, item_id, start_date, end_date):
+        """Units free on every day of [start_date, end_date]"""
+        return self._read_with(
+            lambda conn: reservations.free_units(conn, item_id, start_date, end_date), 0)
+
+    def get_availability_calendar(self, item_id, start_date, end_date):
+        """[(day, free units)] for each day of [start_date, end_date]"""
+        return self._read_with(
+            lambda conn: reservations.availability_calendar(conn, item_id, start_date, end_date), [])
+
+    def get_reservations(self, item_id=None, upcoming_only=True):
+        """Active reservations (joined with the item name), soonest first"""
+        conditions, params = ['r.status = ?'], [reservations.ACTIVE]
+        if item_id:
+            conditions.append('r.item_id = ?')
+            params.append(item_id)
+        if upcoming_only:
+            conditions.append('r.end_date >= ?')
+            params.append(reservations.today())
+        columns = ', '.join(
+            'i.name' if field == 'item_name' else f'r.{field}' for field in records.RESERVATION_FIELDS
+        )
+        return list(self._iter_query(f'''
+            SELECT {columns} FROM reservations r
+            JOIN items i ON i.id = r.item_id
+            WHERE {' AND '.join(conditions)}
+            ORDER BY r.start_date, r.id
+        ''', params, records.Reservation))
+
+    def take_stock_checkpoint(self, if_due=False):
+        """Store today's stock of every item; with if_due only when the last one is old"""
+        try:
+            return self._write('take_stock_checkpoint', if_due)
+        except sqlite3.Error as e:
+            self.report_error("Database Error", str(e))
+            return None
+
+    def get_stock_on(self, day, item_id=None):
+        """Stock of each item at the end of day (YYYY-MM-DD), replayed from a checkpoint"""
+        return self._read_with(lambda conn: stock_history.stock_on(conn, day, item_id), [])
+
+    def reconcile_stock(self):
+        """Items whose quantity does not match the ledger since the latest checkpoint"""
+        return self._read_with(stock_history.reconcile, [])
+
+    def search_borrowers(self, prefix, limit=BORROWER_SUGGESTIONS):
+        """Registered borrower names starting with prefix (case-insensitive)"""
+        pattern = self._prefix_pattern(prefix)
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT name FROM borrowers WHERE name LIKE ? ESCAPE '\\' ORDER BY name LIMIT ?",
+                (pattern, limit)
+            ).fetchall()
+            return [row[0] for row in rows]
+        except sqlite3.Error as e:
+            self.report_error("Database Error", str(e))
             return []
         finally:
             conn.close()
 
+    def get_borrower_summary(self):
+        """Borrowers that still hold items, with loan count, units and next due date"""
+        return list(self._iter_query('''
+            SELECT b.id, b.name, COUNT(*), SUM(t.quantity), MIN(t.due_date)
+            FROM transactions t
+            JOIN borrowers b ON b.id = t.borrower_id
+            WHERE t.type = 'borrow' AND t.returned = 0
+            GROUP BY b.id
+            ORDER BY b.name
+        ''', (), records.BorrowerSummary))
+
+    def get_borrower_loans(self, borrower_id):
+        """Open loans of one borrower, earliest due first"""
+        return list(self.iter_transactions(
+            columns=BORROWER_LOAN_COLUMNS,
+            open_only=True,
+            filters={'borrower_id': borrower_id},
+            order_by='due_date',
+            descending=False
+        ))
+
 class InventoryApp:
-    def __init__(self, root):
+    def __init__(self, root, db=None, unit=None, units_config=units.DEFAULT_CONFIG,
+                 db_factory=DatabaseHandler):
         self.root = root
-        self.db_name = "inventaris.db"  # <-- TAMBAHKAN INI
         self.root.title("Manajemen Inventaris Barang Sekolah")
         self.root.geometry("1000x700")
         
-        self.db = DatabaseHandler()
+        # Each storeroom (unit) has its own database; see units.py
+        self.units_config = units_config
+        self.units, default_unit = units.load_units(units_config)
+        self.unit = unit or default_unit
+        if self.unit not in self.units:
+            raise units.UnitError(f"Unit tidak dikenal: {self.unit}")
+        
+        # db can be a RemoteDatabaseHandler when running as a thin client;
+        # db_factory opens the database of a unit (see memory_mirror.py)
+        self.db_factory = db_factory
+        self.db = db or db_factory(self.units[self.unit])
+        # Generated reports are reused until their tables change
+        self.report_cache = ReportCache(self.db.db_name) if self.db.db_name else None
         self.current_item_id = None
+        self.current_item_quantity = None
         self.photo_path = None
         self.photo_preview = None
         
+        # One detail window, reused; details of selected items are prefetched
+        self.detail_window = None
+        self.detail_item_id = None
+        self.detail_cache = OrderedDict()
+        self.detail_loading = {}
+        self.detail_prefetch_job = None
+        
         self.setup_ui()
         
     def setup_ui(self):
@@ -353,6 +1461,20 @@ class InventoryApp:
         self.main_container = ttk.Frame(self.root, style='TFrame')
         self.main_container.pack(fill='both', expand=True, padx=20, pady=20)
         
+        # Storeroom selector; thin clients use whatever the server holds
+        if self.db.db_name:
+            unit_frame = ttk.Frame(self.main_container)
+            unit_frame.pack(fill='x', pady=(0, 10))
+            
+            ttk.Label(unit_frame, text="Unit:").pack(side='left', padx=(0, 5))
+            self.unit_combobox = ttk.Combobox(unit_frame, values=list(self.units), state='readonly', width=20)
+            self.unit_combobox.set(self.unit)
+            self.unit_combobox.bind('<<ComboboxSelected>>', lambda e: self.switch_unit(self.unit_combobox.get()))
+            self.unit_combobox.pack(side='left')
+            
+            ttk.Button(unit_frame, text="Cari Semua Unit", command=self.open_all_units_search).pack(side='left', padx=10)
+            self.update_title()
+        
         # Modern Notebook with minimal styling
         self.notebook = Notebook(self.main_container, style='TNotebook')
         self.notebook.pack(fill='both', expand=True)
@@ -483,6 +1605,22 @@ class InventoryApp:
         show_all_button = ttk.Button(search_frame, text="Tampilkan Semua", command=self.show_all_items)
         show_all_button.pack(side='left', padx=5)
         
+        # Facet filters; counts come from DatabaseHandler.item_facets
+        facet_frame = ttk.Frame(search_tab)
+        facet_frame.pack(fill='x', padx=10)
+        
+        self.item_search_term = None
+        self.item_sort = ('id', False)
+        self.facet_comboboxes = {}
+        self.facet_choices = {}
+        for facet, label in (('location', 'Lokasi:'), ('condition', 'Kondisi:'), ('status', 'Status:')):
+            ttk.Label(facet_frame, text=label).pack(side='left', padx=5)
+            combobox = ttk.Combobox(facet_frame, state='readonly', width=18)
+            combobox.set(ALL_FILTER)
+            combobox.bind('<<ComboboxSelected>>', lambda e: self.refresh_items())
+            combobox.pack(side='left', padx=5)
+            self.facet_comboboxes[facet] = combobox
+        
         # Results frame
         results_frame = ttk.Frame(search_tab)
         results_frame.pack(fill='both', expand=True, padx=10, pady=10)
@@ -493,7 +1631,7 @@ class InventoryApp:
             results_frame, 
             columns=columns, 
             show='headings',
-            selectmode='browse'
+            selectmode='extended'
         )
         
         # Configure columns
@@ -515,6 +1653,11 @@ class InventoryApp:
         self.results_tree.heading('status', text='Status')
         self.results_tree.column('status', width=100)
         
+        # Click a heading to sort by it (in SQL); click again to reverse
+        self.results_tree_headings = {column: self.results_tree.heading(column, 'text') for column in columns}
+        for column in columns:
+            self.results_tree.heading(column, command=lambda c=column: self.sort_items_by(c))
+        
         # Add scrollbar
         scrollbar = ttk.Scrollbar(results_frame, orient='vertical', command=self.results_tree.yview)
         self.results_tree.configure(yscrollcommand=scrollbar.set)
@@ -534,8 +1677,19 @@ class InventoryApp:
         delete_button = ttk.Button(action_frame, text="Hapus", command=self.delete_selected_item)
         delete_button.pack(side='left', padx=5)
         
+        # Label sheet for the selection, or for everything the filters show
+        self.label_layout_combobox = ttk.Combobox(action_frame, values=list(labels.LABEL_LAYOUTS),
+                                                  state='readonly', width=6)
+        self.label_layout_combobox.set(labels.DEFAULT_LAYOUT)
+        self.label_layout_combobox.pack(side='right', padx=5)
+        self.label_per_unit_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(action_frame, text="Per unit", variable=self.label_per_unit_var).pack(side='right', padx=5)
+        self.label_button = ttk.Button(action_frame, text="Cetak Label", command=self.print_labels)
+        self.label_button.pack(side='right', padx=5)
+        
         # Bind double click to view details
         self.results_tree.bind('<Double-1>', lambda e: self.view_item_details())
+        self.results_tree.bind('<<TreeviewSelect>>', self.prefetch_selected_item)
     
     def create_transaction_tab(self):
         # Transaction Tab
@@ -558,10 +1712,29 @@ class InventoryApp:
         history_frame = ttk.Frame(trans_notebook)
         trans_notebook.add(history_frame, text="Riwayat")
         
+        # Future bookings
+        reservation_frame = ttk.Frame(trans_notebook)
+        trans_notebook.add(reservation_frame, text="Reservasi")
+        
+        # Outstanding loans per borrower
+        borrowers_frame = ttk.Frame(trans_notebook)
+        trans_notebook.add(borrowers_frame, text="Peminjam")
+        
         # Configure borrow frame
         self.setup_borrow_frame(borrow_frame)
         self.setup_return_frame(return_frame)
         self.setup_history_frame(history_frame)
+        self.setup_reservation_frame(reservation_frame)
+        self.setup_borrowers_frame(borrowers_frame)
+        
+        # Load available items
+        self.load_available_items()
+        
+        # The borrower panel is only queried while it is visible
+        trans_notebook.bind(
+            '<<NotebookTabChanged>>',
+            lambda e: self.load_borrower_summary() if e.widget.select() == str(borrowers_frame) else None
+        )
     
     def setup_borrow_frame(self, frame):
         # Item selection
@@ -572,7 +1745,9 @@ class InventoryApp:
         
         # Borrower info
         ttk.Label(frame, text="Peminjam:").grid(row=1, column=0, sticky='w', pady=5, padx=10)
-        self.borrower_entry = ttk.Entry(frame)
+        # Suggests registered borrowers while typing
+        self.borrower_entry = ttk.Combobox(frame)
+        self.borrower_entry.bind('<KeyRelease>', self.update_borrower_suggestions)
         self.borrower_entry.grid(row=1, column=1, sticky='we', pady=5, padx=10)
         
         # Purpose
@@ -603,9 +1778,105 @@ class InventoryApp:
         
         # Configure grid weights
         frame.columnconfigure(1, weight=1)
-        
-        # Load available items
-        self.load_available_items()
+    
+    def setup_reservation_frame(self, frame):
+        form = ttk.Frame(frame)
+        form.pack(fill='x')
+        
+        ttk.Label(form, text="Barang:").grid(row=0, column=0, sticky='w', pady=5, padx=10)
+        self.reservation_item_combobox = ttk.Combobox(form, state='readonly')
+        self.reservation_item_combobox.grid(row=0, column=1, columnspan=3, sticky='we', pady=5, padx=10)
+        
+        ttk.Label(form, text="Peminjam:").grid(row=1, column=0, sticky='w', pady=5, padx=10)
+        self.reservation_borrower_entry = ttk.Combobox(form)
+        self.reservation_borrower_entry.bind(
+            '<KeyRelease>',
+            lambda e: self.update_borrower_suggestions(e, self.reservation_borrower_entry)
+        )
+        self.reservation_borrower_entry.grid(row=1, column=1, columnspan=3, sticky='we', pady=5, padx=10)
+        
+        ttk.Label(form, text="Tujuan:").grid(row=2, column=0, sticky='w', pady=5, padx=10)
+        self.reservation_purpose_entry = ttk.Entry(form)
+        self.reservation_purpose_entry.grid(row=2, column=1, columnspan=3, sticky='we', pady=5, padx=10)
+        
+        ttk.Label(form, text="Dari:").grid(row=3, column=0, sticky='w', pady=5, padx=10)
+        self.reservation_start_entry = DateEntry(form, date_pattern='dd/mm/yyyy')
+        self.reservation_start_entry.grid(row=3, column=1, sticky='we', pady=5, padx=10)
+        ttk.Label(form, text="Sampai:").grid(row=3, column=2, sticky='w', pady=5, padx=10)
+        self.reservation_end_entry = DateEntry(form, date_pattern='dd/mm/yyyy')
+        self.reservation_end_entry.grid(row=3, column=3, sticky='we', pady=5, padx=10)
+        
+        ttk.Label(form, text="Jumlah:").grid(row=4, column=0, sticky='w', pady=5, padx=10)
+        self.reservation_quantity_entry = ttk.Entry(form)
+        self.reservation_quantity_entry.grid(row=4, column=1, sticky='we', pady=5, padx=10)
+        self.reservation_quantity_entry.insert(0, "1")
+        
+        button_frame = ttk.Frame(form)
+        button_frame.grid(row=5, column=1, columnspan=3, sticky='e', pady=10, padx=10)
+        ttk.Button(button_frame, text="Cek Ketersediaan", command=self.check_availability).pack(side='left', padx=5)
+        ttk.Button(button_frame, text="Simpan Reservasi", command=self.save_reservation).pack(side='left', padx=5)
+        ttk.Button(button_frame, text="Batalkan Reservasi", command=self.cancel_reservation).pack(side='left', padx=5)
+        
+        self.availability_label = ttk.Label(form, text="")
+        self.availability_label.grid(row=6, column=0, columnspan=4, sticky='w', padx=10)
+        form.columnconfigure(1, weight=1)
+        form.columnconfigure(3, weight=1)
+        
+        # Upcoming reservations
+        columns = ('id', 'item_name', 'borrower', 'start_date', 'end_date', 'quantity')
+        self.reservations_tree = ttk.Treeview(frame, columns=columns, show='headings', selectmode='browse')
+        self.reservations_tree.heading('id', text='ID')
+        self.reservations_tree.column('id', width=50, anchor='center')
+        self.reservations_tree.heading('item_name', text='Nama Barang')
+        self.reservations_tree.column('item_name', width=200)
+        self.reservations_tree.heading('borrower', text='Peminjam')
+        self.reservations_tree.column('borrower', width=150)
+        self.reservations_tree.heading('start_date', text='Dari')
+        self.reservations_tree.column('start_date', width=100)
+        self.reservations_tree.heading('end_date', text='Sampai')
+        self.reservations_tree.column('end_date', width=100)
+        self.reservations_tree.heading('quantity', text='Jumlah')
+        self.reservations_tree.column('quantity', width=80, anchor='center')
+        self.reservations_tree.pack(fill='both', expand=True, padx=10, pady=10)
+        
+        self.load_reservations()
+    
+    def setup_borrowers_frame(self, frame):
+        # Borrowers still holding items
+        columns = ('name', 'loans', 'units', 'next_due')
+        self.borrowers_tree = ttk.Treeview(
+            frame,
+            columns=columns,
+            show='headings',
+            selectmode='browse',
+            height=8
+        )
+        self.borrowers_tree.heading('name', text='Peminjam')
+        self.borrowers_tree.column('name', width=200)
+        self.borrowers_tree.heading('loans', text='Transaksi')
+        self.borrowers_tree.column('loans', width=80, anchor='center')
+        self.borrowers_tree.heading('units', text='Jumlah Barang')
+        self.borrowers_tree.column('units', width=100, anchor='center')
+        self.borrowers_tree.heading('next_due', text='Jatuh Tempo Terdekat')
+        self.borrowers_tree.column('next_due', width=150)
+        self.borrowers_tree.pack(fill='x', padx=10, pady=10)
+        self.borrowers_tree.bind('<<TreeviewSelect>>', lambda e: self.load_borrower_loans())
+        
+        # Loans of the selected borrower
+        ttk.Label(frame, text="Barang yang masih dipinjam:").pack(anchor='w', padx=10)
+        columns = ('id', 'item_name', 'date', 'due_date', 'quantity')
+        self.borrower_loans_tree = ttk.Treeview(frame, columns=columns, show='headings')
+        self.borrower_loans_tree.heading('id', text='ID')
+        self.borrower_loans_tree.column('id', width=50, anchor='center')
+        self.borrower_loans_tree.heading('item_name', text='Nama Barang')
+        self.borrower_loans_tree.column('item_name', width=200)
+        self.borrower_loans_tree.heading('date', text='Tanggal Pinjam')
+        self.borrower_loans_tree.column('date', width=120)
+        self.borrower_loans_tree.heading('due_date', text='Jatuh Tempo')
+        self.borrower_loans_tree.column('due_date', width=120)
+        self.borrower_loans_tree.heading('quantity', text='Jumlah')
+        self.borrower_loans_tree.column('quantity', width=80, anchor='center')
+        self.borrower_loans_tree.pack(fill='both', expand=True, padx=10, pady=10)
     
     def setup_return_frame(self, frame):
         # Transaction selection
@@ -630,6 +1901,54 @@ class InventoryApp:
         self.load_borrowed_items()
     
     def setup_history_frame(self, frame):
+        # Archived (closed, old) loans are only loaded on request
+        self.include_archive_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            frame,
+            text="Sertakan arsip",
+            variable=self.include_archive_var,
+            command=self.load_transaction_history
+        ).pack(anchor='w', padx=10, pady=(10, 0))
+        
+        # Filters, applied in SQL by iter_transactions
+        filter_frame = ttk.Frame(frame)
+        filter_frame.pack(fill='x', padx=10, pady=(5, 0))
+        
+        ttk.Label(filter_frame, text="Jenis:").pack(side='left', padx=(0, 5))
+        self.history_type_combobox = ttk.Combobox(
+            filter_frame,
+            values=[ALL_FILTER, 'Peminjaman', 'Pengembalian'],
+            state='readonly',
+            width=14
+        )
+        self.history_type_combobox.set(ALL_FILTER)
+        self.history_type_combobox.bind('<<ComboboxSelected>>', lambda e: self.load_transaction_history())
+        self.history_type_combobox.pack(side='left', padx=5)
+        
+        ttk.Label(filter_frame, text="Peminjam:").pack(side='left', padx=5)
+        self.history_borrower_entry = ttk.Entry(filter_frame, width=18)
+        self.history_borrower_entry.bind('<Return>', lambda e: self.load_transaction_history())
+        self.history_borrower_entry.pack(side='left', padx=5)
+        
+        self.history_date_filter_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            filter_frame,
+            text="Tanggal:",
+            variable=self.history_date_filter_var,
+            command=self.load_transaction_history
+        ).pack(side='left', padx=5)
+        self.history_date_from = DateEntry(filter_frame, date_pattern='dd/mm/yyyy', width=10)
+        self.history_date_from.pack(side='left')
+        ttk.Label(filter_frame, text="s/d").pack(side='left', padx=5)
+        self.history_date_to = DateEntry(filter_frame, date_pattern='dd/mm/yyyy', width=10)
+        self.history_date_to.pack(side='left')
+        
+        ttk.Button(
+            filter_frame,
+            text="Terapkan",
+            command=self.load_transaction_history
+        ).pack(side='left', padx=5)
+        
         # Treeview for transaction history
         columns = ('id', 'item_name', 'type', 'borrower', 'date', 'due_date', 'quantity')
         self.history_tree = ttk.Treeview(
@@ -661,6 +1980,12 @@ class InventoryApp:
         self.history_tree.heading('quantity', text='Jumlah')
         self.history_tree.column('quantity', width=80, anchor='center')
         
+        # Newest first until a heading is clicked
+        self.history_sort = ('date', True)
+        self.history_tree_headings = {column: self.history_tree.heading(column, 'text') for column in columns}
+        for column in columns:
+            self.history_tree.heading(column, command=lambda c=column: self.sort_history_by(c))
+        
         # Add scrollbar
         scrollbar = ttk.Scrollbar(frame, orient='vertical', command=self.history_tree.yview)
         self.history_tree.configure(yscrollcommand=scrollbar.set)
@@ -681,12 +2006,97 @@ class InventoryApp:
         
         ttk.Button(export_frame, text="Export ke JSON", command=self.export_to_json).pack(side='left', padx=5)
         ttk.Button(export_frame, text="Export ke PDF", command=self.export_to_pdf).pack(side='left', padx=5)
+        ttk.Button(export_frame, text="Export ke CSV/XLSX", command=self.export_to_spreadsheet).pack(side='left', padx=5)
+        ttk.Button(export_frame, text="Export Database (.invdb)", command=self.export_database).pack(side='left', padx=5)
+        ttk.Button(export_frame, text="Export Perubahan", command=self.export_changes).pack(side='left', padx=5)
         
         # Import frame
         import_frame = ttk.LabelFrame(ie_tab, text="Import Data", padding=10)
         import_frame.pack(fill='x', padx=10, pady=10)
         
         ttk.Button(import_frame, text="Import dari JSON", command=self.import_from_json).pack(side='left', padx=5)
+        ttk.Button(import_frame, text="Import dari CSV/XLSX", command=self.import_from_spreadsheet).pack(side='left', padx=5)
+        ttk.Button(import_frame, text="Import Database (.invdb)", command=self.import_database).pack(side='left', padx=5)
+        
+        # Archive frame
+        archive_frame = ttk.LabelFrame(ie_tab, text="Arsip Riwayat Transaksi", padding=10)
+        archive_frame.pack(fill='x', padx=10, pady=10)
+        
+        ttk.Label(archive_frame, text="Arsipkan peminjaman selesai lebih lama dari (hari):").pack(side='left', padx=5)
+        self.archive_days_entry = ttk.Entry(archive_frame, width=6)
+        self.archive_days_entry.insert(0, str(DEFAULT_ARCHIVE_RETENTION_DAYS))
+        self.archive_days_entry.pack(side='left', padx=5)
+        ttk.Button(archive_frame, text="Arsipkan", command=self.archive_old_transactions).pack(side='left', padx=5)
+        
+        # Permanent removal of soft-deleted items
+        purge_frame = ttk.LabelFrame(ie_tab, text="Barang Terhapus", padding=10)
+        purge_frame.pack(fill='x', padx=10, pady=10)
+        
+        ttk.Label(purge_frame, text="Hapus permanen barang yang dihapus lebih dari (hari):").pack(side='left', padx=5)
+        self.purge_days_entry = ttk.Entry(purge_frame, width=6)
+        self.purge_days_entry.insert(0, str(DEFAULT_PURGE_AFTER_DAYS))
+        self.purge_days_entry.pack(side='left', padx=5)
+        self.purge_cascade_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            purge_frame,
+            text="Hapus juga riwayatnya (bukan diarsipkan)",
+            variable=self.purge_cascade_var
+        ).pack(side='left', padx=5)
+        ttk.Button(purge_frame, text="Bersihkan", command=self.purge_deleted_items).pack(side='left', padx=5)
+        
+        # Stock on a past date and drift against the ledger
+        audit_frame = ttk.LabelFrame(ie_tab, text="Audit Stok", padding=10)
+        audit_frame.pack(fill='x', padx=10, pady=10)
+        
+        ttk.Label(audit_frame, text="Stok pada tanggal:").pack(side='left', padx=5)
+        self.audit_date_entry = DateEntry(audit_frame, date_pattern='dd/mm/yyyy', width=10)
+        self.audit_date_entry.pack(side='left', padx=5)
+        ttk.Button(audit_frame, text="Lihat Stok", command=self.show_stock_on_date).pack(side='left', padx=5)
+        ttk.Button(audit_frame, text="Rekonsiliasi", command=self.reconcile_stock).pack(side='left', padx=5)
+        ttk.Button(audit_frame, text="Simpan Checkpoint", command=self.take_stock_checkpoint).pack(side='left', padx=5)
+        ttk.Button(audit_frame, text="Analitik", command=self.show_analytics).pack(side='left', padx=5)
+        ttk.Button(audit_frame, text="Export Analitik", command=self.export_analytics).pack(side='left', padx=5)
+        
+        # Backup frame
+        backup_frame = ttk.LabelFrame(ie_tab, text="Backup Database", padding=10)
+        backup_frame.pack(fill='x', padx=10, pady=10)
+        
+        ttk.Button(backup_frame, text="Backup Sekarang", command=self.backup_now).pack(side='left', padx=5)
+        ttk.Button(backup_frame, text="Snapshot Ringkas",
+                   command=lambda: self.backup_now(snapshot=True)).pack(side='left', padx=5)
+        
+        self.backup_status_label = ttk.Label(backup_frame, text="")
+        self.backup_status_label.pack(side='left', padx=10)
+        
+        # Automatic backups only on the PC that holds the database file
+        if self.db.db_name:
+            self.root.after(AUTO_BACKUP_INTERVAL_MS, self.auto_backup)
+            self.root.after_idle(self.auto_stock_checkpoint)
+            self.last_input = time.monotonic()
+            for sequence in ('<KeyPress>', '<ButtonPress>'):
+                self.root.bind_all(sequence, self.note_input, add='+')
+            self.root.after(MAINTENANCE_CHECK_MS, self.idle_maintenance)
+    
+    def run_in_background(self, work, on_done):
+        """Run work() on a worker thread and call on_done(result, error) in the Tk loop"""
+        results = queue.Queue()
+        
+        def target():
+            try:
+                results.put((work(), None))
+            except Exception as e:
+                results.put((None, e))
+        
+        def poll():
+            try:
+                result, error = results.get_nowait()
+            except queue.Empty:
+                self.root.after(100, poll)
+                return
+            on_done(result, error)
+        
+        threading.Thread(target=target, daemon=True).start()
+        self.root.after(100, poll)
     
     # Item management methods
     def generate_barcode(self):
@@ -755,12 +2165,8 @@ class InventoryApp:
     def generate_barcode_image(self, barcode_text):
         """Generate barcode image and save to barcodes directory"""
         try:
-            # Create barcodes directory if not exists
-            os.makedirs('barcodes', exist_ok=True)
-            
-            # Generate barcode
-            code = barcode.get('code128', barcode_text, writer=ImageWriter())
-            filename = code.save(f'barcodes/{barcode_text}')
+            # Same image the label sheets reuse
+            labels.render_barcode(barcode_text)
         except Exception as e:
             messagebox.showerror("Error", f"Gagal generate barcode: {str(e)}")
     
@@ -784,6 +2190,7 @@ class InventoryApp:
         item_data = {
             'name': name,
             'quantity': int(quantity),
+            'original_quantity': self.current_item_quantity,
             'location': self.location_entry.get().strip(),
             'condition': self.condition_combobox.get(),
             'status': self.status_combobox.get(),
@@ -799,6 +2206,7 @@ class InventoryApp:
     def clear_form(self):
         """Clear the input form"""
         self.current_item_id = None
+        self.current_item_quantity = None
         self.photo_path = None
         self.photo_preview = None
         
@@ -821,122 +2229,306 @@ class InventoryApp:
             self.show_all_items()
             return
         
-        results = self.db.search_items(search_term)
-        self.display_search_results(results)
+        self.item_search_term = search_term
+        self.refresh_items()
     
     def show_all_items(self):
         """Show all items in the database"""
-        items = self.db.get_all_items()
+        self.item_search_term = None
+        for combobox in self.facet_comboboxes.values():
+            combobox.set(ALL_FILTER)
+        self.refresh_items()
+    
+    def current_item_filters(self):
+        """Facet values picked in the comboboxes"""
+        filters = {}
+        for facet, combobox in self.facet_comboboxes.items():
+            choice = combobox.get()
+            if choice and choice != ALL_FILTER:
+                filters[facet] = self.facet_choices.get(facet, {}).get(choice, choice)
+        return filters
+    
+    def refresh_items(self):
+        """Reload the results with the current search, facets and sort order"""
+        order_by, descending = self.item_sort
+        filters = self.current_item_filters()
+        items = self.db.iter_items(
+            columns=RESULT_COLUMNS,
+            search_term=self.item_search_term,
+            filters=filters,
+            order_by=order_by,
+            descending=descending
+        )
         self.display_search_results(items)
+        self.update_facet_counts(filters)
+    
+    def update_facet_counts(self, filters):
+        """Show 'value (count)' choices for every facet"""
+        facets = self.db.item_facets(self.item_search_term, filters)
+        for facet, counts in facets.items():
+            choices = {}
+            for value, total in counts:
+                choices[f"{'-' if value == EMPTY_FACET else value} ({total})"] = value
+            self.facet_choices[facet] = choices
+            combobox = self.facet_comboboxes[facet]
+            combobox['values'] = [ALL_FILTER] + list(choices)
+            # Keep the selection readable after its count changed
+            if facet in filters:
+                for label, value in choices.items():
+                    if value == filters[facet]:
+                        combobox.set(label)
+    
+    def sort_items_by(self, column):
+        """Sort the results by a column, toggling the direction on repeat clicks"""
+        order_by, descending = self.item_sort
+        self.item_sort = (column, not descending if order_by == column else False)
+        for name, text in self.results_tree_headings.items():
+            arrow = ''
+            if name == column:
+                arrow = ' ▼' if self.item_sort[1] else ' ▲'
+            self.results_tree.heading(name, text=text + arrow)
+        self.refresh_items()
     
     def display_search_results(self, items):
         """Display search results in the treeview"""
         # Clear current items
         for row in self.results_tree.get_children():
             self.results_tree.delete(row)
+        # Results are refreshed after every change, so prefetched details may be stale
+        self.detail_cache.clear()
         
         # Add new items
         for item in items:
             self.results_tree.insert('', 'end', values=(
-                item[0],  # id
-                item[1],  # name
-                item[3],  # quantity
-                item[4],  # location
-                item[5],  # condition
-                item[6]   # status
+                item.id,
+                item.name,
+                item.quantity,
+                item.location,
+                item.condition,
+                item.status
             ))
     
-    def view_item_details(self):
-        """View details of selected item"""
+    def selected_item_id(self):
         selected = self.results_tree.selection()
         if not selected:
+            return None
+        return int(self.results_tree.item(selected[0], 'values')[0])
+    
+    def selected_item_rows(self):
+        """{tree row: item id} for every selected result"""
+        return {row: int(self.results_tree.item(row, 'values')[0]) for row in self.results_tree.selection()}
+    
+    def update_result_rows(self, rows, changes=None):
+        """Apply a bulk edit (or, without changes, a delete) to the listed rows without a reload"""
+        filters = self.current_item_filters()
+        columns = self.results_tree['columns']
+        for row in rows:
+            values = dict(zip(columns, self.results_tree.item(row, 'values')))
+            self.detail_cache.pop(int(values['id']), None)
+            if changes is not None:
+                values.update(changes)
+            # Rows that no longer match the facet filters leave the view
+            if changes is None or any(values[facet] != filters[facet] for facet in changes if facet in filters):
+                self.results_tree.delete(row)
+            else:
+                self.results_tree.item(row, values=[values[column] for column in columns])
+        self.update_facet_counts(filters)
+    
+    def prefetch_selected_item(self, event=None):
+        """Load details of the selected item in the background once the selection settles"""
+        if self.detail_prefetch_job is not None:
+            self.root.after_cancel(self.detail_prefetch_job)
+        self.detail_prefetch_job = self.root.after(DETAIL_PREFETCH_DELAY_MS, self.prefetch_selection)
+    
+    def prefetch_selection(self):
+        self.detail_prefetch_job = None
+        item_id = self.selected_item_id()
+        if item_id is None:
             return
-        
-        item_id = self.results_tree.item(selected[0], 'values')[0]
-        item = self.db.get_item(item_id)
-        if not item:
-            return
-        
-        # Show details in a new window
-        detail_window = tk.Toplevel(self.root)
-        detail_window.title(f"Detail Barang - {item[1]}")
-        detail_window.geometry("500x400")
-        
-        # Main frame
-        main_frame = ttk.Frame(detail_window)
-        main_frame.pack(fill='both', expand=True, padx=10, pady=10)
-        
-        # Item details
-        ttk.Label(main_frame, text=f"Nama: {item[1]}", font=('Arial', 10, 'bold')).pack(anchor='w', pady=5)
-        ttk.Label(main_frame, text=f"Jumlah: {item[3]}").pack(anchor='w', pady=2)
-        ttk.Label(main_frame, text=f"Lokasi: {item[4]}").pack(anchor='w', pady=2)
-        ttk.Label(main_frame, text=f"Kondisi: {item[5]}").pack(anchor='w', pady=2)
-        ttk.Label(main_frame, text=f"Status: {item[6]}").pack(anchor='w', pady=2)
-        ttk.Label(main_frame, text=f"Barcode: {item[2]}").pack(anchor='w', pady=2)
-        
-        # Display photo if exists
-        if item[7]:  # photo_path
+        # An open detail window follows the selection
+        if self.detail_window is not None and self.detail_window.winfo_viewable():
+            self.detail_item_id = item_id
+            self.load_item_details(item_id, self.show_item_details)
+        else:
+            self.load_item_details(item_id)
+    
+    @staticmethod
+    def fetch_item_details(db, item_id):
+        """Item row, newest history page and photo thumbnail; runs on a worker thread"""
+        with db.collect_errors() as errors:
+            item = db.get_item(item_id)
+            if item is None:
+                return {'item': None, 'errors': errors}
+            rows = db.iter_transactions(item_id, columns=DETAIL_HISTORY_COLUMNS)
+            history = list(islice(rows, DETAIL_HISTORY_PAGE))
+            rows.close()
+        
+        thumbnail, photo_error = None, False
+        if item.photo_path:
             try:
-                image = Image.open(item[7])
-                image.thumbnail((200, 200))
-                photo = ImageTk.PhotoImage(image)
-                
-                photo_label = ttk.Label(main_frame, image=photo)
-                photo_label.image = photo  # Keep reference
-                photo_label.pack(pady=10)
-            except Exception as e:
-                ttk.Label(main_frame, text="Foto tidak dapat dimuat").pack(pady=10)
-        
-        # Transaction history
-        ttk.Label(main_frame, text="Riwayat Transaksi:", font=('Arial', 10, 'bold')).pack(anchor='w', pady=10)
-        
-        # Treeview for transaction history
-        columns = ('type', 'borrower', 'date', 'due_date', 'quantity')
-        history_tree = ttk.Treeview(
-            main_frame, 
-            columns=columns, 
-            show='headings',
-            height=5
-        )
+                with Image.open(item.photo_path) as image:
+                    image.thumbnail(DETAIL_THUMBNAIL_SIZE)
+                    thumbnail = image.copy()
+            except Exception:
+                photo_error = True
+        return {'item': item, 'history': history, 'thumbnail': thumbnail, 'photo_error': photo_error,
+                'errors': errors}
+    
+    def load_item_details(self, item_id, on_loaded=None):
+        """Call on_loaded(item_id, details) from the cache or after a background load"""
+        details = self.detail_cache.get(item_id)
+        if details is not None:
+            self.detail_cache.move_to_end(item_id)
+            if on_loaded:
+                on_loaded(item_id, details)
+            return
         
-        # Configure columns
-        history_tree.heading('type', text='Jenis')
-        history_tree.column('type', width=100, anchor='center')
+        # A load already running for this item just gets another callback
+        if item_id in self.detail_loading:
+            if on_loaded:
+                self.detail_loading[item_id].append(on_loaded)
+            return
+        self.detail_loading[item_id] = [on_loaded] if on_loaded else []
+        db = self.db
         
-        history_tree.heading('borrower', text='Peminjam')
-        history_tree.column('borrower', width=150)
+        def done(details, error):
+            callbacks = self.detail_loading.pop(item_id, [])
+            if error is not None:
+                logging.error(f"Gagal memuat detail barang {item_id}: {error}")
+                return
+            # The unit was switched while loading
+            if db is not self.db:
+                return
+            # Reported here, on the Tk thread; an incomplete load is not cached
+            errors = details.pop('errors')
+            if errors:
+                for title, message in errors:
+                    db.report_error(title, message)
+                return
+            if details['item'] is not None:
+                # PhotoImage must be created on the Tk thread; it is kept for reuse
+                thumbnail = details.pop('thumbnail')
+                details['photo'] = ImageTk.PhotoImage(thumbnail) if thumbnail else None
+                self.detail_cache[item_id] = details
+                while len(self.detail_cache) > DETAIL_CACHE_SIZE:
+                    self.detail_cache.popitem(last=False)
+            for callback in callbacks:
+                callback(item_id, details)
+        
+        self.run_in_background(lambda: self.fetch_item_details(db, item_id), done)
+    
+    def setup_detail_window(self):
+        """Build the detail window once; closing it only hides it"""
+        window = tk.Toplevel(self.root)
+        window.geometry("500x400")
+        window.protocol("WM_DELETE_WINDOW", window.withdraw)
+        self.detail_window = window
+        
+        main_frame = ttk.Frame(window)
+        main_frame.pack(fill='both', expand=True, padx=10, pady=10)
         
-        history_tree.heading('date', text='Tanggal')
-        history_tree.column('date', width=100)
+        self.detail_labels = {}
+        for field in ('name', 'quantity', 'location', 'condition', 'status', 'barcode'):
+            if field == 'name':
+                label = ttk.Label(main_frame, font=('Arial', 10, 'bold'))
+                label.pack(anchor='w', pady=5)
+            else:
+                label = ttk.Label(main_frame)
+                label.pack(anchor='w', pady=2)
+            self.detail_labels[field] = label
         
-        history_tree.heading('due_date', text='Jatuh Tempo')
-        history_tree.column('due_date', width=100)
+        self.detail_photo_label = ttk.Label(main_frame)
+        self.detail_photo_label.pack(pady=10)
         
-        history_tree.heading('quantity', text='Jumlah')
-        history_tree.column('quantity', width=80, anchor='center')
+        ttk.Label(
+            main_frame,
+            text=f"Riwayat Transaksi ({DETAIL_HISTORY_PAGE} terakhir):",
+            font=('Arial', 10, 'bold')
+        ).pack(anchor='w', pady=10)
         
-        # Add scrollbar
-        scrollbar = ttk.Scrollbar(main_frame, orient='vertical', command=history_tree.yview)
-        history_tree.configure(yscrollcommand=scrollbar.set)
+        self.detail_history_tree = ttk.Treeview(
+            main_frame, 
+            columns=DETAIL_HISTORY_COLUMNS, 
+            show='headings',
+            height=5
+        )
+        for column, text, width, anchor in (('type', 'Jenis', 100, 'center'),
+                                            ('borrower', 'Peminjam', 150, 'w'),
+                                            ('date', 'Tanggal', 100, 'w'),
+                                            ('due_date', 'Jatuh Tempo', 100, 'w'),
+                                            ('quantity', 'Jumlah', 80, 'center')):
+            self.detail_history_tree.heading(column, text=text)
+            self.detail_history_tree.column(column, width=width, anchor=anchor)
+        
+        scrollbar = ttk.Scrollbar(main_frame, orient='vertical', command=self.detail_history_tree.yview)
+        self.detail_history_tree.configure(yscrollcommand=scrollbar.set)
         scrollbar.pack(side='right', fill='y')
-        history_tree.pack(fill='both', expand=True)
+        self.detail_history_tree.pack(fill='both', expand=True)
+    
+    def show_item_details(self, item_id, details):
+        """Fill the detail window, unless another item was picked while loading"""
+        if item_id != self.detail_item_id or self.detail_window is None:
+            return
+        item = details['item']
+        if item is None:
+            self.detail_window.withdraw()
+            return
         
-        # Load transaction history
-        transactions = self.db.get_transactions(item_id)
-        for trans in transactions:
-            history_tree.insert('', 'end', values=(
-                'Peminjaman' if trans[2] == 'borrow' else 'Pengembalian',
-                trans[3],  # borrower
-                trans[5],  # date
-                trans[6] if trans[6] else '-',  # due_date
-                trans[8]   # quantity
+        self.detail_window.title(f"Detail Barang - {item.name}")
+        for field, text in (('name', f"Nama: {item.name}"),
+                            ('quantity', f"Jumlah: {item.quantity}"),
+                            ('location', f"Lokasi: {item.location}"),
+                            ('condition', f"Kondisi: {item.condition}"),
+                            ('status', f"Status: {item.status}"),
+                            ('barcode', f"Barcode: {item.barcode}")):
+            self.detail_labels[field].config(text=text)
+        
+        if details['photo'] is not None:
+            self.detail_photo_label.config(image=details['photo'], text='')
+        else:
+            self.detail_photo_label.config(
+                image='', text="Foto tidak dapat dimuat" if details['photo_error'] else ''
+            )
+        
+        self.detail_history_tree.delete(*self.detail_history_tree.get_children())
+        for trans in details['history']:
+            self.detail_history_tree.insert('', 'end', values=(
+                'Peminjaman' if trans.type == 'borrow' else 'Pengembalian',
+                trans.borrower,
+                trans.date,
+                trans.due_date if trans.due_date else '-',
+                trans.quantity
             ))
     
+    def view_item_details(self):
+        """View details of selected item"""
+        item_id = self.selected_item_id()
+        if item_id is None:
+            return
+        
+        if self.detail_window is None:
+            self.setup_detail_window()
+        if item_id not in self.detail_cache:
+            # Show the window right away; the details follow when loaded
+            self.detail_window.title("Detail Barang - memuat...")
+            for label in self.detail_labels.values():
+                label.config(text='')
+            self.detail_photo_label.config(image='', text='')
+            self.detail_history_tree.delete(*self.detail_history_tree.get_children())
+        self.detail_window.deiconify()
+        self.detail_window.lift()
+        
+        self.detail_item_id = item_id
+        self.load_item_details(item_id, self.show_item_details)
+    
     def edit_selected_item(self):
         """Edit selected item from search results"""
         selected = self.results_tree.selection()
         if not selected:
             return
+        if len(selected) > 1:
+            self.bulk_edit_items()
+            return
         
         item_id = self.results_tree.item(selected[0], 'values')[0]
         item = self.db.get_item(item_id)
@@ -947,26 +2539,27 @@ class InventoryApp:
         self.notebook.select(0)
         
         # Fill the form
-        self.current_item_id = item[0]
+        self.current_item_id = item.id
+        self.current_item_quantity = item.quantity
         self.name_entry.delete(0, 'end')
-        self.name_entry.insert(0, item[1])
+        self.name_entry.insert(0, item.name)
         
         self.quantity_entry.delete(0, 'end')
-        self.quantity_entry.insert(0, str(item[3]))
+        self.quantity_entry.insert(0, str(item.quantity))
         
         self.location_entry.delete(0, 'end')
-        self.location_entry.insert(0, item[4] if item[4] else '')
+        self.location_entry.insert(0, item.location if item.location else '')
         
-        self.condition_combobox.set(item[5] if item[5] else 'Baik')
-        self.status_combobox.set(item[6] if item[6] else 'Tersedia')
+        self.condition_combobox.set(item.condition if item.condition else 'Baik')
+        self.status_combobox.set(item.status if item.status else 'Tersedia')
         
-        self.barcode_label.config(text=item[2])
+        self.barcode_label.config(text=item.barcode)
         
         # Load photo if exists
-        self.photo_path = item[7]
-        if item[7]:
+        self.photo_path = item.photo_path
+        if item.photo_path:
             try:
-                image = Image.open(item[7])
+                image = Image.open(item.photo_path)
                 image.thumbnail((200, 200))
                 photo = ImageTk.PhotoImage(image)
                 
@@ -979,42 +2572,269 @@ class InventoryApp:
         self.save_button.config(state='disabled')
         self.update_button.config(state='normal')
     
-    def delete_selected_item(self):
-        """Delete selected item from search results"""
-        selected = self.results_tree.selection()
-        if not selected:
+    def print_labels(self):
+        """Barcode label PDF for the selected items, or for all results shown"""
+        file_path = filedialog.asksaveasfilename(
+            defaultextension=".pdf",
+            filetypes=[("PDF Files", "*.pdf")]
+        )
+        if not file_path:
             return
         
-        item_id = self.results_tree.item(selected[0], 'values')[0]
+        item_ids = list(self.selected_item_rows().values()) or None
+        # Read on the Tk thread so database errors are shown; the worker only
+        # renders barcodes and writes the PDF
+        items = labels.select_items(self.db, item_ids, self.item_search_term,
+                                    self.current_item_filters())
+        if not items:
+            messagebox.showinfo("Info", "Tidak ada barang dengan barcode untuk dicetak")
+            return
+        layout = labels.LABEL_LAYOUTS[self.label_layout_combobox.get()]
+        per_unit = self.label_per_unit_var.get()
+        self.label_button.config(state='disabled')
+        
+        def done(result, error):
+            self.label_button.config(state='normal')
+            if error:
+                messagebox.showerror("Error", f"Gagal membuat label: {str(error)}")
+                return
+            messagebox.showinfo("Sukses", f"{result[0]} label berhasil dibuat di {file_path}")
         
-        if messagebox.askyesno("Konfirmasi", "Apakah Anda yakin ingin menghapus barang ini?"):
-            if self.db.delete_item(item_id):
-                messagebox.showinfo("Sukses", "Barang berhasil dihapus")
-                self.show_all_items()
+        self.run_in_background(
+            lambda: labels.write_label_sheet(items, file_path, layout, per_unit),
+            done
+        )
+    
+    def bulk_edit_items(self):
+        """Set location, condition and/or status of every selected item at once"""
+        rows = self.selected_item_rows()
+        if not rows:
+            return
+        
+        unchanged = "(tidak diubah)"
+        dialog = tk.Toplevel(self.root)
+        dialog.title(f"Edit {len(rows)} Barang")
+        dialog.transient(self.root)
+        dialog.grab_set()
+        
+        ttk.Label(dialog, text="Kosongkan yang tidak diubah").grid(row=0, column=0, columnspan=2, padx=10, pady=5)
+        ttk.Label(dialog, text="Lokasi:").grid(row=1, column=0, padx=10, pady=5, sticky='w')
+        location_entry = ttk.Entry(dialog, width=25)
+        location_entry.grid(row=1, column=1, padx=10, pady=5)
+        
+        comboboxes = {}
+        for index, (field, label, source) in enumerate((
+                ('condition', 'Kondisi:', self.condition_combobox),
+                ('status', 'Status:', self.status_combobox)), start=2):
+            ttk.Label(dialog, text=label).grid(row=index, column=0, padx=10, pady=5, sticky='w')
+            combobox = ttk.Combobox(dialog, state='readonly', width=22,
+                                    values=[unchanged] + list(source['values']))
+            combobox.set(unchanged)
+            combobox.grid(row=index, column=1, padx=10, pady=5)
+            comboboxes[field] = combobox
+        
+        def save():
+            changes = {}
+            if location_entry.get().strip():
+                changes['location'] = location_entry.get().strip()
+            for field, combobox in comboboxes.items():
+                if combobox.get() != unchanged:
+                    changes[field] = combobox.get()
+            if not changes:
+                messagebox.showerror("Error", "Tidak ada yang diubah", parent=dialog)
+                return
+            
+            count = self.db.update_items(rows.values(), changes)
+            if count is None:
+                return
+            dialog.destroy()
+            self.update_result_rows(rows, changes)
+            if 'status' in changes:
+                self.load_available_items()
+            messagebox.showinfo("Sukses", f"{count} barang berhasil diubah")
+        
+        button_frame = ttk.Frame(dialog)
+        button_frame.grid(row=4, column=0, columnspan=2, pady=10)
+        ttk.Button(button_frame, text="Simpan", command=save).pack(side='left', padx=5)
+        ttk.Button(button_frame, text="Batal", command=dialog.destroy).pack(side='left', padx=5)
+    
+    def delete_selected_item(self):
+        """Delete the selected items from search results in one transaction"""
+        rows = self.selected_item_rows()
+        if not rows:
+            return
+        
+        question = ("Apakah Anda yakin ingin menghapus barang ini?" if len(rows) == 1
+                    else f"Apakah Anda yakin ingin menghapus {len(rows)} barang ini?")
+        if messagebox.askyesno("Konfirmasi", question):
+            count = self.db.delete_items(rows.values())
+            if count:
+                messagebox.showinfo("Sukses", "Barang berhasil dihapus" if len(rows) == 1
+                                    else f"{count} barang berhasil dihapus")
+                self.update_result_rows(rows)
+                self.load_available_items()
+                self.load_reservations()
     
     # Transaction methods
     def load_available_items(self):
         """Load available items for borrowing"""
-        items = self.db.get_all_items()
-        available_items = [(item[0], item[1]) for item in items if item[6] == 'Tersedia' and item[3] > 0]
+        items = list(self.db.iter_items(columns=('id', 'name', 'quantity', 'status')))
         
         # Update combobox
-        self.borrow_item_combobox['values'] = [f"{item[1]} (ID: {item[0]})" for item in available_items]
+        self.borrow_item_combobox['values'] = [
+            f"{item.name} (ID: {item.id})"
+            for item in items if item.status == 'Tersedia' and item.quantity > 0
+        ]
+        # Items on loan today can still be booked for later
+        self.reservation_item_combobox['values'] = [f"{item.name} (ID: {item.id})" for item in items]
     
     def load_borrowed_items(self):
         """Load borrowed items for returning"""
-        transactions = self.db.get_transactions()
-        borrowed_items = [trans for trans in transactions if trans[2] == 'borrow' and trans[7] == 0]
+        borrowed_items = self.db.iter_transactions(open_only=True, columns=BORROWED_COLUMNS)
         
         # Update combobox
         self.return_trans_combobox['values'] = [
-            f"ID: {trans[0]} - {trans[8]} (oleh {trans[3]}, Jatuh Tempo: {trans[6]}, Jumlah: {trans[8]})"
+            f"ID: {trans.id} - {trans.item_name} (oleh {trans.borrower}, Jatuh Tempo: {trans.due_date}, Jumlah: {trans.quantity})"
             for trans in borrowed_items
         ]
     
+    def update_borrower_suggestions(self, event=None, entry=None):
+        """Refresh the borrower dropdown with names matching what was typed"""
+        if event is not None and event.keysym in ('Up', 'Down', 'Return', 'Escape', 'Tab'):
+            return
+        entry = entry or self.borrower_entry
+        prefix = entry.get().strip()
+        entry['values'] = self.db.search_borrowers(prefix) if prefix else []
+    
+    def load_reservations(self):
+        """Load upcoming reservations"""
+        for row in self.reservations_tree.get_children():
+            self.reservations_tree.delete(row)
+        
+        for reservation in self.db.get_reservations():
+            self.reservations_tree.insert('', 'end', values=(
+                reservation.id,
+                reservation.item_name,
+                reservation.borrower,
+                reservation.start_date,
+                reservation.end_date,
+                reservation.quantity
+            ))
+    
+    def read_reservation_form(self):
+        """Validated (item_id, start, end, quantity) from the form, or None"""
+        try:
+            item_id = int(self.reservation_item_combobox.get().split('(ID: ')[1].rstrip(')'))
+        except (IndexError, ValueError):
+            messagebox.showerror("Error", "Pilih barang yang valid")
+            return None
+        
+        quantity_text = self.reservation_quantity_entry.get().strip()
+        if not quantity_text.isdigit() or int(quantity_text) <= 0:
+            messagebox.showerror("Error", "Jumlah harus berupa angka lebih dari 0")
+            return None
+        
+        start = self.reservation_start_entry.get_date().strftime('%Y-%m-%d')
+        end = self.reservation_end_entry.get_date().strftime('%Y-%m-%d')
+        if start > end:
+            messagebox.showerror("Error", "Tanggal selesai tidak boleh sebelum tanggal mulai")
+            return None
+        return item_id, start, end, int(quantity_text)
+    
+    def check_availability(self):
+        """Show how many units are free over the chosen dates"""
+        form = self.read_reservation_form()
+        if not form:
+            return
+        item_id, start, end, _ = form
+        calendar = self.db.get_availability_calendar(item_id, start, end)
+        if not calendar:
+            return
+        free = min(units for _, units in calendar)
+        busiest = [datetime.strptime(day, '%Y-%m-%d').strftime('%d/%m') for day, units in calendar if units == free]
+        self.availability_label.config(
+            text=f"Tersedia {free} unit untuk seluruh rentang (paling sedikit pada {', '.join(busiest[:5])})"
+        )
+    
+    def save_reservation(self):
+        """Book units of the selected item"""
+        form = self.read_reservation_form()
+        if not form:
+            return
+        borrower = self.reservation_borrower_entry.get().strip()
+        if not borrower:
+            messagebox.showerror("Error", "Peminjam harus diisi")
+            return
+        item_id, start, end, quantity = form
+        
+        reservation_data = {
+            'item_id': item_id,
+            'borrower': borrower,
+            'purpose': self.reservation_purpose_entry.get().strip(),
+            'start_date': start,
+            'end_date': end,
+            'quantity': quantity
+        }
+        if self.db.add_reservation(reservation_data):
+            messagebox.showinfo("Sukses", f"Reservasi {quantity} unit berhasil disimpan")
+            self.reservation_borrower_entry.delete(0, 'end')
+            self.reservation_purpose_entry.delete(0, 'end')
+            self.availability_label.config(text="")
+            self.load_reservations()
+    
+    def cancel_reservation(self):
+        """Cancel the reservation selected in the list"""
+        selected = self.reservations_tree.selection()
+        if not selected:
+            messagebox.showerror("Error", "Pilih reservasi yang akan dibatalkan")
+            return
+        reservation_id = self.reservations_tree.item(selected[0])['values'][0]
+        if not messagebox.askyesno("Konfirmasi", "Batalkan reservasi ini?"):
+            return
+        if self.db.cancel_reservation(reservation_id):
+            self.load_reservations()
+    
+    def load_borrower_summary(self):
+        """Load borrowers that still hold items"""
+        for tree in (self.borrowers_tree, self.borrower_loans_tree):
+            for row in tree.get_children():
+                tree.delete(row)
+        
+        for summary in self.db.get_borrower_summary():
+            self.borrowers_tree.insert('', 'end', iid=str(summary.id), values=(
+                summary.name,
+                summary.loans,
+                summary.units,
+                summary.next_due if summary.next_due else '-'
+            ))
+    
+    def load_borrower_loans(self):
+        """Show the open loans of the selected borrower"""
+        for row in self.borrower_loans_tree.get_children():
+            self.borrower_loans_tree.delete(row)
+        
+        selected = self.borrowers_tree.selection()
+        if not selected:
+            return
+        for loan in self.db.get_borrower_loans(int(selected[0])):
+            self.borrower_loans_tree.insert('', 'end', values=(
+                loan.id,
+                loan.item_name,
+                loan.date,
+                loan.due_date if loan.due_date else '-',
+                loan.quantity
+            ))
+    
     def load_transaction_history(self):
         """Load all transactions for history tab"""
-        transactions = self.db.get_transactions()
+        order_by, descending = self.history_sort
+        transactions = self.db.iter_transactions(
+            include_archive=self.include_archive_var.get(),
+            columns=HISTORY_COLUMNS,
+            filters=self.current_history_filters(),
+            order_by=order_by,
+            descending=descending
+        )
         
         # Clear current items
         for row in self.history_tree.get_children():
@@ -1023,15 +2843,42 @@ class InventoryApp:
         # Add new items
         for trans in transactions:
             self.history_tree.insert('', 'end', values=(
-                trans[0],  # id
-                trans[8],  # item_name
-                'Peminjaman' if trans[2] == 'borrow' else 'Pengembalian',
-                trans[3],  # borrower
-                trans[5],  # date
-                trans[6] if trans[6] else '-',  # due_date
-                trans[8]   # quantity
+                trans.id,
+                trans.item_name,
+                'Peminjaman' if trans.type == 'borrow' else 'Pengembalian',
+                trans.borrower,
+                trans.date,
+                trans.due_date if trans.due_date else '-',
+                trans.quantity
             ))
     
+    def current_history_filters(self):
+        """Filters picked above the history tree"""
+        filters = {}
+        kind = self.history_type_combobox.get()
+        if kind == 'Peminjaman':
+            filters['type'] = 'borrow'
+        elif kind == 'Pengembalian':
+            filters['type'] = 'return'
+        borrower = self.history_borrower_entry.get().strip()
+        if borrower:
+            filters['borrower'] = borrower
+        if self.history_date_filter_var.get():
+            filters['date_from'] = self.history_date_from.get_date().strftime('%Y-%m-%d')
+            filters['date_to'] = self.history_date_to.get_date().strftime('%Y-%m-%d')
+        return filters
+    
+    def sort_history_by(self, column):
+        """Sort the history by a column, toggling the direction on repeat clicks"""
+        order_by, descending = self.history_sort
+        self.history_sort = (column, not descending if order_by == column else False)
+        for name, text in self.history_tree_headings.items():
+            arrow = ''
+            if name == column:
+                arrow = ' ▼' if self.history_sort[1] else ' ▲'
+            self.history_tree.heading(name, text=text + arrow)
+        self.load_transaction_history()
+    
     def process_borrowing(self):
         """Process item borrowing"""
         selected_item = self.borrow_item_combobox.get()
@@ -1055,9 +2902,9 @@ class InventoryApp:
             return
         quantity = int(quantity_text)
 
-        # Check availability
+        # Quick check for feedback; add_transaction re-checks atomically
         item = self.db.get_item(item_id)
-        if not item or item[3] < quantity:
+        if not item or item.quantity < quantity:
             messagebox.showerror("Error", "Jumlah barang tidak mencukupi")
             return
 
@@ -1089,6 +2936,7 @@ class InventoryApp:
             self.load_available_items()
             self.load_borrowed_items()
             self.load_transaction_history()
+            self.load_reservations()
             self.show_all_items()
     
     def process_return(self):
@@ -1106,59 +2954,10 @@ class InventoryApp:
             messagebox.showerror("Error", "Pilih transaksi yang valid")
             return
         
-        # Get transaction details
-        conn = sqlite3.connect('inventaris.db')
-        cursor = conn.cursor()
-        cursor.execute('SELECT item_id, quantity FROM transactions WHERE id=?', (trans_id,))
-        result = cursor.fetchone()
-        item_id = result[0]
-        quantity = result[1]
-        conn.close()
-        
-        # Prepare return transaction
-        transaction_data = {
-            'item_id': item_id,
-            'type': 'return',
-            'borrower': 'System',
-            'purpose': self.return_notes_entry.get().strip() or 'Pengembalian barang',
-            'date': datetime.now().strftime('%Y-%m-%d'),
-            'due_date': None,
-            'quantity': quantity
-        }
+        purpose = self.return_notes_entry.get().strip() or 'Pengembalian barang'
         
         # Save return transaction and mark original as returned
-        conn = sqlite3.connect('inventaris.db')
-        cursor = conn.cursor()
-        
-        try:
-            # Add return transaction
-            cursor.execute('''
-            INSERT INTO transactions (item_id, type, borrower, purpose, date, due_date, quantity)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                transaction_data['item_id'],
-                transaction_data['type'],
-                transaction_data['borrower'],
-                transaction_data['purpose'],
-                transaction_data['date'],
-                transaction_data['due_date'],
-                transaction_data['quantity']
-            ))
-            
-            # Mark original as returned
-            cursor.execute('''
-            UPDATE transactions SET returned = 1 WHERE id = ?
-            ''', (trans_id,))
-            
-            # Update item quantity
-            cursor.execute('''
-            UPDATE items SET quantity = quantity + ?, status = CASE 
-                WHEN quantity + ? > 0 THEN 'Tersedia' 
-                ELSE status 
-            END WHERE id = ?
-            ''', (quantity, quantity, item_id))
-            
-            conn.commit()
+        if self.db.process_return(trans_id, purpose):
             messagebox.showinfo("Sukses", "Pengembalian berhasil diproses")
             
             # Clear form
@@ -1169,11 +2968,88 @@ class InventoryApp:
             self.load_borrowed_items()
             self.load_transaction_history()
             self.show_all_items()
-        except sqlite3.Error as e:
-            conn.rollback()
-            messagebox.showerror("Database Error", str(e))
-        finally:
-            conn.close()
+    
+    def update_title(self):
+        title = "Manajemen Inventaris Barang Sekolah"
+        if len(self.units) > 1:
+            title += f" - {self.unit}"
+        self.root.title(title)
+    
+    def switch_unit(self, unit):
+        """Work on another storeroom's database"""
+        if unit == self.unit:
+            return
+        self.open_database(self.units[unit])
+        self.unit = unit
+        self.update_title()
+        
+        # Nothing from the previous unit may stay on screen
+        self.clear_form()
+        self.show_all_items()
+        self.load_available_items()
+        self.load_borrowed_items()
+        self.load_transaction_history()
+        self.load_reservations()
+        self.load_borrower_summary()
+        self.check_overdue_transactions()
+    
+    def open_database(self, db_name):
+        """Replace the database handler (and its report cache) with one for db_name"""
+        self.db.close()
+        self.db = self.db_factory(db_name)
+        self.detail_cache.clear()
+        self.report_cache.close()
+        self.report_cache = ReportCache(self.db.db_name)
+    
+    def open_all_units_search(self):
+        """Search every unit at once (read-only) and show a summary per unit"""
+        window = tk.Toplevel(self.root)
+        window.title("Cari di Semua Unit")
+        window.geometry("850x550")
+        
+        search_frame = ttk.Frame(window)
+        search_frame.pack(fill='x', padx=10, pady=10)
+        ttk.Label(search_frame, text="Cari:").pack(side='left', padx=5)
+        search_entry = ttk.Entry(search_frame, width=40)
+        search_entry.insert(0, self.search_entry.get().strip())
+        search_entry.pack(side='left', padx=5)
+        
+        columns = ('unit', 'name', 'barcode', 'quantity', 'location', 'status')
+        tree = ttk.Treeview(window, columns=columns, show='headings')
+        for column, text, width in (('unit', 'Unit', 120), ('name', 'Nama Barang', 200),
+                                    ('barcode', 'Barcode', 150), ('quantity', 'Jumlah', 70),
+                                    ('location', 'Lokasi', 120), ('status', 'Status', 100)):
+            tree.heading(column, text=text)
+            tree.column(column, width=width)
+        tree.pack(fill='both', expand=True, padx=10)
+        
+        summary_label = ttk.Label(window, text="", justify='left')
+        summary_label.pack(fill='x', padx=10, pady=10)
+        
+        def search():
+            for row in tree.get_children():
+                tree.delete(row)
+            # The other units are read straight from their files
+            self.db.flush()
+            try:
+                rows = units.search_units(self.units, search_entry.get().strip())
+                report = units.unit_report(self.units)
+            except units.UnitError as e:
+                messagebox.showerror("Error", str(e), parent=window)
+                return
+            for row in rows:
+                tree.insert('', 'end', values=(
+                    row.unit, row.name, row.barcode, row.quantity, row.location, row.status
+                ))
+            summary_label.config(text="\n".join(
+                f"{row.unit}: {row.items} barang, stok {row.stock}, dipinjam {row.on_loan}, "
+                f"terlambat {row.overdue}"
+                for row in report
+            ))
+        
+        ttk.Button(search_frame, text="Cari", command=search).pack(side='left', padx=5)
+        search_entry.bind('<Return>', lambda e: search())
+        search()
     
     def check_overdue_transactions(self):
         """Check for overdue transactions and show notification"""
@@ -1185,27 +3061,25 @@ class InventoryApp:
             )
     
     # Import/Export methods
-    def export_to_json(self):
-        """Export inventory data to JSON file"""
-        # Get all items
-        items = self.db.get_all_items()
-        
+    def export_report(self, key, tables, build, suffix, file_path, variant=None):
+        """Write a report to file_path, reusing the cached copy if its tables are unchanged"""
+        if self.report_cache is None:
+            build(file_path)
+            return False
+        # The cache reads its change counters from the file
+        self.db.flush()
+        return self.report_cache.export(key, tables, build, suffix, file_path, variant)
+    
+    def build_json_report(self, path):
         # Prepare data for export
         export_data = {
-            'items': [
-                {
-                    'name': item[1],
-                    'barcode': item[2],
-                    'quantity': item[3],
-                    'location': item[4],
-                    'condition': item[5],
-                    'status': item[6],
-                    'photo_path': item[7]
-                }
-                for item in items
-            ]
+            'items': [item._asdict() for item in self.db.iter_items(columns=EXPORT_COLUMNS)]
         }
-        
+        with open(path, 'w') as f:
+            json.dump(export_data, f, indent=4)
+    
+    def export_to_json(self):
+        """Export inventory data to JSON file"""
         # Ask for save location
         file_path = filedialog.asksaveasfilename(
             defaultextension=".json",
@@ -1214,9 +3088,9 @@ class InventoryApp:
         
         if file_path:
             try:
-                with open(file_path, 'w') as f:
-                    json.dump(export_data, f, indent=4)
-                messagebox.showinfo("Sukses", f"Data berhasil diexport ke {file_path}")
+                cached = self.export_report('items-json', ('items',), self.build_json_report, '.json', file_path)
+                note = " (tidak ada perubahan, memakai hasil sebelumnya)" if cached else ""
+                messagebox.showinfo("Sukses", f"Data berhasil diexport ke {file_path}{note}")
             except Exception as e:
                 messagebox.showerror("Error", f"Gagal export data: {str(e)}")
     
@@ -1233,53 +3107,348 @@ class InventoryApp:
                 messagebox.showerror("Error", "Format file tidak valid")
                 return
 
-            success_count = 0
-            duplicate_count = 0
-            conn = sqlite3.connect(self.db_name)
-            cursor = conn.cursor()
-
-            for item in import_data['items']:
-                try:
-                    # Cek apakah barcode sudah ada
-                    cursor.execute("SELECT id FROM items WHERE barcode=?", (item.get('barcode'),))
-                    if cursor.fetchone() is None:  # Barcode belum ada
-                        # Generate barcode baru jika tidak ada di data impor
-                        item['barcode'] = item.get('barcode') or self.generate_barcode()
-                        cursor.execute('''
-                            INSERT INTO items (name, barcode, quantity, location, condition, status, photo_path)
-                            VALUES (?, ?, ?, ?, ?, ?, ?)
-                        ''', (
-                            item['name'],
-                            item['barcode'],
-                            item['quantity'],
-                            item.get('location', ''),
-                            item.get('condition', 'Baik'),
-                            item.get('status', 'Tersedia'),
-                            item.get('photo_path')
-                        ))
-                        success_count += 1
-                    else:
-                        duplicate_count += 1
-                except sqlite3.Error as e:
-                    logging.error(f"Gagal impor item {item.get('name')}: {str(e)}")
-                    continue
-
-            conn.commit()
-            conn.close()
+            items = import_data['items']
+            for item in items:
+                # Generate barcode baru jika tidak ada di data impor
+                item['barcode'] = item.get('barcode') or self.generate_barcode()
+            success_count, duplicate_count, failed = self.db.import_items(items)
 
             message = f"Berhasil mengimpor {success_count} item"
             if duplicate_count > 0:
                 message += f"\n{duplicate_count} item duplikat dilewati"
+            if failed:
+                preview = "\n".join(f"Item {position + 1}: {error}" for position, error in failed[:5])
+                message += f"\n{len(failed)} item gagal diimpor:\n{preview}"
             messagebox.showinfo("Hasil Impor", message)
             self.show_all_items()
 
         except Exception as e:
             messagebox.showerror("Error", f"Gagal import data: {str(e)}")
     
-    def export_to_pdf(self):
-        """Export inventory report to PDF"""
+    def export_database(self):
+        """Export the whole database, transactions included, as an .invdb snapshot"""
+        if not self.db.db_name:
+            messagebox.showerror("Error", "Export database hanya dapat dijalankan di PC server")
+            return
+        
+        file_path = filedialog.asksaveasfilename(
+            defaultextension=".invdb",
+            filetypes=[("Database Inventaris", "*.invdb")]
+        )
+        if not file_path:
+            return
+        
+        try:
+            self.db.flush()
+            invdb_transfer.export_database(self.db.db_name, file_path)
+            messagebox.showinfo("Sukses", f"Database berhasil diexport ke {file_path}")
+        except (invdb_transfer.TransferError, sqlite3.Error, OSError) as e:
+            messagebox.showerror("Error", f"Gagal export database: {str(e)}")
+    
+    def export_changes(self):
+        """Export only what changed since the last export to the foundation office"""
+        if not self.db.db_name:
+            messagebox.showerror("Error", "Export perubahan hanya dapat dijalankan di PC server")
+            return
+        
+        file_path = filedialog.asksaveasfilename(
+            defaultextension=".json",
+            initialfile=f"perubahan-{datetime.now().strftime('%Y%m%d')}.json",
+            filetypes=[("JSON Files", "*.json")]
+        )
+        if not file_path:
+            return
+        
+        try:
+            self.db.flush()
+            changes = change_log.export_changes(self.db.db_name, file_path)
+        except (sqlite3.Error, OSError) as e:
+            messagebox.showerror("Error", f"Gagal export perubahan: {str(e)}")
+            return
+        
+        messagebox.showinfo(
+            "Sukses",
+            f"{len(changes['items'])} barang dan {len(changes['transactions'])} transaksi berubah "
+            f"sejak export terakhir\nTersimpan di {file_path}"
+        )
+    
+    def import_database(self):
+        """Merge an .invdb snapshot into this database"""
+        if not self.db.db_name:
+            messagebox.showerror("Error", "Import database hanya dapat dijalankan di PC server")
+            return
+        
+        file_path = filedialog.askopenfilename(filetypes=[("Database Inventaris", "*.invdb")])
+        if not file_path:
+            return
+        
+        # Same barcode means the same item unless the user wants both kept
+        rename = messagebox.askyesno(
+            "Barcode Sama",
+            "Jika barcode sudah ada, impor sebagai barang terpisah dengan barcode baru?\n"
+            "(Pilih 'No' untuk menggabungkan dengan barang yang sudah ada)"
+        )
+        policy = invdb_transfer.CONFLICT_RENAME if rename else invdb_transfer.CONFLICT_KEEP
+        
+        try:
+            self.db.flush()
+            report = invdb_transfer.import_database(self.db.db_name, file_path, policy)
+        except invdb_transfer.TransferError as e:
+            messagebox.showerror("Error", f"Gagal import database: {str(e)}")
+            return
+        # The import wrote to the file directly; reload anything cached from it
+        self.open_database(self.db.db_name)
+        
+        messagebox.showinfo(
+            "Hasil Impor",
+            f"Barang baru: {report['items_added']}\n"
+            f"Barang digabung (barang yang sama): {report['items_matched']}\n"
+            f"Transaksi diimpor: {report['transactions_added']}\n"
+            f"Stok dikurangi pinjaman yang belum kembali: {report['stock_adjusted']} barang"
+        )
+        self.load_available_items()
+        self.load_borrowed_items()
+        self.load_transaction_history()
+        self.show_all_items()
+    
+    def archive_old_transactions(self):
+        """Move closed loans past the retention window out of the hot table"""
+        days = self.archive_days_entry.get().strip()
+        if not days.isdigit():
+            messagebox.showerror("Error", "Jumlah hari harus angka")
+            return
+        
+        moved = self.db.archive_transactions(int(days))
+        messagebox.showinfo("Sukses", f"{moved} transaksi dipindahkan ke arsip")
+        self.load_transaction_history()
+    
+    def purge_deleted_items(self):
+        """Permanently remove items deleted longer ago than the given days"""
+        days = self.purge_days_entry.get().strip()
+        if not days.isdigit():
+            messagebox.showerror("Error", "Jumlah hari harus angka")
+            return
+        
+        cascade = self.purge_cascade_var.get()
+        question = ("Barang dan seluruh riwayatnya akan dihapus permanen. Lanjutkan?" if cascade
+                    else "Barang akan dihapus permanen dan riwayatnya dipindahkan ke arsip. Lanjutkan?")
+        if not messagebox.askyesno("Konfirmasi", question):
+            return
+        
+        counts = self.db.purge_deleted_items(int(days), PURGE_CASCADE if cascade else PURGE_ARCHIVE)
+        messagebox.showinfo(
+            "Sukses",
+            f"{counts['items']} barang dihapus permanen, {counts['transactions']} transaksi "
+            f"{'dihapus' if cascade else 'diarsipkan'}"
+        )
+        self.load_transaction_history()
+    
+    def show_stock_table(self, title, columns, rows):
+        """Read-only window listing rows under the given (column, heading, width)"""
+        window = tk.Toplevel(self.root)
+        window.title(title)
+        window.geometry("600x450")
+        tree = ttk.Treeview(window, columns=[c[0] for c in columns], show='headings')
+        for column, text, width in columns:
+            tree.heading(column, text=text)
+            tree.column(column, width=width)
+        tree.pack(fill='both', expand=True, padx=10, pady=10)
+        for row in rows:
+            tree.insert('', 'end', values=row)
+    
+    def show_stock_on_date(self):
+        """Stock of every item at the end of the chosen date"""
+        day = self.audit_date_entry.get_date().strftime('%Y-%m-%d')
+        rows = self.db.get_stock_on(day)
+        if not rows:
+            messagebox.showinfo("Info", "Belum ada checkpoint stok atau tidak ada barang pada tanggal tersebut")
+            return
+        self.show_stock_table(
+            f"Stok per {self.audit_date_entry.get()}",
+            (('name', 'Nama Barang', 350), ('quantity', 'Jumlah', 100)),
+            [(row.name, row.quantity) for row in rows]
+        )
+    
+    def reconcile_stock(self):
+        """Compare stored stock with the transaction ledger and list differences"""
+        rows = self.db.reconcile_stock()
+        if not rows:
+            messagebox.showinfo("Rekonsiliasi", "Stok sesuai dengan riwayat transaksi")
+            return
+        self.show_stock_table(
+            "Selisih Stok",
+            (('name', 'Nama Barang', 250), ('recorded', 'Tercatat', 90),
+             ('expected', 'Seharusnya', 90), ('drift', 'Selisih', 90)),
+            [(row.name, row.recorded, row.expected, f"{row.drift:+d}") for row in rows]
+        )
+    
+    def take_stock_checkpoint(self):
+        if self.db.take_stock_checkpoint() is not None:
+            messagebox.showinfo("Sukses", "Checkpoint stok disimpan")
+    
+    def run_analytics(self, on_done):
+        """Compute the usage analytics of the last year off the Tk thread"""
+        if not self.db.db_name:
+            messagebox.showerror("Error", "Analitik hanya dapat dijalankan di PC server")
+            return
+        try:
+            import analytics
+        except ImportError:
+            messagebox.showerror("Error", "Analitik membutuhkan NumPy (pip install numpy)")
+            return
+        
+        self.db.flush()
+        db_name = self.db.db_name
+        
+        def work():
+            conn = sqlite3.connect(db_name)
+            try:
+                return analytics.analyse(conn)
+            finally:
+                conn.close()
+        
+        def done(report, error):
+            if error:
+                messagebox.showerror("Error", f"Gagal menghitung analitik: {str(error)}")
+                return
+            on_done(report)
+        
+        self.run_in_background(work, done)
+    
+    def show_analytics(self):
+        """Utilization, peak demand and stock advice per item"""
+        def show(report):
+            period = report['period']
+            self.show_stock_table(
+                f"Analitik {period['start']} s.d. {period['end']}",
+                (('name', 'Nama Barang', 200), ('location', 'Lokasi', 100),
+                 ('utilization', 'Pemakaian', 80), ('peak', 'Puncak', 80), ('advice', 'Stok', 80)),
+                [(row['name'], row['location'], f"{row['utilization']:.0%}",
+                  f"{row['peak_demand']}/{row['owned']}", row['advice']) for row in report['items']]
+            )
+        
+        self.run_analytics(show)
+    
+    def export_analytics(self):
+        """Save every analytics table (items, locations, durations, borrowers) as JSON"""
+        file_path = filedialog.asksaveasfilename(
+            defaultextension=".json",
+            filetypes=[("JSON Files", "*.json")]
+        )
+        if not file_path:
+            return
+        
+        def save(report):
+            import analytics
+            try:
+                analytics.export_json(report, file_path)
+                messagebox.showinfo("Sukses", f"Analitik berhasil diexport ke {file_path}")
+            except OSError as e:
+                messagebox.showerror("Error", f"Gagal export analitik: {str(e)}")
+        
+        self.run_analytics(save)
+    
+    def auto_stock_checkpoint(self):
+        """Take a checkpoint when the latest one is old; reschedules itself"""
+        self.db.take_stock_checkpoint(if_due=True)
+        self.root.after(STOCK_CHECKPOINT_CHECK_MS, self.auto_stock_checkpoint)
+    
+    def backup_now(self, snapshot=False, quiet=False):
+        """Create a verified backup (or VACUUM INTO snapshot) without blocking the UI"""
+        if not self.db.db_name:
+            messagebox.showerror("Error", "Backup hanya dapat dijalankan di PC server")
+            return
+        
+        self.db.flush()
+        manager = BackupManager(self.db.db_name)
+        self.backup_status_label.config(text="Backup berjalan...")
+        
+        def done(path, error):
+            if error:
+                self.backup_status_label.config(text="Backup gagal")
+                messagebox.showerror("Error", f"Gagal backup database: {str(error)}")
+                return
+            self.backup_status_label.config(
+                text=f"Backup terakhir: {datetime.now().strftime('%d/%m/%Y %H:%M')}"
+            )
+            if not quiet:
+                messagebox.showinfo("Sukses", f"Backup tersimpan di {path}")
+        
+        self.run_in_background(lambda: manager.run(snapshot=snapshot), done)
+    
+    def auto_backup(self):
+        """Scheduled online backup; reschedules itself"""
+        self.backup_now(quiet=True)
+        self.root.after(AUTO_BACKUP_INTERVAL_MS, self.auto_backup)
+    
+    def note_input(self, event=None):
+        self.last_input = time.monotonic()
+    
+    def idle_maintenance(self):
+        """Run due maintenance once the desk has been idle; stops when it is used again"""
+        if time.monotonic() - self.last_input < MAINTENANCE_IDLE_SECONDS:
+            self.root.after(MAINTENANCE_CHECK_MS, self.idle_maintenance)
+            return
+        
+        self.db.flush()
+        manager = MaintenanceManager(self.db.db_name)
+        idle_since = self.last_input
+        
+        def done(results, error):
+            if error:
+                logging.error(f"Pemeliharaan database gagal: {error}")
+            self.root.after(MAINTENANCE_CHECK_MS, self.idle_maintenance)
+        
+        self.run_in_background(
+            lambda: manager.run(should_continue=lambda: self.last_input == idle_since), done
+        )
+    
+    def export_to_spreadsheet(self):
+        """Export inventory data to a CSV or XLSX file, streamed row by row"""
+        file_path = filedialog.asksaveasfilename(
+            defaultextension=".xlsx",
+            filetypes=[("Excel Files", "*.xlsx"), ("CSV Files", "*.csv")]
+        )
+        if not file_path:
+            return
+        
+        try:
+            count = spreadsheet.export_items(self.db, file_path)
+            messagebox.showinfo("Sukses", f"{count} barang berhasil diexport ke {file_path}")
+        except Exception as e:
+            messagebox.showerror("Error", f"Gagal export data: {str(e)}")
+    
+    def import_from_spreadsheet(self):
+        """Import items from a CSV or XLSX file in chunks, reporting bad rows"""
+        file_path = filedialog.askopenfilename(
+            filetypes=[("Spreadsheet", "*.xlsx *.csv"), ("Excel Files", "*.xlsx"), ("CSV Files", "*.csv")]
+        )
+        if not file_path:
+            return
+        
+        # Timestamp barcodes repeat within a second, so add the row number
+        prefix = self.generate_barcode()
+        try:
+            report = spreadsheet.import_items(self.db, file_path, lambda row: f"{prefix}-{row}")
+        except Exception as e:
+            messagebox.showerror("Error", f"Gagal import data: {str(e)}")
+            return
+        
+        message = f"Berhasil mengimpor {report.imported} item"
+        if report.duplicates > 0:
+            message += f"\n{report.duplicates} item duplikat dilewati"
+        if report.errors:
+            error_path = os.path.splitext(file_path)[0] + "-kesalahan.csv"
+            report.write_errors(error_path)
+            preview = "\n".join(f"Baris {row}: {error}" for row, error in report.errors[:5])
+            message += f"\n{len(report.errors)} baris bermasalah (detail di {error_path}):\n{preview}"
+        messagebox.showinfo("Hasil Impor", message)
+        self.load_available_items()
+        self.show_all_items()
+    
+    def build_pdf_report(self, path):
         # Get all items
-        items = self.db.get_all_items()
+        items = self.db.iter_items(columns=RESULT_COLUMNS)
         
         # Create PDF
         pdf = FPDF()
@@ -1305,18 +3474,23 @@ class InventoryApp:
         
         # Add items
         pdf.set_font("Arial", size=10)
+        total = 0
         for item in items:
-            pdf.cell(10, 10, str(item[0]), border=1)
-            pdf.cell(70, 10, item[1], border=1)
-            pdf.cell(20, 10, str(item[3]), border=1)
-            pdf.cell(40, 10, item[4] if item[4] else '-', border=1)
-            pdf.cell(30, 10, item[5] if item[5] else '-', border=1)
-            pdf.cell(30, 10, item[6] if item[6] else '-', border=1, ln=1)
+            total += 1
+            pdf.cell(10, 10, str(item.id), border=1)
+            pdf.cell(70, 10, item.name, border=1)
+            pdf.cell(20, 10, str(item.quantity), border=1)
+            pdf.cell(40, 10, item.location if item.location else '-', border=1)
+            pdf.cell(30, 10, item.condition if item.condition else '-', border=1)
+            pdf.cell(30, 10, item.status if item.status else '-', border=1, ln=1)
         
         # Add summary
         pdf.ln(10)
-        pdf.cell(200, 10, txt=f"Total Barang: {len(items)}", ln=1)
-        
+        pdf.cell(200, 10, txt=f"Total Barang: {total}", ln=1)
+        pdf.output(path)
+    
+    def export_to_pdf(self):
+        """Export inventory report to PDF"""
         # Ask for save location
         file_path = filedialog.asksaveasfilename(
             defaultextension=".pdf",
@@ -1325,12 +3499,43 @@ class InventoryApp:
         
         if file_path:
             try:
-                pdf.output(file_path)
-                messagebox.showinfo("Sukses", f"Laporan berhasil diexport ke {file_path}")
+                # The report is dated, so a cached copy is only reused the same day
+                cached = self.export_report('items-pdf', ('items',), self.build_pdf_report, '.pdf',
+                                            file_path, variant=datetime.now().strftime('%Y-%m-%d'))
+                note = " (tidak ada perubahan, memakai hasil sebelumnya)" if cached else ""
+                messagebox.showinfo("Sukses", f"Laporan berhasil diexport ke {file_path}{note}")
             except Exception as e:
                 messagebox.showerror("Error", f"Gagal export PDF: {str(e)}")
 
 if __name__ == "__main__":
+    # Label sheets render barcodes in worker processes; needed in the .exe build
+    multiprocessing.freeze_support()
+    parser = argparse.ArgumentParser(description="Manajemen Inventaris Barang Sekolah")
+    parser.add_argument('--server', help="URL server inventaris, mis. http://192.168.1.10:8765")
+    parser.add_argument('--unit', help="unit gudang yang dibuka (lihat units.json)")
+    parser.add_argument('--units-config', default=units.DEFAULT_CONFIG)
+    parser.add_argument('--memory', action='store_true',
+                        help="baca dari salinan database di memori (PC lambat, satu pengguna)")
+    parser.add_argument('--durability', choices=DURABILITY_LEVELS,
+                        help="seberapa kuat setiap commit disimpan ke disk; 'normal' dan 'off' "
+                             "bisa merusak database bila listrik padam (pakai hanya dengan UPS)")
+    args = parser.parse_args()
+
+    db = None
+    db_factory = functools.partial(DatabaseHandler, durability=args.durability)
+    if args.server:
+        # Imported here: inventory_server itself imports this module
+        from inventory_server import RemoteDatabaseHandler
+        db = RemoteDatabaseHandler(args.server)
+    elif args.memory:
+        from memory_mirror import MirroredDatabaseHandler
+        db_factory = functools.partial(MirroredDatabaseHandler, durability=args.durability)
+
     root = tk.Tk()
-    app = InventoryApp(root)
-    root.mainloop()
\ No newline at end of file
+    try:
+        app = InventoryApp(root, db, args.unit, args.units_config, db_factory)
+    except units.UnitError as e:
+        root.destroy()
+        raise SystemExit(f"Gagal: {e}")
+    root.mainloop()
+    app.db.close()
\ No newline at end of file
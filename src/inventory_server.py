@@ -0,0 +1,317 @@
+"""Server mode: share one inventaris.db between several desks over HTTP/JSON.
+
+The server owns the database file. Reads are answered concurrently on the
+request threads, while every write is handed to a single writer thread that
+groups the writes arriving close together into one transaction (each write
+in its own SAVEPOINT, so one failure does not undo the others).
+
+The API has no user accounts: anyone who can reach the port could delete
+or purge items. Off this PC the server therefore refuses to start without a
+shared token, which every desk must send along. Start the server on the PC
+that holds the database:
+
+    set INVENTARIS_TOKEN=<kata sandi bersama>
+    python src/inventory_server.py --host 192.168.1.10 --port 8765
+
+and run the desks as thin clients, with the same INVENTARIS_TOKEN set:
+
+    python src/inventaris_barang.py --server http://192.168.1.10:8765
+"""
+import argparse
+import hmac
+import ipaddress
+import json
+import logging
+import os
+import sqlite3
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import records
+import stock_history
+from inventaris_barang import (DURABILITY_LEVELS, DatabaseHandler, InsufficientStockError,
+                               ReservationConflictError, StaleItemError)
+from write_queue import DEFAULT_BATCH_WINDOW, DEFAULT_MAX_BATCH, WriteBatcher
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+TOKEN_HEADER = 'X-Inventaris-Token'
+TOKEN_ENV = 'INVENTARIS_TOKEN'
+
+READ_METHODS = (
+    'get_item',
+    'search_items',
+    'get_all_items',
+    'get_transactions',
+    'get_overdue_transactions',
+    'list_items',
+    'list_transactions',
+    'item_facets',
+    'search_borrowers',
+    'get_borrower_summary',
+    'get_borrower_loans',
+    'get_available_units',
+    'get_availability_calendar',
+    'get_reservations',
+    'get_stock_on',
+    'reconcile_stock',
+)
+
+WRITE_METHODS = (
+    'add_item',
+    'update_item',
+    'delete_item',
+    'update_items',
+    'delete_items',
+    'add_transaction',
+    'process_return',
+    'import_items',
+    'archive_transactions',
+    'add_reservation',
+    'cancel_reservation',
+    'purge_deleted_items',
+    'take_stock_checkpoint',
+)
+
+
+class ServerError(Exception):
+    """A request the server answered with an error"""
+
+    def __init__(self, kind, message):
+        super().__init__(message)
+        self.kind = kind
+
+
+class ServerDatabaseHandler(DatabaseHandler):
+    """DatabaseHandler for the headless server: errors are logged, not shown"""
+
+    def report_error(self, title, message):
+        logging.error(f"{title}: {message}")
+
+
+def _error_payload(error):
+    if isinstance(error, ReservationConflictError):
+        return 409, {'error': 'reserved', 'message': str(error)}
+    if isinstance(error, InsufficientStockError):
+        return 409, {'error': 'insufficient_stock', 'message': str(error)}
+    if isinstance(error, StaleItemError):
+        return 409, {'error': 'stale', 'message': str(error)}
+    if isinstance(error, sqlite3.Error):
+        return 500, {'error': 'database', 'message': str(error)}
+    return 400, {'error': 'bad_request', 'message': str(error)}
+
+
+class InventoryRequestHandler(BaseHTTPRequestHandler):
+    server_version = 'InventarisServer/1.0'
+
+    def do_POST(self):
+        method = self.path.strip('/').split('/')[-1]
+        token = self.server.token
+        if token and not hmac.compare_digest(self.headers.get(TOKEN_HEADER, '').encode('utf-8'),
+                                             token.encode('utf-8')):
+            self._send(401, {'error': 'unauthorized', 'message': "Token server salah atau tidak ada"})
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            body = json.loads(self.rfile.read(length) or b'{}')
+            args = body.get('args', [])
+            if method in READ_METHODS:
+                result = getattr(self.server.db, method)(*args)
+            elif method in WRITE_METHODS:
+                result = self.server.writer.submit(method, args)
+            else:
+                self._send(404, {'error': 'unknown_method', 'message': method})
+                return
+        except Exception as e:
+            self._send(*_error_payload(e))
+            return
+        self._send(200, {'result': result})
+
+    def _send(self, status, payload):
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        logging.debug("%s - %s", self.address_string(), format % args)
+
+
+class InventoryServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, db=None, batch_window=DEFAULT_BATCH_WINDOW,
+                 max_batch=DEFAULT_MAX_BATCH, token=None):
+        super().__init__(address, InventoryRequestHandler)
+        # Requests must carry this in TOKEN_HEADER (None: no check)
+        self.token = token
+        self.db = db or ServerDatabaseHandler()
+        # The server is the only process touching the file, so WAL is safe
+        # here and lets readers run alongside the writer.
+        conn = self.db._connect()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.close()
+        self.writer = WriteBatcher(self.db, batch_window, max_batch)
+
+    def server_close(self):
+        super().server_close()
+        self.writer.stop()
+
+
+class RemoteDatabaseHandler(DatabaseHandler):
+    """DatabaseHandler that forwards every call to an InventoryServer"""
+
+    def __init__(self, url, timeout=30, token=None):
+        self.url = url.rstrip('/')
+        self.request_timeout = timeout
+        self.token = token if token is not None else os.environ.get(TOKEN_ENV)
+        self.db_name = None
+
+    def _call(self, method, *args):
+        data = json.dumps({'args': args}).encode('utf-8')
+        headers = {'Content-Type': 'application/json'}
+        if self.token:
+            headers[TOKEN_HEADER] = self.token
+        request = urllib.request.Request(f'{self.url}/api/{method}', data=data, headers=headers)
+        try:
+            with urllib.request.urlopen(request, timeout=self.request_timeout) as response:
+                return json.loads(response.read())['result']
+        except urllib.error.HTTPError as e:
+            payload = json.loads(e.read() or b'{}')
+            raise ServerError(payload.get('error'), payload.get('message', str(e)))
+
+    def _read(self, method, *args, default=None):
+        try:
+            return self._call(method, *args)
+        except (ServerError, OSError) as e:
+            self.report_error("Server Error", str(e))
+            return default
+
+    def _write(self, operation, *args):
+        try:
+            return self._call(operation, *args)
+        except ServerError as e:
+            if e.kind == 'reserved':
+                raise ReservationConflictError(str(e))
+            if e.kind == 'insufficient_stock':
+                raise InsufficientStockError(str(e))
+            if e.kind == 'stale':
+                raise StaleItemError(str(e))
+            raise sqlite3.Error(str(e))
+        except OSError as e:
+            raise sqlite3.Error(f"Server tidak dapat dihubungi: {e}")
+
+    def get_item(self, item_id):
+        item = self._read('get_item', item_id)
+        return records.Item._make(item) if item else None
+
+    def search_items(self, search_term):
+        return [records.Item._make(row) for row in self._read('search_items', search_term, default=[])]
+
+    def get_all_items(self):
+        return [records.Item._make(row) for row in self._read('get_all_items', default=[])]
+
+    def iter_items(self, columns=None, search_term=None, filters=None, order_by='id',
+                   descending=False, batch_size=500):
+        # Generators cannot cross HTTP; the server filters, sorts and projects
+        record = records.item_record(columns)
+        rows = self._read('list_items', columns, search_term, filters, order_by, descending,
+                          default=[])
+        return (record._make(row) for row in rows)
+
+    def item_facets(self, search_term=None, filters=None):
+        facets = self._read('item_facets', search_term, filters, default={})
+        return {facet: [tuple(row) for row in rows] for facet, rows in facets.items()}
+
+    def get_transactions(self, item_id=None, include_archive=False):
+        rows = self._read('get_transactions', item_id, include_archive, default=[])
+        return [records.Transaction._make(row) for row in rows]
+
+    def get_overdue_transactions(self):
+        return [records.Transaction._make(row) for row in self._read('get_overdue_transactions', default=[])]
+
+    def iter_transactions(self, item_id=None, include_archive=False, columns=None,
+                          open_only=False, due_before=None, filters=None,
+                          order_by='date', descending=True, batch_size=500):
+        record = records.transaction_record(columns)
+        rows = self._read('list_transactions', item_id, include_archive, columns, open_only,
+                          due_before, filters, order_by, descending, default=[])
+        return (record._make(row) for row in rows)
+
+    def search_borrowers(self, prefix, limit=10):
+        return self._read('search_borrowers', prefix, limit, default=[])
+
+    def get_borrower_summary(self):
+        return [records.BorrowerSummary._make(row)
+                for row in self._read('get_borrower_summary', default=[])]
+
+    def get_available_units(self, item_id, start_date, end_date):
+        return self._read('get_available_units', item_id, start_date, end_date, default=0)
+
+    def get_availability_calendar(self, item_id, start_date, end_date):
+        rows = self._read('get_availability_calendar', item_id, start_date, end_date, default=[])
+        return [tuple(row) for row in rows]
+
+    def get_reservations(self, item_id=None, upcoming_only=True):
+        rows = self._read('get_reservations', item_id, upcoming_only, default=[])
+        return [records.Reservation._make(row) for row in rows]
+
+    def get_stock_on(self, day, item_id=None):
+        record = records.record_type('StockLevel', stock_history.STOCK_FIELDS)
+        return [record._make(row) for row in self._read('get_stock_on', day, item_id, default=[])]
+
+    def reconcile_stock(self):
+        record = records.record_type('StockDrift', stock_history.DRIFT_FIELDS)
+        return [record._make(row) for row in self._read('reconcile_stock', default=[])]
+
+    def import_items(self, items):
+        imported, duplicates, failed = super().import_items(items)
+        return imported, duplicates, [tuple(row) for row in failed]
+
+
+def is_local_host(host):
+    """True when host only accepts connections from this PC"""
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Server inventaris untuk beberapa meja sarpras")
+    parser.add_argument('--host', default=DEFAULT_HOST,
+                        help="alamat LAN PC ini agar meja lain bisa terhubung (butuh token)")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--db', default='inventaris.db', help='database unit yang dilayani')
+    parser.add_argument('--batch-window', type=float, default=DEFAULT_BATCH_WINDOW,
+                        help='detik menunggu tulisan lain sebelum commit')
+    parser.add_argument('--max-batch', type=int, default=DEFAULT_MAX_BATCH)
+    parser.add_argument('--durability', choices=DURABILITY_LEVELS,
+                        help="seberapa kuat setiap commit disimpan ke disk; dengan WAL 'normal' "
+                             "hanya bisa kehilangan commit terakhir bila listrik padam")
+    args = parser.parse_args()
+    # Read from the environment so the token does not show up in the process list
+    token = os.environ.get(TOKEN_ENV)
+    if not token and not is_local_host(args.host):
+        parser.error(f"server yang bisa dihubungi dari PC lain butuh token: set {TOKEN_ENV} "
+                     "di server dan di setiap meja")
+
+    logging.basicConfig(level=logging.INFO)
+    server = InventoryServer((args.host, args.port), ServerDatabaseHandler(args.db, durability=args.durability),
+                             batch_window=args.batch_window, max_batch=args.max_batch, token=token)
+    logging.info(f"Server inventaris berjalan di http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,214 @@
+"""Barcode label sheets (A4 PDF) for a selection or filter of items.
+
+Every label shows the item's Code 128 barcode, its name and its location,
+laid out on a grid (LABEL_LAYOUTS, or any columns x rows). Barcode images
+live in barcodes/<barcode>.png, the same files the app writes when an item
+is saved. Only missing ones are rendered, spread over worker processes
+when there are many (the start-of-year stocktake prints thousands). In the
+PDF each image is embedded once, however many labels use it.
+
+    python src/labels.py label.pdf --db inventaris.db
+    python src/labels.py label.pdf --location "Lab Komputer" --layout 4x10
+    python src/labels.py label.pdf --grid 2x6 --per-unit
+"""
+import argparse
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import barcode
+from barcode.writer import ImageWriter
+from fpdf import FPDF
+from PIL import Image
+
+BARCODE_DIR = 'barcodes'
+# Grayscale and sized for a label: quicker to render and to embed than RGB
+BARCODE_OPTIONS = {'module_height': 8, 'font_size': 8, 'text_distance': 3, 'quiet_zone': 2}
+# Below this many missing images starting worker processes is not worth it
+PARALLEL_MIN_IMAGES = 50
+RENDER_CHUNK = 25
+
+LABEL_COLUMNS = ('id', 'name', 'barcode', 'quantity', 'location')
+
+PAGE_WIDTH, PAGE_HEIGHT = 210, 297
+DEFAULT_MARGIN = 10
+DEFAULT_GAP = 2
+LABEL_PADDING = 2
+# (columns, rows, left margin, top margin, label width, label height, horizontal gap, vertical gap) in mm
+LABEL_LAYOUTS = {
+    '3x8': (3, 8, 0, 0.5, 70, 37, 0, 0),
+    '3x7': (3, 7, 0, 0, 70, 42.4, 0, 0),
+    '4x10': (4, 10, 8, 21.5, 48.5, 25.4, 0, 0),
+    '2x7': (2, 7, 4.7, 15.2, 99.1, 38.1, 2.5, 0),
+}
+DEFAULT_LAYOUT = '3x8'
+
+
+def grid_layout(columns, rows, margin=DEFAULT_MARGIN, gap=DEFAULT_GAP):
+    """Layout filling A4 with columns x rows equal labels"""
+    width = (PAGE_WIDTH - 2 * margin - (columns - 1) * gap) / columns
+    height = (PAGE_HEIGHT - 2 * margin - (rows - 1) * gap) / rows
+    return (columns, rows, margin, margin, width, height, gap, gap)
+
+
+def barcode_path(barcode_text, directory=BARCODE_DIR):
+    return os.path.join(directory, f'{barcode_text}.png')
+
+
+def render_barcode(barcode_text, directory=BARCODE_DIR):
+    """Write the Code 128 image of barcode_text; returns its path"""
+    os.makedirs(directory, exist_ok=True)
+    path = barcode_path(barcode_text, directory)
+    image = barcode.get('code128', barcode_text, writer=ImageWriter(mode='L')).render(BARCODE_OPTIONS)
+    # A half-written file would be reused as is next time
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    image.save(tmp_path, 'PNG')
+    os.replace(tmp_path, path)
+    return path
+
+
+def render_barcodes(barcodes, directory=BARCODE_DIR, workers=None):
+    """Make sure every barcode has an image; returns how many had to be rendered"""
+    missing = [text for text in dict.fromkeys(barcodes) if not os.path.exists(barcode_path(text, directory))]
+    if len(missing) < PARALLEL_MIN_IMAGES:
+        for text in missing:
+            render_barcode(text, directory)
+        return len(missing)
+    # spawn: forking the app's process (Tk, worker threads) is not safe
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(workers, mp_context=context) as pool:
+        list(pool.map(render_barcode, missing, [directory] * len(missing), chunksize=RENDER_CHUNK))
+    return len(missing)
+
+
+def select_items(db, item_ids=None, search_term=None, filters=None):
+    """Items to label: the given ids, or everything matching search_term and filters"""
+    items = db.iter_items(columns=LABEL_COLUMNS, search_term=search_term, filters=filters, order_by='location')
+    if item_ids is None:
+        return [item for item in items if item.barcode]
+    wanted = set(item_ids)
+    return [item for item in items if item.id in wanted and item.barcode]
+
+
+def _latin1(text):
+    # The core PDF fonts only cover Latin-1
+    return (text or '-').encode('latin-1', 'replace').decode('latin-1')
+
+
+def _fit(pdf, text, width):
+    """text shortened with '...' so it fits in width"""
+    if pdf.get_string_width(text) <= width:
+        return text
+    while text and pdf.get_string_width(text + '...') > width:
+        text = text[:-1]
+    return text + '...'
+
+
+class LabelSheet:
+    def __init__(self, layout=LABEL_LAYOUTS[DEFAULT_LAYOUT], directory=BARCODE_DIR):
+        (self.columns, self.rows, self.left, self.top,
+         self.width, self.height, self.gap_x, self.gap_y) = layout
+        self.directory = directory
+        self.pdf = FPDF(unit='mm', format='A4')
+        self.pdf.set_auto_page_break(False)
+        self.pdf.set_margins(0, 0)
+        self.count = 0
+        # Image sizes, read once per file
+        self.sizes = {}
+
+    def _image_size(self, path):
+        if path not in self.sizes:
+            with Image.open(path) as image:
+                self.sizes[path] = image.size
+        return self.sizes[path]
+
+    def add(self, item):
+        """Place one label in the next free cell"""
+        cell = self.count % (self.columns * self.rows)
+        if cell == 0:
+            self.pdf.add_page()
+        self.count += 1
+        x = self.left + (cell % self.columns) * (self.width + self.gap_x) + LABEL_PADDING
+        y = self.top + (cell // self.columns) * (self.height + self.gap_y) + LABEL_PADDING
+        width = self.width - 2 * LABEL_PADDING
+        height = self.height - 2 * LABEL_PADDING
+
+        # Two text lines below the barcode, the barcode scaled into the rest
+        line = min(4, height / 5)
+        path = barcode_path(item.barcode, self.directory)
+        image_width, image_height = self._image_size(path)
+        box = height - 2 * line
+        scale = min(width / image_width, box / image_height)
+        w, h = image_width * scale, image_height * scale
+        self.pdf.image(path, x=x + (width - w) / 2, y=y, w=w, h=h)
+
+        self.pdf.set_xy(x, y + h)
+        self.pdf.set_font('Helvetica', 'B', min(9, line * 2.2))
+        self.pdf.cell(width, line, _fit(self.pdf, _latin1(item.name), width), align='C')
+        self.pdf.set_xy(x, y + h + line)
+        self.pdf.set_font('Helvetica', '', min(8, line * 2))
+        self.pdf.cell(width, line, _fit(self.pdf, _latin1(item.location), width), align='C')
+
+    def output(self, path):
+        self.pdf.output(path)
+
+
+def write_label_sheet(items, path, layout=LABEL_LAYOUTS[DEFAULT_LAYOUT], per_unit=False,
+                      directory=BARCODE_DIR, workers=None):
+    """Write the label PDF of items (see select_items); returns (labels, images rendered).
+
+    Does not touch the database, so the app runs it off the Tk thread.
+    """
+    rendered = render_barcodes((item.barcode for item in items), directory, workers)
+    sheet = LabelSheet(layout, directory)
+    for item in items:
+        # One label per unit to stick on every chair, or one per item
+        for _ in range(max(item.quantity, 1) if per_unit else 1):
+            sheet.add(item)
+    sheet.output(path)
+    return sheet.count, rendered
+
+
+def build_label_sheet(db, path, item_ids=None, search_term=None, filters=None,
+                      layout=LABEL_LAYOUTS[DEFAULT_LAYOUT], per_unit=False,
+                      directory=BARCODE_DIR, workers=None):
+    """Select the items and write their label PDF; returns (labels, images rendered)"""
+    items = select_items(db, item_ids, search_term, filters)
+    return write_label_sheet(items, path, layout, per_unit, directory, workers)
+
+
+def _grid(text):
+    columns, _, rows = text.lower().partition('x')
+    try:
+        return grid_layout(int(columns), int(rows))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Format grid harus KOLOMxBARIS, bukan {text}")
+
+
+def main():
+    from inventaris_barang import DatabaseHandler
+
+    parser = argparse.ArgumentParser(description="Cetak lembar label barcode (PDF A4)")
+    parser.add_argument('output', help='file PDF')
+    parser.add_argument('--db', default='inventaris.db')
+    parser.add_argument('--layout', choices=LABEL_LAYOUTS, default=DEFAULT_LAYOUT)
+    parser.add_argument('--grid', type=_grid, help='tata letak lain, mis. 2x6 (A4, margin 10 mm)')
+    parser.add_argument('--search', help='hanya barang yang nama/barcode-nya cocok')
+    parser.add_argument('--location')
+    parser.add_argument('--condition')
+    parser.add_argument('--status')
+    parser.add_argument('--per-unit', action='store_true', help='satu label untuk setiap unit')
+    parser.add_argument('--workers', type=int, help='jumlah proses render barcode')
+    args = parser.parse_args()
+
+    filters = {facet: getattr(args, facet) for facet in ('location', 'condition', 'status')
+               if getattr(args, facet)}
+    count, rendered = build_label_sheet(
+        DatabaseHandler(args.db), args.output, search_term=args.search, filters=filters,
+        layout=args.grid or LABEL_LAYOUTS[args.layout], per_unit=args.per_unit, workers=args.workers
+    )
+    print(f"{count} label ditulis ke {args.output} ({rendered} barcode baru dibuat)")
+
+
+if __name__ == '__main__':
+    main()
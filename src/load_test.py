@@ -0,0 +1,293 @@
+"""Load test: several stations working on one database file at once.
+
+Starts one process per station. Each runs a random mix of what a desk
+does (search, borrow, return, item edits) through DatabaseHandler, exactly
+as the app would, until the time is up. Afterwards it reports:
+
+* throughput (operations per second over all stations);
+* latency percentiles per operation;
+* lock errors ("database is locked"/"busy" after all retries) and other
+  errors per operation;
+* stock consistency: for every item, stock plus units on loan must still
+  equal what it was before the run, and no stock may be negative.
+
+Borrows refused for lack of stock are normal and counted separately.
+Always run it against a copy of the database; an empty file is filled
+with test items first.
+
+    python src/load_test.py salinan.db --stations 8 --duration 30
+    python src/load_test.py salinan.db --stations 4 --mix search=70,borrow=15,return=10,edit=5
+"""
+import argparse
+import json
+import multiprocessing
+import random
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+from inventaris_barang import (DURABILITY_LEVELS, DEFAULT_BUSY_TIMEOUT_MS, DEFAULT_MAX_RETRIES,
+                               DatabaseHandler, InsufficientStockError, RESULT_COLUMNS,
+                               StaleItemError)
+
+OPERATIONS = ('search', 'borrow', 'return', 'edit')
+DEFAULT_MIX = {'search': 50, 'borrow': 20, 'return': 20, 'edit': 10}
+DEFAULT_ITEMS = 200
+SEED_QUANTITY = 20
+PURPOSE = 'uji beban'
+SEARCH_TERMS = ('uji', 'barang', '1', '2', 'proyektor', 'kursi', 'laptop')
+PERCENTILES = (50, 95, 99)
+
+
+class LoadTestHandler(DatabaseHandler):
+    """Keeps the errors a read reports instead of showing them"""
+
+    def __init__(self, *args, migrate=True, **kwargs):
+        self.errors = []
+        # Stations skip the schema checks the main process already ran, so
+        # the measurement does not start with N processes fighting over DDL
+        self.migrate = migrate
+        super().__init__(*args, **kwargs)
+
+    def initialize_database(self):
+        if self.migrate:
+            super().initialize_database()
+
+    def report_error(self, title, message):
+        self.errors.append(message)
+
+
+def parse_mix(text):
+    """'search=50,borrow=20' -> {'search': 50, 'borrow': 20}"""
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"Operasi tidak dikenal: {name}")
+        try:
+            mix[name] = int(weight)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"Bobot tidak valid: {part}")
+    return mix
+
+
+def seed_items(db, count):
+    """Fill an empty database with count test items"""
+    items = [{
+        'name': f"Barang uji {n}",
+        'barcode': f"UJI{n:06d}",
+        'quantity': SEED_QUANTITY,
+        'location': f"Rak {n % 10}",
+        'condition': 'Baik',
+        'status': 'Tersedia',
+        'photo_path': None,
+    } for n in range(1, count + 1)]
+    return db.import_items(items)[0]
+
+
+def owned_units(conn):
+    """{item_id: stock + units on loan} for every active item"""
+    return dict(conn.execute('''
+        SELECT i.id, i.quantity + COALESCE((
+            SELECT SUM(t.quantity) FROM transactions t
+            WHERE t.item_id = i.id AND t.type = 'borrow' AND t.returned = 0
+        ), 0)
+        FROM items i WHERE i.deleted_at IS NULL
+    ''').fetchall())
+
+
+def _classify(error):
+    if isinstance(error, (InsufficientStockError, StaleItemError)):
+        return 'rejected'
+    if isinstance(error, sqlite3.OperationalError) and DatabaseHandler._is_busy_error(error):
+        return 'locked'
+    return 'error'
+
+
+def run_station(station, db_name, item_ids, mix, duration, seed, handler_options):
+    """One desk: random operations until duration seconds have passed"""
+    rng = random.Random(seed)
+    db = LoadTestHandler(db_name, migrate=False, **handler_options)
+    names, weights = zip(*mix.items())
+    stats = {op: {'latencies': [], 'ok': 0, 'rejected': 0, 'locked': 0, 'error': 0}
+             for op in OPERATIONS}
+    open_loans = []
+    today = datetime.now()
+    deadline = time.perf_counter() + duration
+
+    while time.perf_counter() < deadline:
+        op = rng.choices(names, weights)[0]
+        if op == 'return' and not open_loans:
+            op = 'borrow'
+        started = time.perf_counter()
+        outcome = 'ok'
+        try:
+            if op == 'search':
+                db.errors.clear()
+                list(db.iter_items(columns=RESULT_COLUMNS, search_term=rng.choice(SEARCH_TERMS)))
+                if db.errors:
+                    outcome = 'locked' if DatabaseHandler._is_busy_error(db.errors[-1]) else 'error'
+            elif op == 'borrow':
+                # _write raises instead of showing a message box
+                loan_id = db._write('add_transaction', {
+                    'item_id': rng.choice(item_ids),
+                    'type': 'borrow',
+                    'borrower': f"Meja uji {station}",
+                    'purpose': PURPOSE,
+                    'date': today.strftime('%Y-%m-%d'),
+                    'due_date': (today + timedelta(days=7)).strftime('%Y-%m-%d'),
+                    'quantity': rng.randint(1, 3),
+                })
+                open_loans.append(loan_id)
+            elif op == 'return':
+                loan_id = open_loans.pop(rng.randrange(len(open_loans)))
+                if db._write('process_return', loan_id, PURPOSE) is None:
+                    outcome = 'error'
+            else:
+                # Like the edit form: read the item, then save it back
+                item = db.get_item(rng.choice(item_ids))
+                if item is not None:
+                    data = item._asdict()
+                    data['original_quantity'] = item.quantity
+                    data['location'] = f"Rak {rng.randrange(10)}"
+                    db._write('update_item', item.id, data)
+        except Exception as e:
+            outcome = _classify(e)
+        elapsed = time.perf_counter() - started
+        stats[op][outcome] += 1
+        if outcome in ('ok', 'rejected'):
+            stats[op]['latencies'].append(elapsed)
+    return stats
+
+
+def _station_entry(args):
+    return run_station(*args)
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * p // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def check_consistency(conn, before):
+    """Violations of stock + units on loan being unchanged, and of negative stock"""
+    violations = []
+    after = owned_units(conn)
+    for item_id, owned in before.items():
+        if after.get(item_id) != owned:
+            violations.append({'item_id': item_id, 'problem': 'jumlah berubah',
+                               'before': owned, 'after': after.get(item_id)})
+    for item_id, quantity in conn.execute('SELECT id, quantity FROM items WHERE quantity < 0'):
+        violations.append({'item_id': item_id, 'problem': 'stok negatif', 'after': quantity})
+    # Every return of the run must match a loan closed by it
+    closed, returned = conn.execute('''
+        SELECT
+            (SELECT COALESCE(SUM(quantity), 0) FROM transactions
+             WHERE type = 'borrow' AND returned = 1 AND purpose = ?),
+            (SELECT COALESCE(SUM(quantity), 0) FROM transactions
+             WHERE type = 'return' AND purpose = ?)
+    ''', (PURPOSE, PURPOSE)).fetchone()
+    if closed != returned:
+        violations.append({'problem': 'pengembalian tidak cocok', 'before': closed, 'after': returned})
+    return violations
+
+
+def run(db_name, stations, duration, mix=DEFAULT_MIX, items=DEFAULT_ITEMS, seed=None,
+        handler_options=None):
+    """Run the load test and return the report as a dict"""
+    handler_options = handler_options or {}
+    db = LoadTestHandler(db_name, **handler_options)
+    if not db.list_items(columns=('id',)):
+        seed_items(db, items)
+    item_ids = [row.id for row in db.list_items(columns=('id',))][:items]
+    if not item_ids:
+        raise SystemExit("Tidak ada barang untuk diuji")
+
+    conn = sqlite3.connect(db_name)
+    before = owned_units(conn)
+    seed = seed if seed is not None else random.randrange(1 << 30)
+    jobs = [(station, db_name, item_ids, mix, duration, seed + station, handler_options)
+            for station in range(1, stations + 1)]
+
+    started = time.perf_counter()
+    with multiprocessing.Pool(stations) as pool:
+        results = pool.map(_station_entry, jobs)
+    wall = time.perf_counter() - started
+
+    report = {'stations': stations, 'duration': round(wall, 2), 'seed': seed, 'operations': {}}
+    total = 0
+    for op in OPERATIONS:
+        latencies = sorted(l for result in results for l in result[op]['latencies'])
+        counts = {kind: sum(result[op][kind] for result in results)
+                  for kind in ('ok', 'rejected', 'locked', 'error')}
+        attempts = sum(counts.values())
+        total += attempts
+        if not attempts:
+            continue
+        report['operations'][op] = dict(
+            counts,
+            attempts=attempts,
+            lock_rate=round(counts['locked'] / attempts, 4),
+            **{f'p{p}_ms': round(percentile(latencies, p) * 1000, 1) if latencies else None
+               for p in PERCENTILES},
+            max_ms=round(latencies[-1] * 1000, 1) if latencies else None,
+        )
+    report['throughput'] = round(total / wall, 1) if wall else 0.0
+    report['violations'] = check_consistency(conn, before)
+    conn.close()
+    return report
+
+
+def print_report(report):
+    print(f"{report['stations']} meja, {report['duration']} detik, "
+          f"{report['throughput']} operasi/detik (seed {report['seed']})")
+    print(f"{'operasi':<8} {'jumlah':>7} {'ok':>7} {'ditolak':>7} {'terkunci':>8} {'error':>6} "
+          + ' '.join(f"{f'p{p} ms':>8}" for p in PERCENTILES) + f" {'maks ms':>8}")
+    for op, row in report['operations'].items():
+        print(f"{op:<8} {row['attempts']:>7} {row['ok']:>7} {row['rejected']:>7} "
+              f"{row['locked']:>8} {row['error']:>6} "
+              + ' '.join(f"{row[f'p{p}_ms'] if row[f'p{p}_ms'] is not None else '-':>8}"
+                         for p in PERCENTILES)
+              + f" {row['max_ms'] if row['max_ms'] is not None else '-':>8}")
+    if report['violations']:
+        print(f"{len(report['violations'])} pelanggaran konsistensi stok:")
+        for violation in report['violations'][:20]:
+            print(f"  {violation}")
+    else:
+        print("Stok konsisten")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Uji beban beberapa meja pada satu database")
+    parser.add_argument('db', help='salinan database yang diuji')
+    parser.add_argument('--stations', type=int, default=4, help='jumlah meja (proses)')
+    parser.add_argument('--duration', type=float, default=30, help='lama uji dalam detik')
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX,
+                        help='bobot operasi, mis. search=50,borrow=20,return=20,edit=10')
+    parser.add_argument('--items', type=int, default=DEFAULT_ITEMS, help='barang yang dipakai')
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--busy-timeout', type=int, default=DEFAULT_BUSY_TIMEOUT_MS, help='ms')
+    parser.add_argument('--max-retries', type=int, default=DEFAULT_MAX_RETRIES)
+    parser.add_argument('--durability', choices=DURABILITY_LEVELS)
+    parser.add_argument('--json', metavar='FILE', help='simpan laporan sebagai JSON')
+    args = parser.parse_args()
+
+    report = run(args.db, args.stations, args.duration, args.mix, args.items, args.seed, {
+        'busy_timeout': args.busy_timeout,
+        'max_retries': args.max_retries,
+        'durability': args.durability,
+    })
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=4)
+    if report['violations']:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,255 @@
+"""Routine upkeep of inventaris.db: vacuum, statistics, WAL checkpoint, integrity.
+
+Each task is only run when it is due:
+
+* checkpoint: the WAL file has grown past wal_pages pages;
+* analyze: no planner statistics yet (sqlite_stat1), or at least
+  stale_changes rows were changed since the last run (counted with the
+  change_log sequence); ANALYZE with a row limit the first time,
+  PRAGMA optimize afterwards;
+* prune_log: change_log holds more than change_log_rows entries; the
+  oldest are dropped even if an export target has not received them
+  (that target then gets a full export), keeping the newest per table;
+* vacuum: free pages make up at least free_ratio of the file. Files
+  created with auto_vacuum=INCREMENTAL are shrunk a few pages per step;
+  older files are converted once with a full VACUUM, which the app only
+  does itself for small files (the CLI does it with --full);
+* integrity: PRAGMA quick_check once every integrity_days days
+  (PRAGMA integrity_check with --full).
+
+Steps are short so other stations only wait briefly for the lock, and a
+run stops between steps as soon as should_continue() says so (the app
+stops when someone uses the desk again). What was done and how long it
+took is logged and the time of each task is kept in the settings table.
+
+    python src/maintenance.py --db inventaris.db --status
+    python src/maintenance.py --full
+    python src/maintenance.py --every 60
+"""
+import argparse
+import logging
+import os
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+import change_log
+
+TASKS = ('checkpoint', 'analyze', 'prune_log', 'vacuum', 'integrity')
+
+DEFAULT_FREE_RATIO = 0.10
+DEFAULT_STALE_CHANGES = 1000
+DEFAULT_INTEGRITY_DAYS = 7
+DEFAULT_WAL_PAGES = 1000
+# Largest file (in pages) the app converts to incremental vacuum on its own
+DEFAULT_FULL_VACUUM_PAGES = 25000
+VACUUM_STEP_PAGES = 256
+# Rows ANALYZE looks at per index, so it stays quick on big tables
+ANALYSIS_LIMIT = 1000
+BUSY_TIMEOUT = 5.0
+
+AUTO_VACUUM_MODES = {0: 'none', 1: 'full', 2: 'incremental'}
+SETTING_PREFIX = 'maintenance_'
+
+
+class MaintenanceManager:
+    def __init__(self, db_name, free_ratio=DEFAULT_FREE_RATIO, stale_changes=DEFAULT_STALE_CHANGES,
+                 integrity_days=DEFAULT_INTEGRITY_DAYS, wal_pages=DEFAULT_WAL_PAGES,
+                 full_vacuum_pages=DEFAULT_FULL_VACUUM_PAGES, change_log_rows=change_log.DEFAULT_KEEP_ROWS):
+        self.db_name = db_name
+        self.free_ratio = free_ratio
+        self.stale_changes = stale_changes
+        self.integrity_days = integrity_days
+        self.wal_pages = wal_pages
+        self.full_vacuum_pages = full_vacuum_pages
+        self.change_log_rows = change_log_rows
+
+    def _connect(self):
+        # Autocommit: VACUUM and the checkpoint cannot run inside a transaction
+        return sqlite3.connect(self.db_name, timeout=BUSY_TIMEOUT, isolation_level=None)
+
+    @staticmethod
+    def _pragma(conn, name):
+        return conn.execute(f'PRAGMA {name}').fetchone()[0]
+
+    @staticmethod
+    def _get_setting(conn, key):
+        row = conn.execute('SELECT value FROM settings WHERE key = ?', (SETTING_PREFIX + key,)).fetchone()
+        return row[0] if row else None
+
+    @staticmethod
+    def _set_setting(conn, key, value):
+        conn.execute('INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)',
+                     (SETTING_PREFIX + key, str(value)))
+
+    @staticmethod
+    def _change_seq(conn):
+        row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'change_log'").fetchone()
+        return row[0] if row else 0
+
+    def status(self, conn=None):
+        """Measurements the due checks are based on, as a dict"""
+        own = conn is None
+        conn = conn or self._connect()
+        try:
+            page_count = self._pragma(conn, 'page_count')
+            free_pages = self._pragma(conn, 'freelist_count')
+            page_size = self._pragma(conn, 'page_size')
+            journal_mode = self._pragma(conn, 'journal_mode')
+            wal_path = self.db_name + '-wal'
+            wal_pages = (os.path.getsize(wal_path) // page_size
+                         if journal_mode == 'wal' and os.path.exists(wal_path) else 0)
+            has_stats = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'"
+            ).fetchone() is not None
+            analyzed_seq = int(self._get_setting(conn, 'analyze_seq') or 0)
+            return {
+                'page_count': page_count,
+                'free_pages': free_pages,
+                'free_ratio': round(free_pages / page_count, 4) if page_count else 0.0,
+                'auto_vacuum': AUTO_VACUUM_MODES.get(self._pragma(conn, 'auto_vacuum'), 'none'),
+                'journal_mode': journal_mode,
+                'wal_pages': wal_pages,
+                'has_stats': has_stats,
+                'changes_since_analyze': self._change_seq(conn) - analyzed_seq,
+                'change_log_excess': change_log.count_excess(conn, self.change_log_rows),
+                'last_integrity': self._get_setting(conn, 'last_integrity'),
+                'integrity': self._get_setting(conn, 'integrity'),
+            }
+        finally:
+            if own:
+                conn.close()
+
+    def due(self, status, full=False):
+        """Tasks that should run now, in TASKS order"""
+        tasks = []
+        if status['journal_mode'] == 'wal' and status['wal_pages'] >= self.wal_pages:
+            tasks.append('checkpoint')
+        if not status['has_stats'] or status['changes_since_analyze'] >= self.stale_changes:
+            tasks.append('analyze')
+        if status['change_log_excess']:
+            tasks.append('prune_log')
+        if status['free_pages'] and status['free_ratio'] >= self.free_ratio and (
+                full or status['auto_vacuum'] == 'incremental'
+                or status['page_count'] <= self.full_vacuum_pages):
+            tasks.append('vacuum')
+        last = status['last_integrity']
+        if last is None or datetime.fromisoformat(last) <= datetime.now() - timedelta(days=self.integrity_days):
+            tasks.append('integrity')
+        return tasks
+
+    # Tasks; each returns a short description of what it did
+    def checkpoint(self, conn, should_continue, full):
+        busy, log_pages, moved = conn.execute('PRAGMA wal_checkpoint(PASSIVE)').fetchone()
+        return f"{moved}/{log_pages} halaman WAL dipindahkan" + (" (sebagian, database sibuk)" if busy else "")
+
+    def analyze(self, conn, should_continue, full):
+        seq = self._change_seq(conn)
+        conn.execute(f'PRAGMA analysis_limit = {ANALYSIS_LIMIT}')
+        has_stats = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone()
+        if has_stats and not full:
+            conn.execute('PRAGMA optimize')
+            detail = "PRAGMA optimize"
+        else:
+            conn.execute('ANALYZE')
+            detail = "ANALYZE"
+        self._set_setting(conn, 'analyze_seq', seq)
+        return detail
+
+    def prune_log(self, conn, should_continue, full):
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            removed = change_log.prune_change_log(conn, self.change_log_rows)
+            conn.execute('COMMIT')
+        except sqlite3.Error:
+            conn.execute('ROLLBACK')
+            raise
+        return f"{removed} entri change_log lama dibuang"
+
+    def vacuum(self, conn, should_continue, full):
+        before = self._pragma(conn, 'freelist_count')
+        if AUTO_VACUUM_MODES.get(self._pragma(conn, 'auto_vacuum')) != 'incremental':
+            # Takes effect with the rebuild; from then on steps are enough
+            conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+            conn.execute('VACUUM')
+            return f"VACUUM penuh, {before} halaman kosong dibuang, mode incremental aktif"
+        while should_continue():
+            free = self._pragma(conn, 'freelist_count')
+            if not free:
+                break
+            conn.execute(f'PRAGMA incremental_vacuum({min(free, VACUUM_STEP_PAGES)})').fetchall()
+        return f"{before - self._pragma(conn, 'freelist_count')} dari {before} halaman kosong dibuang"
+
+    def integrity(self, conn, should_continue, full):
+        rows = conn.execute('PRAGMA integrity_check' if full else 'PRAGMA quick_check').fetchall()
+        ok = rows == [('ok',)]
+        self._set_setting(conn, 'last_integrity', datetime.now().isoformat(timespec='seconds'))
+        self._set_setting(conn, 'integrity', 'ok' if ok else 'rusak')
+        if not ok:
+            logging.error(f"Pemeriksaan integritas {self.db_name} gagal: {rows[:10]}")
+        return "ok" if ok else f"{len(rows)} masalah ditemukan"
+
+    def run(self, tasks=None, should_continue=None, full=False):
+        """Run the given (or due) tasks; returns [(task, detail, seconds)]"""
+        should_continue = should_continue or (lambda: True)
+        conn = self._connect()
+        results = []
+        try:
+            if tasks is None:
+                tasks = self.due(self.status(conn), full)
+            for task in tasks:
+                if not should_continue():
+                    logging.info("Pemeliharaan dihentikan, desk dipakai lagi")
+                    break
+                started = time.perf_counter()
+                try:
+                    detail = getattr(self, task)(conn, should_continue, full)
+                except sqlite3.OperationalError as e:
+                    # Busy or locked: try again on the next run
+                    detail = f"dilewati: {e}"
+                seconds = time.perf_counter() - started
+                logging.info(f"Pemeliharaan {task} {self.db_name}: {detail} ({seconds:.2f} detik)")
+                if not detail.startswith('dilewati'):
+                    self._set_setting(conn, f'last_{task}', datetime.now().isoformat(timespec='seconds'))
+                results.append((task, detail, seconds))
+        finally:
+            conn.close()
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pemeliharaan database inventaris")
+    parser.add_argument('--db', default='inventaris.db')
+    parser.add_argument('--status', action='store_true', help='hanya tampilkan kondisi database')
+    parser.add_argument('--task', action='append', choices=TASKS,
+                        help='jalankan tugas ini meskipun belum waktunya (boleh diulang)')
+    parser.add_argument('--full', action='store_true',
+                        help='VACUUM penuh bila perlu, ANALYZE ulang dan integrity_check lengkap')
+    parser.add_argument('--every', type=float, metavar='MENIT',
+                        help='periksa dan jalankan setiap sekian menit')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    manager = MaintenanceManager(args.db)
+    if args.status:
+        status = manager.status()
+        for key, value in status.items():
+            print(f"{key}: {value}")
+        print(f"perlu dijalankan: {', '.join(manager.due(status, args.full)) or '-'}")
+        return
+
+    while True:
+        try:
+            for task, detail, seconds in manager.run(args.task, full=args.full):
+                print(f"{task}: {detail} ({seconds:.2f} detik)")
+        except sqlite3.Error as e:
+            logging.error(f"Pemeliharaan gagal: {e}")
+            if not args.every:
+                raise SystemExit(1)
+        if not args.every:
+            break
+        time.sleep(args.every * 60)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,208 @@
+"""In-memory mirror of inventaris.db with write-through to the file.
+
+For a desk that owns its database file on a slow PC. The file is copied
+into an in-memory database (SQLite backup API) when the handler starts,
+and every read is answered from that copy. A write is run against the
+copy first, so the caller gets its result (or its InsufficientStockError)
+right away. It is then appended to a journal next to the database and
+fsync'ed, and a background thread replays it on the file, in order.
+
+Each write is a logical operation (the same _do_* methods the server's
+WriteBatcher runs), journaled with the time it ran at in memory. The
+replay runs it with that time again (DatabaseHandler._now), so replaying
+the writes in the same order on the same starting data gives the same
+rows and ids, return dates and deletion stamps included. Only the
+updated_at stamps kept by triggers take the time of the replay. The file stores the last replayed journal
+entry (settings.mirror_applied_seq) in the same transaction as the
+replayed writes. After a crash, the entries the file has not seen yet are
+replayed when the handler starts again, before the copy is loaded.
+
+Nothing else may write to the file while a mirror is open. Not for the
+server; the desk opens it with:
+
+    python src/inventaris_barang.py --memory
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+
+from inventaris_barang import DatabaseHandler
+
+JOURNAL_SUFFIX = '-mirror.journal'
+APPLIED_KEY = 'mirror_applied_seq'
+# Seconds to wait before retrying when the file cannot be written
+RETRY_DELAY = 1.0
+MAX_BATCH = 100
+
+
+class MirroredDatabaseHandler(DatabaseHandler):
+    """DatabaseHandler that reads from memory and writes through to db_name"""
+
+    def __init__(self, db_name, **kwargs):
+        self._memory_uri = None
+        super().__init__(db_name, **kwargs)
+        self.journal_path = db_name + JOURNAL_SUFFIX
+        self._write_lock = threading.Lock()
+        self._flushed = threading.Condition()
+        self._queue = queue.Queue()
+
+        self._applied = self._recover()
+        self._last_seq = self._applied
+
+        # The copy lives as long as this anchor connection is open
+        self._memory_uri = f'file:/inventaris-{uuid.uuid4().hex}?vfs=memdb'
+        self._anchor = sqlite3.connect(self._memory_uri, uri=True, check_same_thread=False)
+        disk = self._connect_disk()
+        try:
+            disk.backup(self._anchor)
+        finally:
+            disk.close()
+
+        self._journal = open(self.journal_path, 'a', encoding='utf-8')
+        self._thread = threading.Thread(target=self._run, name='mirror-flush', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    # Connections
+    def _connect(self):
+        if self._memory_uri is None:
+            # Still starting up: migrations run on the file itself
+            return self._connect_disk()
+        conn = sqlite3.connect(self._memory_uri, uri=True,
+                               timeout=self.busy_timeout / 1000.0, check_same_thread=False)
+        conn.execute(f'PRAGMA busy_timeout = {int(self.busy_timeout)}')
+        conn.execute('PRAGMA foreign_keys = ON')
+        return conn
+
+    def _connect_disk(self):
+        return super()._connect()
+
+    # Writes
+    def _write(self, operation, *args):
+        # Memory, journal and queue must see writes in the same order
+        with self._write_lock:
+            moment = time.time()
+            self._clock.time = moment
+            try:
+                result = super()._write(operation, *args)
+            finally:
+                self._clock.time = None
+            seq = self._last_seq + 1
+            self._journal.write(json.dumps({'seq': seq, 'op': operation, 'args': args,
+                                            'time': moment}) + '\n')
+            self._journal.flush()
+            os.fsync(self._journal.fileno())
+            self._last_seq = seq
+            self._queue.put((seq, operation, args, moment))
+        return result
+
+    def _replay(self, cursor, entries):
+        """Apply journal entries to the file; runs inside one write transaction"""
+        for index, (seq, operation, args, moment) in enumerate(entries):
+            savepoint = f'm{index}'
+            cursor.execute(f'SAVEPOINT {savepoint}')
+            self._clock.time = moment
+            try:
+                getattr(self, f'_do_{operation}')(cursor, *args)
+            except sqlite3.OperationalError:
+                # Lock and I/O errors: retry the whole batch later
+                raise
+            except Exception as e:
+                # It succeeded in memory, so the two copies have diverged
+                cursor.execute(f'ROLLBACK TO {savepoint}')
+                logging.error(f"Mirror: {operation} #{seq} gagal ditulis ke {self.db_name}: {e}")
+            finally:
+                self._clock.time = None
+            cursor.execute(f'RELEASE {savepoint}')
+        cursor.execute(
+            'INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)',
+            (APPLIED_KEY, str(entries[-1][0]))
+        )
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch = [first]
+            while len(batch) < MAX_BATCH:
+                try:
+                    entry = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if entry is None:
+                    self._queue.put(None)
+                    break
+                batch.append(entry)
+
+            while True:
+                try:
+                    self._run_write(lambda cursor: self._replay(cursor, batch),
+                                    connect=self._connect_disk)
+                    break
+                except sqlite3.Error as e:
+                    logging.error(f"Mirror: gagal menulis ke {self.db_name}, dicoba lagi: {e}")
+                    time.sleep(RETRY_DELAY)
+
+            with self._flushed:
+                self._applied = batch[-1][0]
+                self._flushed.notify_all()
+            self._truncate_journal()
+
+    def _truncate_journal(self):
+        with self._write_lock:
+            if self._applied == self._last_seq and self._journal.tell() > 0:
+                self._journal.truncate(0)
+                self._journal.seek(0)
+
+    def _recover(self):
+        """Replay journal entries a crash kept from reaching the file; returns the last seq"""
+        disk = self._connect_disk()
+        try:
+            row = disk.execute('SELECT value FROM settings WHERE key = ?', (APPLIED_KEY,)).fetchone()
+        finally:
+            disk.close()
+        applied = int(row[0]) if row else 0
+
+        pending = []
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # Torn last line: that write was never acknowledged
+                        break
+                    if entry['seq'] > applied:
+                        pending.append((entry['seq'], entry['op'], entry['args'], entry.get('time')))
+        if pending:
+            logging.info(f"Mirror: {len(pending)} tulisan tertunda dipulihkan ke {self.db_name}")
+            self._run_write(lambda cursor: self._replay(cursor, pending), connect=self._connect_disk)
+            applied = pending[-1][0]
+        # The journal is empty from here on; seq keeps counting from applied
+        open(self.journal_path, 'w').close()
+        return applied
+
+    # Lifecycle
+    def flush(self, timeout=None):
+        """Wait until every accepted write is in the file; False on timeout"""
+        target = self._last_seq
+        with self._flushed:
+            return self._flushed.wait_for(lambda: self._applied >= target, timeout)
+
+    def close(self):
+        if self._thread is None:
+            return
+        self.flush()
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+        self._journal.close()
+        self._anchor.close()
+        atexit.unregister(self.close)
@@ -0,0 +1,64 @@
+"""Typed rows returned by DatabaseHandler.
+
+Records are namedtuples: they have no per-instance __dict__, stay
+compatible with code that still indexes rows, and can be built for any
+subset of columns so a caller only pays for the fields it reads.
+"""
+from collections import namedtuple
+from functools import lru_cache
+
+ITEM_FIELDS = ('id', 'name', 'barcode', 'quantity', 'location', 'condition',
+               'status', 'photo_path', 'created_at')
+# Columns added by later migrations; available through projection
+ITEM_EXTRA_FIELDS = ('updated_at', 'version', 'station_id')
+
+TRANSACTION_COLUMNS = ('id', 'item_id', 'type', 'borrower', 'purpose',
+                       'date', 'due_date', 'returned', 'quantity')
+# Transactions are always read joined with the item name
+TRANSACTION_FIELDS = TRANSACTION_COLUMNS + ('item_name',)
+TRANSACTION_EXTRA_FIELDS = ('uid', 'borrower_id', 'updated_at', 'returned_at')
+
+RESERVATION_FIELDS = ('id', 'item_id', 'borrower', 'purpose', 'start_date', 'end_date',
+                      'quantity', 'status', 'item_name')
+
+# Open loans per borrower (see DatabaseHandler.get_borrower_summary)
+BORROWER_SUMMARY_FIELDS = ('id', 'name', 'loans', 'units', 'next_due')
+
+Item = namedtuple('Item', ITEM_FIELDS)
+Transaction = namedtuple('Transaction', TRANSACTION_FIELDS)
+Reservation = namedtuple('Reservation', RESERVATION_FIELDS)
+BorrowerSummary = namedtuple('BorrowerSummary', BORROWER_SUMMARY_FIELDS)
+
+
+@lru_cache(maxsize=None)
+def record_type(name, fields):
+    """Namedtuple class for a projection, cached per column tuple"""
+    return namedtuple(name, fields)
+
+
+def item_record(columns=None):
+    """Record class for the requested item columns (all base fields by default)"""
+    if columns is None:
+        return Item
+    columns = tuple(columns)
+    unknown = set(columns) - set(ITEM_FIELDS + ITEM_EXTRA_FIELDS)
+    if unknown:
+        raise ValueError(f"Kolom barang tidak dikenal: {', '.join(sorted(unknown))}")
+    return Item if columns == ITEM_FIELDS else record_type('ItemRow', columns)
+
+
+def transaction_record(columns=None):
+    """Record class for the requested transaction columns"""
+    if columns is None:
+        return Transaction
+    columns = tuple(columns)
+    unknown = set(columns) - set(TRANSACTION_FIELDS + TRANSACTION_EXTRA_FIELDS)
+    if unknown:
+        raise ValueError(f"Kolom transaksi tidak dikenal: {', '.join(sorted(unknown))}")
+    return Transaction if columns == TRANSACTION_FIELDS else record_type('TransactionRow', columns)
+
+
+def row_factory(record):
+    """sqlite3 row_factory that builds `record` instances"""
+    make = record._make
+    return lambda cursor, row: make(row)
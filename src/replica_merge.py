@@ -0,0 +1,341 @@
+"""Merge two station databases (e.g. sarpras bawah and koperasi).
+
+Every database has its own station id (settings.station_id). Items carry a
+version that is bumped on each edit of their descriptive fields, and every
+item and transaction has a uid of the form "<station>:<id>" that its
+copies keep. Merging a remote copy into the local one:
+
+* matches items by uid, then by barcode (items without one that were
+  copied before items had uids, by name and created_at); the higher
+  version wins, equal versions from different stations with different
+  values are reported as conflicts and the local values are kept;
+* adds remote items that do not exist locally;
+* deletes items deleted at either station (soft delete, deleted_at);
+* adds remote transactions whose uid is not known yet and carries over
+  returns recorded on the other side;
+* recomputes stock of every merged item as owned units minus units still
+  on loan.
+
+All of it is done with set-based statements over the ATTACHed remote file.
+
+    python src/replica_merge.py koperasi.db --db inventaris.db --both
+    python src/replica_merge.py --set-station sarpras-bawah --db inventaris.db
+"""
+import argparse
+import csv
+import sqlite3
+
+import reservations
+
+ATTRIBUTES = ('name', 'location', 'condition', 'status', 'photo_path')
+TEMP_TABLES = ('item_map', 'item_base', 'remote_base', 'merged_outstanding', 'merge_conflicts')
+TRANSACTION_COLUMNS = ('type', 'borrower', 'purpose', 'date', 'due_date',
+                       'returned', 'quantity', 'uid')
+
+
+class MergeError(Exception):
+    """The databases cannot be merged"""
+
+
+def get_station_id(conn, schema='main'):
+    try:
+        row = conn.execute(
+            f"SELECT value FROM {schema}.settings WHERE key = 'station_id'"
+        ).fetchone()
+    except sqlite3.OperationalError:
+        row = None
+    if not row:
+        raise MergeError(f"Database '{schema}' belum memiliki station id; "
+                         "buka sekali dengan aplikasi versi terbaru")
+    return row[0]
+
+
+def set_station_id(db_name, station_id):
+    conn = sqlite3.connect(db_name)
+    try:
+        conn.execute("UPDATE settings SET value = ? WHERE key = 'station_id'", (station_id,))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def merge_databases(db_name, remote_path, busy_timeout=5000):
+    """Merge remote_path into db_name; returns (counts, conflicts)"""
+    conn = sqlite3.connect(db_name, timeout=busy_timeout / 1000.0)
+    try:
+        conn.execute('ATTACH DATABASE ? AS r', (remote_path,))
+        local_station = get_station_id(conn, 'main')
+        remote_station = get_station_id(conn, 'r')
+        if local_station == remote_station:
+            raise MergeError(f"Kedua database memakai station id yang sama ({local_station}); "
+                             "ubah salah satunya dengan --set-station")
+
+        conn.execute('BEGIN IMMEDIATE')
+        result = _merge(conn)
+        conn.commit()
+        return result
+    except sqlite3.Error as e:
+        if conn.in_transaction:
+            conn.rollback()
+        raise MergeError(str(e)) from e
+    finally:
+        conn.close()
+
+
+def _has_column(conn, schema, table, column):
+    return column in [row[1] for row in conn.execute(f'PRAGMA {schema}.table_info({table})')]
+
+
+def _outstanding(source):
+    """Units still on loan per item, hot and archived history together"""
+    return f'''
+        SELECT item_id, SUM(quantity) AS qty FROM (
+            SELECT item_id, quantity FROM {source}.transactions WHERE type = 'borrow' AND returned = 0
+            UNION ALL
+            SELECT item_id, quantity FROM {source}.transactions_archive WHERE type = 'borrow' AND returned = 0
+        ) GROUP BY item_id
+    '''
+
+
+def _merge(conn):
+    counts = {}
+    for table in TEMP_TABLES:
+        conn.execute(f'DROP TABLE IF EXISTS temp.{table}')
+
+    # Owned units = current stock + units on loan, taken before anything moves
+    conn.execute(f'''
+        CREATE TEMP TABLE item_base AS
+        SELECT i.id AS item_id, i.quantity + COALESCE(o.qty, 0) AS owned
+        FROM main.items i LEFT JOIN ({_outstanding('main')}) o ON o.item_id = i.id
+    ''')
+    conn.execute(f'''
+        CREATE TEMP TABLE remote_base AS
+        SELECT i.id AS item_id, i.quantity + COALESCE(o.qty, 0) AS owned
+        FROM r.items i LEFT JOIN ({_outstanding('r')}) o ON o.item_id = i.id
+    ''')
+
+    conn.execute('''
+        CREATE TEMP TABLE item_map (
+            remote_id INTEGER PRIMARY KEY,
+            local_id INTEGER NOT NULL,
+            remote_wins INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    # Databases from before soft delete or item uids lack those columns
+    soft_delete = (_has_column(conn, 'main', 'items', 'deleted_at')
+                   and _has_column(conn, 'r', 'items', 'deleted_at'))
+    item_uids = _has_column(conn, 'main', 'items', 'uid') and _has_column(conn, 'r', 'items', 'uid')
+
+    # The first of these lookups that finds a local item wins
+    matches = []
+    if item_uids:
+        matches.append('SELECT m.id FROM main.items m WHERE m.uid = ri.uid')
+    if soft_delete:
+        # A deleted item's barcode can be in use again: prefer an item in the
+        # same state, and leave a deleted remote item whose barcode is back in
+        # use at its station unmatched (it is added as a deleted item)
+        matches.append('''
+            SELECT id FROM (
+                SELECT m.id, (m.deleted_at IS NULL) = (ri.deleted_at IS NULL) AS same_state,
+                       m.deleted_at IS NULL AS in_use
+                FROM main.items m
+                WHERE m.barcode = ri.barcode AND NOT (ri.deleted_at IS NOT NULL AND EXISTS (
+                    SELECT 1 FROM r.items x WHERE x.barcode = ri.barcode AND x.deleted_at IS NULL))
+            ) ORDER BY same_state DESC, in_use DESC, id DESC LIMIT 1
+        ''')
+    else:
+        matches.append('SELECT m.id FROM main.items m WHERE m.barcode = ri.barcode')
+    # Copies made before items had uids keep their name and created_at
+    matches.append('''
+        SELECT m.id FROM main.items m
+        WHERE ri.barcode IS NULL AND m.barcode IS NULL
+          AND m.name = ri.name AND m.created_at = ri.created_at
+        ORDER BY m.id LIMIT 1
+    ''')
+    conn.execute(f'''
+        INSERT INTO item_map (remote_id, local_id, remote_wins)
+        SELECT ri.id, li.id, ri.version > li.version
+        FROM r.items ri JOIN main.items li
+        ON li.id = COALESCE({', '.join(f'({match})' for match in matches)})
+    ''')
+
+    differs = ' OR '.join(f'li.{a} IS NOT ri.{a}' for a in ATTRIBUTES)
+    conn.execute(f'''
+        CREATE TEMP TABLE merge_conflicts AS
+        SELECT li.barcode AS barcode, li.name AS local_name, ri.name AS remote_name,
+               li.version AS version, li.station_id AS local_station,
+               ri.station_id AS remote_station,
+               'Barang diubah di kedua tempat; data lokal dipakai' AS reason
+        FROM item_map m
+        JOIN main.items li ON li.id = m.local_id
+        JOIN r.items ri ON ri.id = m.remote_id
+        WHERE ri.version = li.version AND ri.station_id IS NOT li.station_id AND ({differs})
+    ''')
+
+    # Newer remote edits overwrite the local descriptive fields
+    assignments = ', '.join(
+        f'{a} = (SELECT ri.{a} FROM r.items ri JOIN item_map m ON m.remote_id = ri.id '
+        f'WHERE m.local_id = items.id)'
+        for a in ATTRIBUTES + ('version', 'station_id')
+    )
+    counts['items_updated'] = conn.execute(f'''
+        UPDATE main.items SET {assignments}
+        WHERE id IN (SELECT local_id FROM item_map WHERE remote_wins = 1)
+    ''').rowcount
+
+    # Remote-only items: shift ids past everything used locally
+    offset = conn.execute('''
+        SELECT MAX(COALESCE((SELECT MAX(id) FROM main.items), 0),
+                   COALESCE((SELECT seq FROM main.sqlite_sequence WHERE name = 'items'), 0))
+    ''').fetchone()[0]
+    columns = ('name', 'barcode', 'quantity', 'location', 'condition', 'status',
+               'photo_path', 'created_at', 'version', 'station_id')
+    if soft_delete:
+        columns += ('deleted_at',)
+    if item_uids:
+        columns += ('uid',)
+    counts['items_added'] = conn.execute(f'''
+        INSERT INTO main.items (id, {', '.join(columns)})
+        SELECT ri.id + ?, {', '.join(f'ri.{c}' for c in columns)}
+        FROM r.items ri
+        WHERE ri.id NOT IN (SELECT remote_id FROM item_map)
+        ORDER BY ri.id
+    ''', (offset,)).rowcount
+    conn.execute('''
+        INSERT INTO item_map (remote_id, local_id, remote_wins)
+        SELECT ri.id, ri.id + ?, 1 FROM r.items ri
+        WHERE ri.id NOT IN (SELECT remote_id FROM item_map)
+    ''', (offset,))
+
+    # A delete at either station removes the item everywhere; like a delete
+    # in the app it cancels the item's reservations
+    counts['items_deleted'] = 0
+    if soft_delete:
+        deleted = '''
+            SELECT m.local_id FROM item_map m JOIN r.items ri ON ri.id = m.remote_id
+            WHERE ri.deleted_at IS NOT NULL
+        '''
+        counts['items_deleted'] = conn.execute(f'''
+            UPDATE main.items SET deleted_at = (
+                SELECT ri.deleted_at FROM r.items ri JOIN item_map m ON m.remote_id = ri.id
+                WHERE m.local_id = items.id
+            )
+            WHERE deleted_at IS NULL AND id IN ({deleted})
+        ''').rowcount
+        conn.execute(f'''
+            UPDATE main.reservations SET status = ?
+            WHERE status = ? AND item_id IN ({deleted})
+        ''', (reservations.CANCELLED, reservations.ACTIVE))
+
+    # Transactions: unknown uids are appended, known ones are left alone
+    known = ('SELECT uid FROM main.transactions WHERE uid IS NOT NULL '
+             'UNION ALL SELECT uid FROM main.transactions_archive WHERE uid IS NOT NULL')
+    # Databases from before returned_at only know that a loan was closed
+    returned_at = (_has_column(conn, 'main', 'transactions', 'returned_at')
+                   and _has_column(conn, 'r', 'transactions', 'returned_at'))
+    columns = TRANSACTION_COLUMNS + (('returned_at',) if returned_at else ())
+    selected = ', '.join(f't.{c}' for c in columns)
+    counts['transactions_added'] = 0
+    for source in ('r.transactions', 'r.transactions_archive'):
+        counts['transactions_added'] += conn.execute(f'''
+            INSERT INTO main.transactions (item_id, {', '.join(columns)})
+            SELECT m.local_id, {selected}
+            FROM {source} t JOIN item_map m ON m.remote_id = t.item_id
+            WHERE t.uid IS NOT NULL AND t.uid NOT IN ({known})
+            ORDER BY t.date, t.id
+        ''').rowcount
+
+    # A return recorded at either station closes the loan everywhere, as of
+    # the day it was returned there
+    closed_on = ''
+    if returned_at:
+        closed_on = ''', returned_at = COALESCE(
+            (SELECT t.returned_at FROM r.transactions t WHERE t.uid = transactions.uid),
+            (SELECT t.returned_at FROM r.transactions_archive t WHERE t.uid = transactions.uid))'''
+    counts['returns_applied'] = conn.execute(f'''
+        UPDATE main.transactions SET returned = 1{closed_on}
+        WHERE returned = 0 AND type = 'borrow' AND uid IN (
+            SELECT uid FROM r.transactions WHERE returned = 1
+            UNION ALL
+            SELECT uid FROM r.transactions_archive WHERE returned = 1
+        )
+    ''').rowcount
+
+    # Stock = owned units (from the winning side) - units still on loan
+    conn.execute(f'''
+        CREATE TEMP TABLE merged_outstanding AS {_outstanding('main')}
+    ''')
+    conn.execute('CREATE INDEX temp.idx_merged_outstanding ON merged_outstanding (item_id)')
+    conn.execute('''
+        UPDATE main.items SET quantity = (
+            SELECT CASE WHEN m.remote_wins = 1 THEN rb.owned ELSE COALESCE(lb.owned, rb.owned) END
+                   - COALESCE((SELECT o.qty FROM merged_outstanding o WHERE o.item_id = items.id), 0)
+            FROM item_map m
+            JOIN temp.remote_base rb ON rb.item_id = m.remote_id
+            LEFT JOIN temp.item_base lb ON lb.item_id = m.local_id
+            WHERE m.local_id = items.id
+        )
+        WHERE id IN (SELECT local_id FROM item_map)
+    ''')
+    conn.execute('''
+        INSERT INTO merge_conflicts
+        SELECT barcode, name, name, version, station_id, NULL,
+               'Stok negatif setelah digabung: ' || quantity
+        FROM main.items
+        WHERE id IN (SELECT local_id FROM item_map) AND quantity < 0
+    ''')
+    counts['items_recomputed'] = conn.execute('SELECT COUNT(*) FROM item_map').fetchone()[0]
+
+    cursor = conn.execute('SELECT * FROM merge_conflicts')
+    header = [d[0] for d in cursor.description]
+    conflicts = [dict(zip(header, row)) for row in cursor]
+    counts['conflicts'] = len(conflicts)
+
+    for table in TEMP_TABLES:
+        conn.execute(f'DROP TABLE temp.{table}')
+    return counts, conflicts
+
+
+def write_conflict_report(conflicts, path):
+    fields = ('barcode', 'local_name', 'remote_name', 'version',
+              'local_station', 'remote_station', 'reason')
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(conflicts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gabungkan database inventaris dari dua stasiun")
+    parser.add_argument('remote', nargs='?', help='database stasiun lain')
+    parser.add_argument('--db', default='inventaris.db', help='database lokal')
+    parser.add_argument('--both', action='store_true',
+                        help='gabungkan dua arah sehingga kedua database sama')
+    parser.add_argument('--report', default='konflik-merge.csv', help='file laporan konflik')
+    parser.add_argument('--set-station', metavar='ID', help='ubah station id database lokal')
+    args = parser.parse_args()
+
+    if args.set_station:
+        set_station_id(args.db, args.set_station)
+        print(f"Station id {args.db} = {args.set_station}")
+        return
+    if not args.remote:
+        parser.error("database stasiun lain harus diisi")
+
+    try:
+        counts, conflicts = merge_databases(args.db, args.remote)
+        if args.both:
+            back_counts, back_conflicts = merge_databases(args.remote, args.db)
+            print(f"{args.remote}: {back_counts}")
+            conflicts += back_conflicts
+    except MergeError as e:
+        raise SystemExit(f"Gagal: {e}")
+
+    print(f"{args.db}: {counts}")
+    if conflicts:
+        write_conflict_report(conflicts, args.report)
+        print(f"{len(conflicts)} konflik ditulis ke {args.report}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+"""Cache of generated report files, reused while their data is unchanged.
+
+Every cached report remembers the tables it was built from and, for each
+of them, the last change_log seq when it was generated. Asking for the
+report again compares those counters with the current ones, so a change to
+transactions does not throw away a report that only reads items.
+
+The counters are not even read while PRAGMA data_version on the cache's
+own long-lived connection stays the same: that value only moves when some
+other connection commits, and every write of the app goes through its own
+short-lived connection.
+
+    python src/report_cache.py --db inventaris.db          # list entries
+    python src/report_cache.py --db inventaris.db --clear
+"""
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+from datetime import datetime
+
+# Tables whose changes are counted by the change_log triggers
+TRACKED_TABLES = ('items', 'transactions')
+INDEX_FILE = 'index.json'
+
+
+def default_cache_dir(db_name):
+    base, _ = os.path.splitext(os.path.abspath(db_name))
+    return f'{base}-laporan'
+
+
+class ReportCache:
+    def __init__(self, db_name, cache_dir=None):
+        self.db_name = db_name
+        self.cache_dir = cache_dir or default_cache_dir(db_name)
+        self._conn = None
+        self._data_version = None
+        self._counters = {}
+        self._index = None
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    # Change detection
+    def _connection(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db_name, check_same_thread=False)
+        return self._conn
+
+    def counters(self, tables):
+        """{table: last change_log seq} for the given tables"""
+        unknown = set(tables) - set(TRACKED_TABLES)
+        if unknown:
+            raise ValueError(f"Tabel tidak dilacak: {', '.join(sorted(unknown))}")
+        conn = self._connection()
+        data_version = conn.execute('PRAGMA data_version').fetchone()[0]
+        if data_version != self._data_version:
+            # Something was committed since the last look; counters are stale
+            self._counters = {}
+            self._data_version = data_version
+        for table in tables:
+            if table not in self._counters:
+                row = conn.execute(
+                    'SELECT MAX(seq) FROM change_log WHERE table_name = ?', (table,)
+                ).fetchone()
+                self._counters[table] = row[0] or 0
+        return {table: self._counters[table] for table in tables}
+
+    # Index of cached files
+    def _load_index(self):
+        if self._index is None:
+            try:
+                with open(os.path.join(self.cache_dir, INDEX_FILE)) as f:
+                    self._index = json.load(f)
+            except (OSError, ValueError):
+                self._index = {}
+        return self._index
+
+    def _save_index(self):
+        path = os.path.join(self.cache_dir, INDEX_FILE)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(self._index, f, indent=4)
+        os.replace(path + '.tmp', path)
+
+    def entries(self):
+        return dict(self._load_index())
+
+    def clear(self):
+        for key, entry in self._load_index().items():
+            path = os.path.join(self.cache_dir, entry['file'])
+            if os.path.exists(path):
+                os.remove(path)
+        self._index = {}
+        if os.path.isdir(self.cache_dir):
+            self._save_index()
+
+    def get_or_build(self, key, tables, build, suffix, variant=None):
+        """Path of an up-to-date report for key and whether it came from the cache.
+
+        build(path) must write the report to path; it is only called when the
+        counters of `tables` (or the variant, e.g. the date printed on the
+        report) differ from those of the cached file.
+        """
+        counters = self.counters(tables)
+        index = self._load_index()
+        entry = index.get(key)
+        if entry and entry['counters'] == counters and entry.get('variant') == variant:
+            path = os.path.join(self.cache_dir, entry['file'])
+            if os.path.exists(path):
+                return path, True
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        file_name = ''.join(c if c.isalnum() or c in '-_' else '_' for c in key) + suffix
+        path = os.path.join(self.cache_dir, file_name)
+        build(path + '.tmp')
+        os.replace(path + '.tmp', path)
+        index[key] = {
+            'file': file_name,
+            'counters': counters,
+            'variant': variant,
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+        }
+        self._save_index()
+        return path, False
+
+    def export(self, key, tables, build, suffix, destination, variant=None):
+        """Copy an up-to-date report to destination; returns True on a cache hit"""
+        path, hit = self.get_or_build(key, tables, build, suffix, variant)
+        shutil.copyfile(path, destination)
+        return hit
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cache laporan inventaris")
+    parser.add_argument('--db', default='inventaris.db')
+    parser.add_argument('--clear', action='store_true', help='hapus semua laporan tersimpan')
+    args = parser.parse_args()
+
+    cache = ReportCache(args.db)
+    try:
+        if args.clear:
+            cache.clear()
+            print("Cache laporan dikosongkan")
+            return
+        current = cache.counters(TRACKED_TABLES)
+        for key, entry in cache.entries().items():
+            fresh = all(current[t] == seq for t, seq in entry['counters'].items())
+            print(f"{key}: {entry['file']} ({entry['created_at']}, "
+                  f"{'terbaru' if fresh else 'kedaluwarsa'})")
+    finally:
+        cache.close()
+
+
+if __name__ == '__main__':
+    main()
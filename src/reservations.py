@@ -0,0 +1,131 @@
+"""Reservation calendar: future bookings checked against stock.
+
+Units of an item are occupied by open loans (from the loan date until the
+due date, or until today for overdue loans) and by active reservations
+(start_date..end_date, both inclusive). How many units are free over a
+window is answered by a sweep over only the intervals that overlap it:
++quantity on the first day, -quantity the day after the last, and the
+running maximum is the peak demand. The overlapping intervals are read
+through idx_reservations_item_end and the partial index of open loans, so
+past bookings and closed loans are never visited.
+
+    python src/reservations.py 12 2026-11-03 2026-11-07 --db inventaris.db
+"""
+import argparse
+import sqlite3
+from datetime import date, timedelta
+
+ACTIVE = 'active'
+FULFILLED = 'fulfilled'
+CANCELLED = 'cancelled'
+
+# End of a loan without a due date
+FAR_FUTURE = '9999-12-31'
+
+
+def today():
+    return date.today().isoformat()
+
+
+def next_day(day):
+    if day >= FAR_FUTURE:
+        return FAR_FUTURE
+    return (date.fromisoformat(day) + timedelta(days=1)).isoformat()
+
+
+def _events(intervals, start, end):
+    """(day, delta) pairs for the part of each interval inside [start, end]"""
+    events = []
+    for first, last, quantity in intervals:
+        first, last = max(first, start), min(last, end)
+        if first > last:
+            continue
+        events.append((first, quantity))
+        events.append((next_day(last), -quantity))
+    # On the same day, units coming back are counted before new ones leave
+    events.sort()
+    return events
+
+
+def peak_usage(intervals, start, end):
+    """Highest number of units in use on any day of [start, end]"""
+    used = peak = 0
+    for _, delta in _events(intervals, start, end):
+        used += delta
+        peak = max(peak, used)
+    return peak
+
+
+def daily_usage(intervals, start, end):
+    """[(day, units in use)] for every day of [start, end]"""
+    events = _events(intervals, start, end)
+    usage = []
+    used, index = 0, 0
+    day = start
+    while day <= end:
+        while index < len(events) and events[index][0] <= day:
+            used += events[index][1]
+            index += 1
+        usage.append((day, used))
+        day = next_day(day)
+    return usage
+
+
+def load_intervals(conn, item_id, start, end, on_date=None, exclude_reservation=None):
+    """Owned units of an item and the loan/reservation intervals overlapping [start, end]"""
+    on_date = on_date or today()
+    row = conn.execute('''
+        SELECT i.quantity + COALESCE((
+            SELECT SUM(t.quantity) FROM transactions t
+            WHERE t.item_id = i.id AND t.type = 'borrow' AND t.returned = 0
+        ), 0)
+        FROM items i WHERE i.id = ?
+    ''', (item_id,)).fetchone()
+    owned = row[0] if row else 0
+
+    intervals = []
+    # Overdue loans are assumed to stay out until at least today
+    loans = conn.execute('''
+        SELECT date, MAX(COALESCE(due_date, ?), ?), quantity FROM transactions
+        WHERE item_id = ? AND type = 'borrow' AND returned = 0
+    ''', (FAR_FUTURE, on_date, item_id))
+    intervals.extend(loans.fetchall())
+    booked = conn.execute('''
+        SELECT start_date, end_date, quantity FROM reservations
+        WHERE item_id = ? AND status = ? AND end_date >= ? AND start_date <= ?
+          AND id IS NOT ?
+    ''', (item_id, ACTIVE, start, end, exclude_reservation))
+    intervals.extend(booked.fetchall())
+    return owned, intervals
+
+
+def free_units(conn, item_id, start, end, on_date=None, exclude_reservation=None):
+    """Units of an item that are free on every day of [start, end]"""
+    owned, intervals = load_intervals(conn, item_id, start, end, on_date, exclude_reservation)
+    return max(owned - peak_usage(intervals, start, end), 0)
+
+
+def availability_calendar(conn, item_id, start, end, on_date=None):
+    """[(day, free units)] for every day of [start, end]"""
+    owned, intervals = load_intervals(conn, item_id, start, end, on_date)
+    return [(day, max(owned - used, 0)) for day, used in daily_usage(intervals, start, end)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ketersediaan barang per hari")
+    parser.add_argument('item_id', type=int)
+    parser.add_argument('start', help='YYYY-MM-DD')
+    parser.add_argument('end', help='YYYY-MM-DD')
+    parser.add_argument('--db', default='inventaris.db')
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    try:
+        for day, free in availability_calendar(conn, args.item_id, args.start, args.end):
+            print(f"{day}: {free} unit")
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
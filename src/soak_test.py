@@ -0,0 +1,376 @@
+"""Soak test: drive the app for thousands of cycles and watch for leaks.
+
+Front-desk PCs leave the app open for weeks, so memory or widgets that
+grow a little per action eventually hurt. This runs a real InventoryApp
+(under Xvfb when there is no display) against a copy of the database.
+Every cycle does what a desk does all day:
+
+* a search;
+* opening the detail window of a result, then closing it;
+* a borrow;
+* a return;
+* an export (JSON, PDF or spreadsheet in turn), every --export-every cycles.
+
+Message boxes and file dialogs are answered automatically. Every
+--sample-every cycles it records:
+* process RSS;
+* the Python heap (tracemalloc);
+* the number of Tk widgets;
+* Tk images (PhotoImage);
+* pending after() callbacks.
+
+The first part of the run is warm-up (caches filling, first exports). The
+test fails when any of these is still growing over the second half of the
+run, beyond the allowed limits, or when an action showed an error message
+(a cycle that does not work is not a passing one). The report lists the
+lines that allocated the most since warm-up.
+
+    python src/soak_test.py inventaris.db --cycles 2000
+    xvfb-run python src/soak_test.py inventaris.db --cycles 10000 --json soak.json
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import tempfile
+import time
+import tracemalloc
+
+import tkinter as tk
+from tkinter import filedialog, messagebox
+
+from inventaris_barang import DatabaseHandler, InventoryApp
+from load_test import seed_items
+
+DEFAULT_CYCLES = 2000
+DEFAULT_SAMPLE_EVERY = 100
+DEFAULT_EXPORT_EVERY = 10
+DEFAULT_ITEMS = 200
+# Allowed growth over the second half of the run
+DEFAULT_RSS_LIMIT_MB = 20
+DEFAULT_HEAP_LIMIT_MB = 5
+WIDGET_LIMIT = 0
+IMAGE_LIMIT = 0
+# A prefetch or background poll may be pending at the moment of sampling
+AFTER_LIMIT = 5
+# Every action of a cycle should succeed; error messages mean it is broken
+ERROR_LIMIT = 0
+# Samples averaged at each end of the second half, to smooth out noise
+EDGE_SAMPLES = 3
+TRACE_FRAMES = 1
+TOP_ALLOCATIONS = 10
+EVENT_TIMEOUT = 10.0
+SEARCH_TERMS = ('', 'uji', 'barang', '1', '2', 'kursi', 'xyz')
+EXPORTS = ('export_to_json', 'export_to_pdf', 'export_to_spreadsheet')
+METRICS = ('rss_mb', 'heap_mb', 'widgets', 'images', 'after')
+
+
+def start_xvfb():
+    """Start Xvfb on a free display and point DISPLAY at it; returns the process or None"""
+    if os.environ.get('DISPLAY'):
+        return None
+    xvfb = shutil.which('Xvfb')
+    if not xvfb:
+        raise SystemExit("Tidak ada DISPLAY dan Xvfb tidak ditemukan (pasang xvfb atau jalankan dengan xvfb-run)")
+    for number in range(99, 199):
+        socket = f'/tmp/.X11-unix/X{number}'
+        if os.path.exists(socket) or os.path.exists(f'/tmp/.X{number}-lock'):
+            continue
+        process = subprocess.Popen([xvfb, f':{number}', '-screen', '0', '1280x1024x24', '-nolisten', 'tcp'],
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        for _ in range(50):
+            if os.path.exists(socket):
+                os.environ['DISPLAY'] = f':{number}'
+                return process
+            if process.poll() is not None:
+                break
+            time.sleep(0.1)
+        process.kill()
+    raise SystemExit("Xvfb gagal dijalankan")
+
+
+class Dialogs:
+    """Stand-ins for the modal dialogs: note the message and answer at once"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.errors = []
+
+    def install(self):
+        messagebox.showinfo = lambda title, message, **options: 'ok'
+        messagebox.showwarning = lambda title, message, **options: 'ok'
+        messagebox.showerror = self.show_error
+        messagebox.askyesno = lambda title, message, **options: True
+        filedialog.asksaveasfilename = self.save_path
+
+    def show_error(self, title, message, **options):
+        self.errors.append(message)
+        return 'ok'
+
+    def save_path(self, defaultextension='', **options):
+        # One file per kind, overwritten every time
+        return os.path.join(self.directory, f'export{defaultextension}')
+
+
+def pump(root, until=None, timeout=EVENT_TIMEOUT):
+    """Process Tk events (and after() callbacks) until until() holds or timeout"""
+    deadline = time.monotonic() + timeout
+    while True:
+        root.update()
+        if until is None or until() or time.monotonic() > deadline:
+            return
+        time.sleep(0.01)
+
+
+def rss_mb():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        # Not Linux: peak RSS is the closest there is
+        import resource
+    except ImportError:
+        return 0.0
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def count_widgets(widget):
+    return 1 + sum(count_widgets(child) for child in widget.winfo_children())
+
+
+def sample(root, cycle):
+    return {
+        'cycle': cycle,
+        'rss_mb': round(rss_mb(), 2),
+        'heap_mb': round(tracemalloc.get_traced_memory()[0] / 2 ** 20, 2),
+        'widgets': count_widgets(root),
+        'images': len(root.tk.call('image', 'names')),
+        'after': len(root.tk.call('after', 'info')),
+    }
+
+
+class SoakRunner:
+    def __init__(self, app, dialogs, seed=None, export_every=DEFAULT_EXPORT_EVERY):
+        self.app = app
+        self.root = app.root
+        self.dialogs = dialogs
+        self.rng = random.Random(seed)
+        self.export_every = export_every
+        self.exports = 0
+
+    def search(self):
+        self.app.search_entry.delete(0, 'end')
+        self.app.search_entry.insert(0, self.rng.choice(SEARCH_TERMS))
+        self.app.search_items()
+        pump(self.root)
+
+    def detail(self):
+        rows = self.app.results_tree.get_children()
+        if not rows:
+            return
+        self.app.results_tree.selection_set(self.rng.choice(rows))
+        self.app.view_item_details()
+        pump(self.root, lambda: not self.app.detail_loading)
+        # What the window's close button does
+        self.app.detail_window.withdraw()
+        pump(self.root)
+
+    def borrow(self):
+        choices = self.app.borrow_item_combobox['values']
+        if not choices:
+            return
+        self.app.borrow_item_combobox.set(self.rng.choice(choices))
+        self.app.borrower_entry.delete(0, 'end')
+        self.app.borrower_entry.insert(0, f"Uji soak {self.rng.randrange(20)}")
+        self.app.purpose_entry.delete(0, 'end')
+        self.app.purpose_entry.insert(0, 'uji soak')
+        self.app.process_borrowing()
+        pump(self.root)
+
+    def give_back(self):
+        choices = self.app.return_trans_combobox['values']
+        if not choices:
+            return
+        self.app.return_trans_combobox.set(self.rng.choice(choices))
+        self.app.process_return()
+        pump(self.root)
+
+    def export(self):
+        method = EXPORTS[self.exports % len(EXPORTS)]
+        self.exports += 1
+        getattr(self.app, method)()
+        pump(self.root)
+
+    def cycle(self, number):
+        self.search()
+        self.detail()
+        self.borrow()
+        self.give_back()
+        if self.export_every and number % self.export_every == 0:
+            self.export()
+
+
+def edge_growth(samples, key):
+    """Growth of key over the second half, averaging EDGE_SAMPLES at each end"""
+    half = samples[len(samples) // 2:]
+    edge = max(1, min(EDGE_SAMPLES, len(half) // 2))
+    first = sum(s[key] for s in half[:edge]) / edge
+    last = sum(s[key] for s in half[-edge:]) / edge
+    return round(last - first, 2)
+
+
+def judge(samples, limits, errors=0):
+    """{metric: growth} for every metric that grew past its limit, plus
+    {'dialog_errors': n} when more error messages were shown than allowed"""
+    failures = {}
+    if errors > limits.get('dialog_errors', ERROR_LIMIT):
+        failures['dialog_errors'] = errors
+    if len(samples) < 4:
+        return failures
+    for key in METRICS:
+        growth = edge_growth(samples, key)
+        if growth > limits[key]:
+            failures[key] = growth
+    return failures
+
+
+def soak(runner, cycles, sample_every, take_sample, progress=None):
+    """Run the cycles, sampling every sample_every of them.
+
+    Returns (samples, tracemalloc snapshot taken when warm-up ended or None).
+    """
+    samples = [take_sample(0)]
+    baseline = None
+    for number in range(1, cycles + 1):
+        runner.cycle(number)
+        if number % sample_every == 0 or number == cycles:
+            samples.append(take_sample(number))
+            if progress:
+                progress(samples[-1])
+            # Warm-up ends halfway; allocations are compared from here
+            if baseline is None and number >= cycles // 2 and tracemalloc.is_tracing():
+                baseline = tracemalloc.take_snapshot()
+    return samples, baseline
+
+
+def run(db_name, cycles=DEFAULT_CYCLES, sample_every=DEFAULT_SAMPLE_EVERY,
+        export_every=DEFAULT_EXPORT_EVERY, limits=None, seed=None, progress=None):
+    """Run the soak test on a copy of db_name and return the report as a dict"""
+    limits = dict({'rss_mb': DEFAULT_RSS_LIMIT_MB, 'heap_mb': DEFAULT_HEAP_LIMIT_MB,
+                   'widgets': WIDGET_LIMIT, 'images': IMAGE_LIMIT, 'after': AFTER_LIMIT,
+                   'dialog_errors': ERROR_LIMIT}, **(limits or {}))
+    workdir = tempfile.mkdtemp(prefix='soak-')
+    copy = os.path.join(workdir, 'inventaris.db')
+    if os.path.exists(db_name):
+        shutil.copy(db_name, copy)
+    # Exports, barcodes and backups land in the scratch folder
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    xvfb = start_xvfb()
+    root = None
+    try:
+        db = DatabaseHandler(copy)
+        if not db.list_items(columns=('id',)):
+            seed_items(db, DEFAULT_ITEMS)
+        dialogs = Dialogs(workdir)
+        dialogs.install()
+
+        tracemalloc.start(TRACE_FRAMES)
+        root = tk.Tk()
+        app = InventoryApp(root, db, units_config=os.path.join(workdir, 'units.json'))
+        pump(root)
+        runner = SoakRunner(app, dialogs, seed, export_every)
+
+        started = time.perf_counter()
+        samples, baseline = soak(runner, cycles, sample_every, lambda number: sample(root, number), progress)
+        elapsed = time.perf_counter() - started
+
+        top = []
+        if baseline is not None:
+            for stat in tracemalloc.take_snapshot().compare_to(baseline, 'lineno')[:TOP_ALLOCATIONS]:
+                frame = stat.traceback[0]
+                top.append({'where': f'{frame.filename}:{frame.lineno}',
+                            'size_diff_kb': round(stat.size_diff / 1024, 1), 'count_diff': stat.count_diff})
+        failures = judge(samples, limits, len(dialogs.errors))
+        return {
+            'cycles': cycles,
+            'seconds': round(elapsed, 1),
+            'exports': runner.exports,
+            'dialog_errors': len(dialogs.errors),
+            'first_errors': dialogs.errors[:5],
+            'limits': limits,
+            'growth': {key: edge_growth(samples, key) for key in METRICS} if len(samples) >= 4 else {},
+            'failures': failures,
+            'top_allocations': top,
+            'samples': samples,
+        }
+    finally:
+        tracemalloc.stop()
+        if root is not None:
+            root.destroy()
+        os.chdir(cwd)
+        if xvfb is not None:
+            xvfb.terminate()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def print_sample(row):
+    print(f"{row['cycle']:>7} {row['rss_mb']:>9} {row['heap_mb']:>9} {row['widgets']:>8} "
+          f"{row['images']:>7} {row['after']:>6}")
+
+
+def print_report(report):
+    print(f"{report['cycles']} siklus dalam {report['seconds']} detik, {report['exports']} export, "
+          f"{report['dialog_errors']} pesan error")
+    for message in report['first_errors']:
+        print(f"  {message}")
+    print("Pertumbuhan pada paruh kedua: "
+          + ', '.join(f"{key} {value:+}" for key, value in report['growth'].items()))
+    if report['top_allocations']:
+        print("Alokasi terbesar sejak pemanasan:")
+        for row in report['top_allocations']:
+            print(f"  {row['size_diff_kb']:>+10} KB {row['count_diff']:>+8}  {row['where']}")
+    growing = {key: value for key, value in report['failures'].items() if key in METRICS}
+    if growing:
+        print("GAGAL, terus bertambah: " + ', '.join(
+            f"{key} {value:+} (batas {report['limits'][key]})" for key, value in growing.items()))
+    if 'dialog_errors' in report['failures']:
+        print(f"GAGAL, {report['failures']['dialog_errors']} pesan error "
+              f"(batas {report['limits']['dialog_errors']})")
+    if not report['failures']:
+        print("Tidak ada pertumbuhan tak terbatas dan tidak ada pesan error")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Uji soak aplikasi (kebocoran memori dan widget)")
+    parser.add_argument('db', help='database yang disalin untuk diuji (kosong: diisi barang uji)')
+    parser.add_argument('--cycles', type=int, default=DEFAULT_CYCLES)
+    parser.add_argument('--sample-every', type=int, default=DEFAULT_SAMPLE_EVERY)
+    parser.add_argument('--export-every', type=int, default=DEFAULT_EXPORT_EVERY,
+                        help='export setiap sekian siklus (0: tanpa export)')
+    parser.add_argument('--rss-limit', type=float, default=DEFAULT_RSS_LIMIT_MB, help='MB')
+    parser.add_argument('--heap-limit', type=float, default=DEFAULT_HEAP_LIMIT_MB, help='MB')
+    parser.add_argument('--error-limit', type=int, default=ERROR_LIMIT,
+                        help='pesan error yang masih diterima')
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--json', metavar='FILE', help='simpan laporan sebagai JSON')
+    args = parser.parse_args()
+
+    print(f"{'siklus':>7} {'RSS MB':>9} {'heap MB':>9} {'widget':>8} {'gambar':>7} {'after':>6}")
+    report = run(os.path.abspath(args.db), args.cycles, args.sample_every, args.export_every,
+                 {'rss_mb': args.rss_limit, 'heap_mb': args.heap_limit, 'dialog_errors': args.error_limit},
+                 args.seed, print_sample)
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=4)
+    if report['failures']:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,318 @@
+"""Streaming CSV and XLSX import/export for the items table.
+
+Rows are read and written one at a time, so memory use does not grow with
+the size of the file. XLSX files are produced directly with zipfile and
+incremental XML (inline strings, no shared string table) and read back with
+iterparse, so no spreadsheet library is needed.
+"""
+import csv
+import math
+import os
+import re
+import zipfile
+import xml.etree.ElementTree as ET
+from xml.sax.saxutils import escape
+
+# Spreadsheet header -> items column
+DEFAULT_COLUMN_MAP = {
+    'Nama Barang': 'name',
+    'Barcode': 'barcode',
+    'Jumlah': 'quantity',
+    'Lokasi': 'location',
+    'Kondisi': 'condition',
+    'Status': 'status',
+    'Foto': 'photo_path',
+}
+
+DEFAULT_CHUNK_SIZE = 500
+# Largest value an SQLite INTEGER column holds
+MAX_QUANTITY = 2 ** 63 - 1
+
+_SHEET_NS = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+_REL_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+_PKG_REL_NS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+# Characters XML 1.0 does not allow, even escaped
+_ILLEGAL_XML = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+class ImportReport:
+    """Outcome of an import: counts plus one (row_number, message) per bad row"""
+
+    def __init__(self):
+        self.imported = 0
+        self.duplicates = 0
+        self.errors = []
+
+    def write_errors(self, path):
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['Baris', 'Kesalahan'])
+            writer.writerows(self.errors)
+
+
+# Writers
+def write_csv(rows, path, column_map=DEFAULT_COLUMN_MAP):
+    """Write dict rows to a CSV file; returns the number of rows written"""
+    count = 0
+    with open(path, 'w', newline='', encoding='utf-8-sig') as f:
+        writer = csv.writer(f)
+        writer.writerow(list(column_map))
+        for row in rows:
+            writer.writerow(['' if row.get(field) is None else row[field]
+                             for field in column_map.values()])
+            count += 1
+    return count
+
+
+def _column_letter(index):
+    letters = ''
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+def _xlsx_cell(ref, value):
+    if value is None or value == '':
+        return ''
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return f'<c r="{ref}"><v>{value}</v></c>'
+    text = escape(_ILLEGAL_XML.sub('', str(value)))
+    return f'<c r="{ref}" t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def _xlsx_row(number, values):
+    cells = ''.join(_xlsx_cell(f'{_column_letter(i)}{number}', value)
+                    for i, value in enumerate(values))
+    return f'<row r="{number}">{cells}</row>'
+
+
+_XLSX_STATIC_PARTS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        f'<Relationships xmlns="{_PKG_REL_NS}">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/workbook.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        f'<workbook xmlns="{_SHEET_NS}" xmlns:r="{_REL_NS}">'
+        '<sheets><sheet name="Inventaris" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        f'<Relationships xmlns="{_PKG_REL_NS}">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+}
+
+
+def write_xlsx(rows, path, column_map=DEFAULT_COLUMN_MAP):
+    """Write dict rows to a single-sheet XLSX file; returns the number of rows written"""
+    count = 0
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for name, content in _XLSX_STATIC_PARTS.items():
+            zf.writestr(name, content)
+
+        with zf.open('xl/worksheets/sheet1.xml', 'w') as sheet:
+            sheet.write(('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                         f'<worksheet xmlns="{_SHEET_NS}"><sheetData>').encode('utf-8'))
+            sheet.write(_xlsx_row(1, list(column_map)).encode('utf-8'))
+            for row in rows:
+                count += 1
+                values = [row.get(field) for field in column_map.values()]
+                sheet.write(_xlsx_row(count + 1, values).encode('utf-8'))
+            sheet.write(b'</sheetData></worksheet>')
+    return count
+
+
+# Readers
+def read_csv(path):
+    """Yield each data row of a CSV file as a list of strings, header first"""
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        yield from csv.reader(f)
+
+
+def _first_sheet_path(zf):
+    try:
+        workbook = ET.fromstring(zf.read('xl/workbook.xml'))
+        sheet = workbook.find(f'{{{_SHEET_NS}}}sheets/{{{_SHEET_NS}}}sheet')
+        rel_id = sheet.get(f'{{{_REL_NS}}}id')
+        rels = ET.fromstring(zf.read('xl/_rels/workbook.xml.rels'))
+        for rel in rels:
+            if rel.get('Id') == rel_id:
+                target = rel.get('Target').lstrip('/')
+                return target if target.startswith('xl/') else f'xl/{target}'
+    except (KeyError, AttributeError, ET.ParseError):
+        pass
+    return 'xl/worksheets/sheet1.xml'
+
+
+def _shared_strings(zf):
+    if 'xl/sharedStrings.xml' not in zf.namelist():
+        return []
+    strings = []
+    with zf.open('xl/sharedStrings.xml') as f:
+        for _, elem in ET.iterparse(f):
+            if elem.tag == f'{{{_SHEET_NS}}}si':
+                strings.append(''.join(t.text or '' for t in elem.iter(f'{{{_SHEET_NS}}}t')))
+                elem.clear()
+    return strings
+
+
+def _column_index(ref):
+    index = 0
+    for char in ref:
+        if not char.isalpha():
+            break
+        index = index * 26 + ord(char.upper()) - 64
+    return index - 1
+
+
+def read_xlsx(path):
+    """Yield each row of the first sheet as a list of strings, header first"""
+    with zipfile.ZipFile(path) as zf:
+        shared = _shared_strings(zf)
+        with zf.open(_first_sheet_path(zf)) as f:
+            for _, elem in ET.iterparse(f):
+                if elem.tag != f'{{{_SHEET_NS}}}row':
+                    continue
+                values = []
+                for cell in elem.iter(f'{{{_SHEET_NS}}}c'):
+                    ref = cell.get('r')
+                    if ref:
+                        values.extend([''] * (_column_index(ref) - len(values)))
+                    kind = cell.get('t')
+                    if kind == 'inlineStr':
+                        value = ''.join(t.text or '' for t in cell.iter(f'{{{_SHEET_NS}}}t'))
+                    else:
+                        v = cell.find(f'{{{_SHEET_NS}}}v')
+                        value = v.text if v is not None and v.text else ''
+                        if kind == 's' and value:
+                            value = shared[int(value)]
+                    values.append(value)
+                yield values
+                elem.clear()
+
+
+def read_rows(path):
+    """Pick the reader from the file extension"""
+    if os.path.splitext(path)[1].lower() == '.xlsx':
+        return read_xlsx(path)
+    return read_csv(path)
+
+
+# Import
+def _normalize(header):
+    return header.strip().lower()
+
+
+def _resolve_columns(header, column_map):
+    """Map header positions to item fields, accepting labels or field names"""
+    lookup = {}
+    for label, field in column_map.items():
+        lookup[_normalize(label)] = field
+        lookup[_normalize(field)] = field
+    return {index: lookup[_normalize(name)] for index, name in enumerate(header)
+            if _normalize(name) in lookup}
+
+
+def _parse_quantity(value):
+    text = str(value).strip()
+    number = float(text)
+    # inf and 1e400 parse as floats but cannot become an int or be stored
+    if not math.isfinite(number) or number < 0 or number != int(number) or number > MAX_QUANTITY:
+        raise ValueError(text)
+    return int(number)
+
+
+def parse_item_row(values, columns, row_number, barcode_factory):
+    """Turn one spreadsheet row into item_data, raising ValueError if it is invalid"""
+    raw = {field: values[index].strip() if index < len(values) and values[index] is not None else ''
+           for index, field in columns.items()}
+    if not raw.get('name'):
+        raise ValueError("Nama barang kosong")
+    try:
+        quantity = _parse_quantity(raw.get('quantity', ''))
+    except ValueError:
+        raise ValueError(f"Jumlah tidak valid: '{raw.get('quantity', '')}'")
+    return {
+        'name': raw['name'],
+        'barcode': raw.get('barcode') or barcode_factory(row_number),
+        'quantity': quantity,
+        'location': raw.get('location', ''),
+        'condition': raw.get('condition') or 'Baik',
+        'status': raw.get('status') or 'Tersedia',
+        'photo_path': raw.get('photo_path') or None,
+    }
+
+
+def import_items(db, path, barcode_factory, column_map=DEFAULT_COLUMN_MAP,
+                 chunk_size=DEFAULT_CHUNK_SIZE):
+    """Stream a CSV/XLSX file into the items table in chunks; returns an ImportReport"""
+    report = ImportReport()
+    rows = read_rows(path)
+    header = next(rows, None)
+    if not header:
+        report.errors.append((1, "File kosong"))
+        return report
+
+    columns = _resolve_columns(header, column_map)
+    missing = {'name', 'quantity'} - set(columns.values())
+    if missing:
+        report.errors.append((1, f"Kolom wajib tidak ditemukan: {', '.join(sorted(missing))}"))
+        return report
+
+    # chunk holds item_data, rows the spreadsheet row of each
+    def flush(chunk, rows):
+        imported, duplicates, failed = db.import_items(chunk)
+        report.imported += imported
+        report.duplicates += duplicates
+        report.errors += [(rows[position], message) for position, message in failed]
+
+    chunk, chunk_rows = [], []
+    for row_number, values in enumerate(rows, start=2):
+        if not any(str(value).strip() for value in values):
+            continue
+        try:
+            chunk.append(parse_item_row(values, columns, row_number, barcode_factory))
+        except ValueError as e:
+            report.errors.append((row_number, str(e)))
+            continue
+        chunk_rows.append(row_number)
+        if len(chunk) >= chunk_size:
+            flush(chunk, chunk_rows)
+            chunk, chunk_rows = [], []
+    if chunk:
+        flush(chunk, chunk_rows)
+    # Rows rejected by the database come in after later bad rows of their chunk
+    report.errors.sort(key=lambda error: error[0])
+    return report
+
+
+# Export
+def export_items(db, path, column_map=DEFAULT_COLUMN_MAP):
+    """Stream the items table to CSV or XLSX (by extension); returns the row count"""
+    columns = tuple(dict.fromkeys(column_map.values()))
+    rows = (item._asdict() for item in db.iter_items(columns=columns))
+    if os.path.splitext(path)[1].lower() == '.xlsx':
+        return write_xlsx(rows, path, column_map)
+    return write_csv(rows, path, column_map)
@@ -0,0 +1,232 @@
+"""Point-in-time stock: checkpoints of items.quantity plus ledger replay.
+
+items.quantity only holds today's stock. A checkpoint stores the stock of
+every item together with the last transaction id it already includes.
+Stock on any day is then the nearest checkpoint adjusted by the ledger
+(borrow = -quantity, return = +quantity, hot and archived rows together):
+
+* from an earlier checkpoint, transactions after it dated up to that day
+  are added;
+* from a later checkpoint, transactions it includes that are dated after
+  that day are taken back out.
+
+Only the transactions between the checkpoint and the requested day are
+read, through the primary key range of each ledger table. Items the
+checkpoint does not know (created or imported after it) are replayed
+back from their current stock instead: every transaction of the item
+dated after that day is taken back out.
+
+Reconciliation replays everything recorded since the latest checkpoint
+in one grouped query and lists items whose stored quantity does not match
+(stock edited by hand, merges, imports over existing items).
+
+    python src/stock_history.py checkpoint --db inventaris.db
+    python src/stock_history.py on 2026-01-05 --db inventaris.db
+    python src/stock_history.py reconcile --db inventaris.db
+"""
+import argparse
+import sqlite3
+from datetime import date, timedelta
+
+import records
+
+# A new checkpoint is taken automatically once the latest is this old
+DEFAULT_CHECKPOINT_INTERVAL_DAYS = 7
+
+STOCK_FIELDS = ('item_id', 'name', 'quantity')
+DRIFT_FIELDS = ('item_id', 'name', 'recorded', 'expected', 'drift')
+CHECKPOINT_FIELDS = ('id', 'as_of', 'last_transaction_id', 'taken_at')
+
+# Stock change of every ledger row, hot and archived history together
+LEDGER = '''
+    SELECT id, item_id, date,
+           CASE type WHEN 'borrow' THEN -quantity WHEN 'return' THEN quantity ELSE 0 END AS delta
+    FROM transactions WHERE {condition}
+    UNION ALL
+    SELECT id, item_id, date,
+           CASE type WHEN 'borrow' THEN -quantity WHEN 'return' THEN quantity ELSE 0 END AS delta
+    FROM transactions_archive WHERE {condition}
+'''
+
+
+def today():
+    return date.today().isoformat()
+
+
+def take_checkpoint(cursor, as_of=None):
+    """Store the current stock of every item; returns the checkpoint id.
+
+    Must run inside a write transaction so no transaction slips in between
+    reading the last id and copying the quantities.
+    """
+    # sqlite_sequence still knows the last id when every row was archived
+    cursor.execute('''
+    INSERT INTO stock_checkpoints (as_of, last_transaction_id)
+    VALUES (?, COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'transactions'), 0))
+    ''', (as_of or today(),))
+    checkpoint_id = cursor.lastrowid
+    # Deleted items are kept: their history can still be asked about
+    cursor.execute('''
+    INSERT INTO stock_checkpoint_items (checkpoint_id, item_id, quantity)
+    SELECT ?, id, quantity FROM items
+    ''', (checkpoint_id,))
+    return checkpoint_id
+
+
+def checkpoint_due(conn, interval_days=DEFAULT_CHECKPOINT_INTERVAL_DAYS, on_date=None):
+    """True if there is no checkpoint from the last interval_days days"""
+    cutoff = (date.fromisoformat(on_date or today()) - timedelta(days=interval_days)).isoformat()
+    row = conn.execute('SELECT MAX(as_of) FROM stock_checkpoints').fetchone()
+    return row[0] is None or row[0] <= cutoff
+
+
+def list_checkpoints(conn):
+    record = records.record_type('StockCheckpoint', CHECKPOINT_FIELDS)
+    return [record._make(row) for row in conn.execute(
+        f"SELECT {', '.join(CHECKPOINT_FIELDS)} FROM stock_checkpoints ORDER BY as_of DESC, id DESC"
+    )]
+
+
+def nearest_checkpoint(conn, day):
+    """(id, as_of, last_transaction_id) of the checkpoint closest to day, or None"""
+    before = conn.execute('''
+        SELECT id, as_of, last_transaction_id FROM stock_checkpoints
+        WHERE as_of <= ? ORDER BY as_of DESC, id DESC LIMIT 1
+    ''', (day,)).fetchone()
+    after = conn.execute('''
+        SELECT id, as_of, last_transaction_id FROM stock_checkpoints
+        WHERE as_of > ? ORDER BY as_of, id LIMIT 1
+    ''', (day,)).fetchone()
+    if before is None or after is None:
+        return before or after
+    target = date.fromisoformat(day)
+    if (date.fromisoformat(after[1]) - target) < (target - date.fromisoformat(before[1])):
+        return after
+    return before
+
+
+def stock_on(conn, day, item_id=None):
+    """Stock of each item at the end of day, as records (item_id, name, quantity).
+
+    Items created after day or deleted before it are left out. Returns an
+    empty list when no checkpoint exists yet.
+    """
+    record = records.record_type('StockLevel', STOCK_FIELDS)
+    checkpoint = nearest_checkpoint(conn, day)
+    if checkpoint is None:
+        return []
+    checkpoint_id, as_of, last_id = checkpoint
+
+    if as_of <= day:
+        # Replay forward: later transactions dated up to day
+        ledger = LEDGER.format(condition='id > :last_id AND date <= :day')
+        sign = 1
+    else:
+        # Replay backward: undo included transactions dated after day
+        ledger = LEDGER.format(condition='id <= :last_id AND date > :day')
+        sign = -1
+
+    item_filter = 'AND i.id = :item_id' if item_id is not None else ''
+    existed = '''date(i.created_at) <= :day
+          AND (i.deleted_at IS NULL OR date(i.deleted_at) > :day)'''
+    item_ledger = LEDGER.format(condition='item_id = i.id AND date > :day')
+    cursor = conn.execute(f'''
+        SELECT c.item_id, i.name, c.quantity + :sign * COALESCE(l.delta, 0)
+        FROM stock_checkpoint_items c
+        JOIN items i ON i.id = c.item_id
+        LEFT JOIN (
+            SELECT item_id, SUM(delta) AS delta FROM ({ledger}) GROUP BY item_id
+        ) l ON l.item_id = c.item_id
+        WHERE c.checkpoint_id = :checkpoint_id {item_filter} AND {existed}
+        UNION ALL
+        SELECT i.id, i.name, i.quantity - COALESCE((SELECT SUM(delta) FROM ({item_ledger})), 0)
+        FROM items i
+        WHERE i.id NOT IN (SELECT item_id FROM stock_checkpoint_items WHERE checkpoint_id = :checkpoint_id)
+          {item_filter} AND {existed}
+        ORDER BY 2 COLLATE NOCASE, 1
+    ''', {'sign': sign, 'last_id': last_id, 'day': day,
+          'checkpoint_id': checkpoint_id, 'item_id': item_id})
+    return [record._make(row) for row in cursor]
+
+
+def reconcile(conn):
+    """Items whose quantity differs from the latest checkpoint plus the ledger since.
+
+    Returns records (item_id, name, recorded, expected, drift); items added
+    after the latest checkpoint have no baseline yet and are not checked.
+    """
+    record = records.record_type('StockDrift', DRIFT_FIELDS)
+    row = conn.execute(
+        'SELECT id, last_transaction_id FROM stock_checkpoints ORDER BY as_of DESC, id DESC LIMIT 1'
+    ).fetchone()
+    if row is None:
+        return []
+    checkpoint_id, last_id = row
+    ledger = LEDGER.format(condition='id > :last_id')
+    cursor = conn.execute(f'''
+        SELECT item_id, name, recorded, expected, recorded - expected FROM (
+            SELECT c.item_id, i.name, i.quantity AS recorded,
+                   c.quantity + COALESCE(l.delta, 0) AS expected
+            FROM stock_checkpoint_items c
+            JOIN items i ON i.id = c.item_id
+            LEFT JOIN (
+                SELECT item_id, SUM(delta) AS delta FROM ({ledger}) GROUP BY item_id
+            ) l ON l.item_id = c.item_id
+            WHERE c.checkpoint_id = :checkpoint_id
+        )
+        WHERE recorded != expected
+        ORDER BY name COLLATE NOCASE, item_id
+    ''', {'last_id': last_id, 'checkpoint_id': checkpoint_id})
+    return [record._make(row) for row in cursor]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stok per tanggal dan rekonsiliasi stok")
+    parser.add_argument('--db', default='inventaris.db')
+    sub = parser.add_subparsers(dest='action', required=True)
+    checkpoint = sub.add_parser('checkpoint', help='simpan stok saat ini')
+    checkpoint.add_argument('--if-due', action='store_true',
+                            help=f'hanya jika checkpoint terakhir lebih dari '
+                                 f'{DEFAULT_CHECKPOINT_INTERVAL_DAYS} hari lalu')
+    sub.add_parser('list')
+    on = sub.add_parser('on', help='stok pada akhir tanggal tertentu')
+    on.add_argument('day', help='YYYY-MM-DD')
+    on.add_argument('--item', type=int)
+    sub.add_parser('reconcile')
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    try:
+        if args.action == 'checkpoint':
+            if args.if_due and not checkpoint_due(conn):
+                print("Checkpoint terakhir masih baru")
+                return
+            with conn:
+                conn.execute('BEGIN IMMEDIATE')
+                checkpoint_id = take_checkpoint(conn.cursor())
+            print(f"Checkpoint {checkpoint_id} disimpan")
+        elif args.action == 'list':
+            for row in list_checkpoints(conn):
+                print(f"{row.id}: {row.as_of} (sampai transaksi {row.last_transaction_id})")
+        elif args.action == 'on':
+            rows = stock_on(conn, args.day, args.item)
+            if not rows:
+                print("Belum ada checkpoint stok")
+            for row in rows:
+                print(f"{row.name}: {row.quantity}")
+        else:
+            drifts = reconcile(conn)
+            for row in drifts:
+                print(f"{row.name}: tercatat {row.recorded}, seharusnya {row.expected} "
+                      f"(selisih {row.drift:+d})")
+            if drifts:
+                raise SystemExit(1)
+            print("Stok sesuai dengan riwayat transaksi")
+    except sqlite3.Error as e:
+        raise SystemExit(f"Gagal: {e}")
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,191 @@
+"""Per-unit databases (one per storeroom) and cross-unit queries.
+
+units.json maps each unit to its own database file:
+
+    {"default": "sarpras-bawah",
+     "units": {"sarpras-bawah": "inventaris.db", "koperasi": "koperasi.db"}}
+
+Each storeroom works on its own small database. Global lookups open one
+connection, ATTACH every unit file read-only and answer with a single
+UNION ALL query, so nothing is copied between units.
+
+    python src/units.py list
+    python src/units.py add koperasi koperasi.db
+    python src/units.py search laptop
+    python src/units.py report
+"""
+import argparse
+import json
+import os
+import sqlite3
+from datetime import datetime
+from urllib.parse import quote
+
+import records
+
+DEFAULT_CONFIG = 'units.json'
+DEFAULT_UNIT = 'sarpras'
+DEFAULT_DB = 'inventaris.db'
+
+# SQLite refuses more attached databases than this by default
+MAX_ATTACHED = 10
+
+SEARCH_COLUMNS = ('id', 'name', 'barcode', 'quantity', 'location', 'condition', 'status')
+REPORT_FIELDS = ('unit', 'items', 'stock', 'on_loan', 'overdue')
+
+
+class UnitError(Exception):
+    """The unit configuration or one of the unit databases is unusable"""
+
+
+def load_units(path=DEFAULT_CONFIG):
+    """({unit: db file}, default unit); a single inventaris.db unit if there is no config"""
+    if not os.path.exists(path):
+        return {DEFAULT_UNIT: DEFAULT_DB}, DEFAULT_UNIT
+    try:
+        with open(path) as f:
+            config = json.load(f)
+    except (OSError, ValueError) as e:
+        raise UnitError(f"Konfigurasi unit tidak dapat dibaca: {e}")
+    units = config.get('units') or {}
+    if not units:
+        raise UnitError(f"Tidak ada unit di {path}")
+    default = config.get('default')
+    if default not in units:
+        default = next(iter(units))
+    return units, default
+
+
+def save_units(units, default, path=DEFAULT_CONFIG):
+    with open(path, 'w') as f:
+        json.dump({'default': default, 'units': units}, f, indent=4)
+
+
+def add_unit(name, db_name, path=DEFAULT_CONFIG):
+    # Without a config the implicit inventaris.db unit is kept as the default
+    units, default = load_units(path)
+    units[name] = db_name
+    save_units(units, default, path)
+    return units
+
+
+def attach_units(units):
+    """One connection with every unit database attached read-only as u0, u1, ...
+
+    Returns (conn, [(unit, schema)]).
+    """
+    if len(units) > MAX_ATTACHED:
+        raise UnitError(f"Paling banyak {MAX_ATTACHED} unit dapat dicari sekaligus")
+    conn = sqlite3.connect('file::memory:', uri=True)
+    schemas = []
+    try:
+        for index, (unit, db_name) in enumerate(units.items()):
+            if not os.path.exists(db_name):
+                raise UnitError(f"Database unit '{unit}' tidak ditemukan: {db_name}")
+            schema = f'u{index}'
+            conn.execute('ATTACH DATABASE ? AS ' + schema,
+                         (f'file:{quote(os.path.abspath(db_name))}?mode=ro',))
+            schemas.append((unit, schema))
+    except UnitError:
+        conn.close()
+        raise
+    except sqlite3.Error as e:
+        conn.close()
+        raise UnitError(str(e))
+    return conn, schemas
+
+
+def _union_query(conn, schemas, template, params, order_by=''):
+    """Run template (with {schema} and {unit} placeholders) over every unit as one UNION ALL"""
+    parts, bound = [], {}
+    for index, (unit, schema) in enumerate(schemas):
+        parts.append(template.format(schema=schema, unit=f':unit{index} AS unit'))
+        bound[f'unit{index}'] = unit
+    bound.update(params)
+    query = ' UNION ALL '.join(parts)
+    if order_by:
+        query += f' ORDER BY {order_by}'
+    try:
+        return conn.execute(query, bound)
+    except sqlite3.OperationalError as e:
+        raise UnitError(f"{e} (buka setiap unit sekali dengan aplikasi versi terbaru)")
+
+
+def search_units(units, search_term=None, columns=SEARCH_COLUMNS):
+    """Active items matching search_term in every unit, as records with a leading unit field"""
+    record = records.record_type('UnitItem', ('unit',) + tuple(columns))
+    condition = ''
+    if search_term:
+        condition = 'AND (name LIKE :term OR barcode LIKE :term)'
+    template = (f"SELECT {{unit}}, {', '.join(columns)} FROM {{schema}}.items "
+                f"WHERE deleted_at IS NULL {condition}")
+    conn, schemas = attach_units(units)
+    try:
+        cursor = _union_query(conn, schemas, template, {'term': f'%{search_term}%'},
+                              order_by='name COLLATE NOCASE, unit')
+        return [record._make(row) for row in cursor]
+    finally:
+        conn.close()
+
+
+def unit_report(units, today=None):
+    """Items, units in stock, units on loan and overdue loans per unit"""
+    today = today or datetime.now().strftime('%Y-%m-%d')
+    record = records.record_type('UnitReport', REPORT_FIELDS)
+    template = '''
+        SELECT {unit},
+            (SELECT COUNT(*) FROM {schema}.items WHERE deleted_at IS NULL),
+            (SELECT COALESCE(SUM(quantity), 0) FROM {schema}.items WHERE deleted_at IS NULL),
+            (SELECT COALESCE(SUM(quantity), 0) FROM {schema}.transactions
+             WHERE type = 'borrow' AND returned = 0),
+            (SELECT COUNT(*) FROM {schema}.transactions
+             WHERE type = 'borrow' AND returned = 0 AND due_date < :today)
+    '''
+    conn, schemas = attach_units(units)
+    try:
+        return [record._make(row) for row in _union_query(conn, schemas, template, {'today': today})]
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Kelola unit gudang dan cari di semua unit")
+    parser.add_argument('--config', default=DEFAULT_CONFIG)
+    sub = parser.add_subparsers(dest='action', required=True)
+    sub.add_parser('list')
+    add = sub.add_parser('add')
+    add.add_argument('name')
+    add.add_argument('db')
+    default = sub.add_parser('default')
+    default.add_argument('name')
+    search = sub.add_parser('search')
+    search.add_argument('term', nargs='?')
+    sub.add_parser('report')
+    args = parser.parse_args()
+
+    try:
+        if args.action == 'add':
+            add_unit(args.name, args.db, args.config)
+        elif args.action == 'default':
+            units, _ = load_units(args.config)
+            if args.name not in units:
+                raise UnitError(f"Unit tidak dikenal: {args.name}")
+            save_units(units, args.name, args.config)
+
+        units, default_unit = load_units(args.config)
+        if args.action in ('list', 'add', 'default'):
+            for name, db_name in units.items():
+                print(f"{'*' if name == default_unit else ' '} {name}: {db_name}")
+        elif args.action == 'search':
+            for row in search_units(units, args.term):
+                print(f"[{row.unit}] {row.name} ({row.barcode}) jumlah {row.quantity}, {row.location}")
+        else:
+            for row in unit_report(units):
+                print(f"{row.unit}: {row.items} barang, stok {row.stock}, "
+                      f"dipinjam {row.on_loan}, terlambat {row.overdue}")
+    except UnitError as e:
+        raise SystemExit(f"Gagal: {e}")
+
+
+if __name__ == '__main__':
+    main()
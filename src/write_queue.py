@@ -0,0 +1,122 @@
+"""Group commit: writes arriving close together share one transaction.
+
+A single writer thread takes queued writes, waits up to batch_window
+seconds for more (at most max_batch) and runs them all inside one
+BEGIN IMMEDIATE ... COMMIT, so a burst of scans and returns pays for one
+commit and one fsync instead of one each. Every write gets its own
+SAVEPOINT: a failing write is rolled back alone and its caller gets the
+exception, while the others in the batch are committed.
+
+The server uses WriteBatcher for every desk. GroupCommitDatabaseHandler
+does the same for one process with several threads writing, e.g. a
+bulk importer. A desk writes from the Tk thread only, one write at a
+time, so there is nothing for it to group. A longer batch_window gives
+bigger batches but slower answers. The durability setting of
+DatabaseHandler picks how hard each commit is flushed to disk.
+"""
+import queue
+import threading
+
+import units
+from inventaris_barang import DatabaseHandler
+
+# Seconds the writer waits for more writes before committing
+DEFAULT_BATCH_WINDOW = 0.005
+DEFAULT_MAX_BATCH = 100
+
+
+class _PendingWrite:
+    def __init__(self, method, args):
+        self.method = method
+        self.args = args
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class WriteBatcher:
+    """Single writer thread that commits queued writes in batches"""
+
+    def __init__(self, db, batch_window=DEFAULT_BATCH_WINDOW, max_batch=DEFAULT_MAX_BATCH):
+        self.db = db
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='inventory-writer', daemon=True)
+        self._thread.start()
+
+    def submit(self, method, args):
+        """Queue a write and block until its batch has been committed"""
+        pending = _PendingWrite(method, args)
+        self._queue.put(pending)
+        pending.done.wait()
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def stop(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def _collect_batch(self):
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        while len(batch) < self.max_batch:
+            try:
+                pending = self._queue.get(timeout=self.batch_window)
+            except queue.Empty:
+                break
+            if pending is None:
+                self._queue.put(None)
+                break
+            batch.append(pending)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            if batch is None:
+                return
+            try:
+                self.db._run_write(lambda cursor: self._apply(cursor, batch))
+            except Exception as e:
+                # The commit itself failed, so none of the batch was stored
+                for pending in batch:
+                    pending.result = None
+                    pending.error = e
+            for pending in batch:
+                pending.done.set()
+
+    def _apply(self, cursor, batch):
+        for index, pending in enumerate(batch):
+            savepoint = f'w{index}'
+            cursor.execute(f'SAVEPOINT {savepoint}')
+            try:
+                do = getattr(self.db, f'_do_{pending.method}')
+                pending.result = do(cursor, *pending.args)
+                pending.error = None
+            except Exception as e:
+                cursor.execute(f'ROLLBACK TO {savepoint}')
+                pending.result = None
+                pending.error = e
+            cursor.execute(f'RELEASE {savepoint}')
+
+
+class GroupCommitDatabaseHandler(DatabaseHandler):
+    """DatabaseHandler whose writes are committed in groups by a WriteBatcher"""
+
+    def __init__(self, db_name=units.DEFAULT_DB,
+                 batch_window=DEFAULT_BATCH_WINDOW, max_batch=DEFAULT_MAX_BATCH, **kwargs):
+        super().__init__(db_name, **kwargs)
+        self.writer = WriteBatcher(self, batch_window, max_batch)
+
+    def _write(self, operation, *args):
+        # Blocks until the batch holding this write is committed
+        return self.writer.submit(operation, args)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.stop()
+            self.writer = None
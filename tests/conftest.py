@@ -0,0 +1,85 @@
+import os
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, 'src'))
+
+from inventaris_barang import DatabaseHandler  # noqa: E402
+
+
+# Schema of the first release, before any migration
+BASELINE_SCHEMA = '''
+CREATE TABLE items (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    barcode TEXT UNIQUE,
+    quantity INTEGER NOT NULL,
+    location TEXT,
+    condition TEXT,
+    status TEXT,
+    photo_path TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE transactions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    item_id INTEGER NOT NULL,
+    type TEXT NOT NULL,
+    borrower TEXT NOT NULL,
+    purpose TEXT,
+    date TEXT NOT NULL,
+    due_date TEXT,
+    returned INTEGER DEFAULT 0,
+    quantity INTEGER DEFAULT 1,
+    FOREIGN KEY (item_id) REFERENCES items (id)
+);
+'''
+
+
+class QuietHandler(DatabaseHandler):
+    """Handler that collects errors instead of opening a message box"""
+
+    def __init__(self, *args, **kwargs):
+        self.errors = []
+        super().__init__(*args, **kwargs)
+
+    def report_error(self, title, message):
+        self.errors.append((title, message))
+
+
+def new_item(db, name='Proyektor', quantity=10, barcode=None):
+    return db.add_item({
+        'name': name, 'barcode': barcode, 'quantity': quantity, 'location': 'Gudang',
+        'condition': 'Baik', 'status': 'Tersedia', 'photo_path': None,
+    })
+
+
+def borrow(db, item_id, quantity=1, date='2025-03-01', due_date='2025-03-08'):
+    return db.add_transaction({
+        'item_id': item_id, 'type': 'borrow', 'borrower': 'Budi', 'purpose': 'Rapat',
+        'date': date, 'due_date': due_date, 'quantity': quantity,
+    })
+
+
+def baseline_database(path, items=(), transactions=()):
+    """A first-release database file holding the given rows"""
+    conn = sqlite3.connect(path)
+    conn.executescript(BASELINE_SCHEMA)
+    conn.executemany('INSERT INTO items (id, name, quantity, status, created_at) VALUES (?, ?, ?, ?, ?)', items)
+    conn.executemany('''
+    INSERT INTO transactions (id, item_id, type, borrower, purpose, date, due_date, returned, quantity)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', transactions)
+    conn.commit()
+    conn.close()
+    return str(path)
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    # Barcode images and backups are written next to the database
+    monkeypatch.chdir(tmp_path)
+    handler = QuietHandler(str(tmp_path / 'inventaris.db'))
+    yield handler
+    handler.close()
@@ -0,0 +1,45 @@
+import sqlite3
+
+import pytest
+
+from conftest import QuietHandler, baseline_database, borrow, new_item
+
+analytics = pytest.importorskip('analytics')
+
+ITEMS = [(1, 'Proyektor', 2, 'Tersedia', '2025-01-10 08:00:00')]
+# Borrowed 1 March due 3 March: back on 2 March, and a second one on 10 March
+TRANSACTIONS = [
+    (1, 1, 'borrow', 'Budi', 'Rapat', '2025-03-01', '2025-03-03', 1, 1),
+    (2, 1, 'borrow', 'Budi', 'Rapat', '2025-03-01', '2025-03-03', 1, 1),
+    (3, 1, 'return', 'System', 'Pengembalian barang', '2025-03-02', None, 0, 1),
+    (4, 1, 'return', 'System', 'Pengembalian barang', '2025-03-10', None, 0, 1),
+]
+
+
+def test_durations_on_a_migrated_database(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    path = baseline_database(tmp_path / 'lama.db', ITEMS, TRANSACTIONS)
+    db = QuietHandler(path)
+    # Later edits restamp the rows; they must not move the return dates
+    data = db.get_item(1)._asdict()
+    data['location'] = 'Lab Komputer'
+    db.update_item(1, data)
+    db.archive_transactions(0)
+
+    conn = sqlite3.connect(path)
+    report = analytics.analyse(conn, '2025-03-01', '2025-03-31')
+    conn.close()
+
+    assert report['durations']['loans'] == 2
+    assert report['durations']['mean_days'] == 5.0
+    assert report['borrowers'][0]['loans'] == 2
+    assert report['borrowers'][0]['overdue'] == 1
+
+
+def test_return_date_is_recorded(db):
+    item_id = new_item(db, quantity=3)
+    loan_id = borrow(db, item_id, date='2025-03-01', due_date='2025-03-03')
+    return_id = db.process_return(loan_id, 'Pengembalian barang')
+
+    loans = {row.id: row for row in db.list_transactions(columns=('id', 'date', 'returned_at'))}
+    assert loans[loan_id].returned_at == loans[return_id].date
@@ -0,0 +1,26 @@
+from datetime import date, timedelta
+
+from conftest import borrow, new_item
+
+
+def test_long_loan_returned_today_stays_hot(db):
+    item_id = new_item(db)
+    long_ago = (date.today() - timedelta(days=400)).isoformat()
+    loan_id = borrow(db, item_id, date=long_ago, due_date=long_ago)
+    db.process_return(loan_id, 'Pengembalian barang')
+
+    assert db.archive_transactions(365) == 0
+    assert len(db.list_transactions()) == 2
+
+
+def test_loan_closed_before_the_cutoff_is_archived(db):
+    item_id = new_item(db)
+    long_ago = (date.today() - timedelta(days=400)).isoformat()
+    loan_id = borrow(db, item_id, date=long_ago, due_date=long_ago)
+    db.process_return(loan_id, 'Pengembalian barang')
+
+    # Returned today: closed before a cutoff of tomorrow, not of today
+    assert db.archive_transactions(0) == 0
+    assert db.archive_transactions(-1) == 2
+    assert db.list_transactions() == []
+    assert len(db.list_transactions(include_archive=True)) == 2
@@ -0,0 +1,25 @@
+import os
+
+from backup import BackupManager, verify_database
+from conftest import new_item
+
+
+def test_backups_in_the_same_second_are_all_kept(db):
+    new_item(db)
+    manager = BackupManager(db.db_name, keep=5)
+
+    paths = [manager.online_backup() for _ in range(3)]
+
+    assert len(set(paths)) == 3
+    assert manager.list_backups() == sorted(paths, reverse=True)
+    assert all(verify_database(path) for path in paths)
+
+
+def test_backups_go_next_to_the_database(db, tmp_path, monkeypatch):
+    elsewhere = tmp_path / 'elsewhere'
+    elsewhere.mkdir()
+    monkeypatch.chdir(elsewhere)
+
+    path = BackupManager(db.db_name).snapshot()
+
+    assert os.path.dirname(path) == str(tmp_path / 'backups')
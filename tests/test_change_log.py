@@ -0,0 +1,47 @@
+import sqlite3
+
+import change_log
+from conftest import borrow, new_item
+from maintenance import MaintenanceManager
+
+
+def log(db):
+    conn = sqlite3.connect(db.db_name)
+    try:
+        return conn.execute('SELECT seq, table_name FROM change_log ORDER BY seq').fetchall()
+    finally:
+        conn.close()
+
+
+def test_maintenance_keeps_the_log_short_without_exports(db):
+    item_id = new_item(db, 'Kursi')
+    borrow(db, item_id)
+    for quantity in range(1, 6):
+        db.update_items([item_id], {'location': f'Ruang {quantity}'})
+    newest = log(db)[-1][0]
+
+    manager = MaintenanceManager(db.db_name, change_log_rows=2)
+    assert 'prune_log' in manager.due(manager.status())
+    manager.run(['prune_log'])
+
+    # The newest two, plus the last transactions entry the report cache counts
+    assert [table for _, table in log(db)] == ['transactions', 'items', 'items']
+    assert log(db)[-1][0] == newest
+    assert 'prune_log' not in manager.due(manager.status())
+
+
+def test_target_behind_the_pruned_entries_gets_a_full_export(db, tmp_path):
+    first = new_item(db, 'Kursi')
+    change_log.export_changes(db.db_name, str(tmp_path / 'a.json'), target='kantor')
+    new_item(db, 'Meja')
+    db.update_items([first], {'location': 'Gudang'})
+    new_item(db, 'Lemari')
+
+    MaintenanceManager(db.db_name, change_log_rows=1).run(['prune_log'])
+    behind = change_log.export_changes(db.db_name, str(tmp_path / 'b.json'), target='kantor')
+    up_to_date = change_log.export_changes(db.db_name, str(tmp_path / 'c.json'), target='kantor')
+
+    assert behind['full'] is True
+    assert [item['name'] for item in behind['items']] == ['Kursi', 'Meja', 'Lemari']
+    assert up_to_date['full'] is False
+    assert up_to_date['items'] == []
@@ -0,0 +1,50 @@
+from conftest import new_item
+from inventaris_barang import EMPTY_FACET
+
+
+def add_item(db, name, location):
+    return db.add_item({
+        'name': name, 'barcode': None, 'quantity': 1, 'location': location,
+        'condition': 'Baik', 'status': 'Tersedia', 'photo_path': None,
+    })
+
+
+def names(db, filters):
+    return sorted(item.name for item in db.iter_items(filters=filters))
+
+
+def test_empty_facet_counts_and_filters_unset_values(db):
+    add_item(db, 'Kursi', None)
+    add_item(db, 'Meja', '')
+    add_item(db, 'Proyektor', 'Lab')
+
+    assert db.item_facets()['location'] == [(EMPTY_FACET, 2), ('Lab', 1)]
+    assert names(db, {'location': EMPTY_FACET}) == ['Kursi', 'Meja']
+    assert names(db, {'location': [EMPTY_FACET, 'Lab']}) == ['Kursi', 'Meja', 'Proyektor']
+    assert names(db, {'location': 'Lab'}) == ['Proyektor']
+
+
+def test_borrower_filter_matches_the_start_of_the_name_through_the_registry(db):
+    item_id = new_item(db)
+    for borrower in ('Pak Budi', 'pak budiman', 'Bu Sari', 'Budi_2'):
+        db.add_transaction({
+            'item_id': item_id, 'type': 'borrow', 'borrower': borrower, 'purpose': 'Rapat',
+            'date': '2025-03-01', 'due_date': '2025-03-08', 'quantity': 1,
+        })
+    loan = db.list_transactions(filters={'borrower': 'Bu Sari'})[0]
+    db.process_return(loan.id, 'Pengembalian barang')
+
+    def borrowers(prefix):
+        return sorted((row.type, row.borrower) for row in db.list_transactions(filters={'borrower': prefix}))
+
+    assert borrowers('PAK BUDI') == [('borrow', 'Pak Budi'), ('borrow', 'pak budiman')]
+    assert borrowers('bu s') == [('borrow', 'Bu Sari'), ('return', 'System')]
+    assert borrowers('Budi_') == [('borrow', 'Budi_2')]
+    assert borrowers('Budi%') == []
+
+    conn = db._connect()
+    plan = ' '.join(row[3] for row in conn.execute(
+        "EXPLAIN QUERY PLAN SELECT id FROM transactions WHERE borrower_id IN "
+        "(SELECT id FROM borrowers WHERE name LIKE 'pak%' ESCAPE '\\')"))
+    conn.close()
+    assert 'SCAN' not in plan
@@ -0,0 +1,84 @@
+import sqlite3
+from datetime import date
+
+import pytest
+
+import invdb_transfer
+from conftest import QuietHandler, borrow
+
+
+def add_item(db, barcode, created_at, quantity=5):
+    item_id = db.add_item({
+        'name': 'Kursi', 'barcode': barcode, 'quantity': quantity, 'location': 'Aula',
+        'condition': 'Baik', 'status': 'Tersedia', 'photo_path': None,
+    })
+    conn = sqlite3.connect(db.db_name)
+    conn.execute('UPDATE items SET created_at = ? WHERE id = ?', (created_at, item_id))
+    conn.commit()
+    conn.close()
+    return item_id
+
+
+@pytest.fixture
+def source(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    db = QuietHandler(str(tmp_path / 'gudang.db'))
+    item_id = add_item(db, 'KRS-1', '2024-01-01 08:00:00')
+    borrow(db, item_id, quantity=2)
+    path = invdb_transfer.export_database(db.db_name, str(tmp_path / 'gudang.invdb'))
+    db.close()
+    return path
+
+
+@pytest.fixture
+def target(tmp_path):
+    db = QuietHandler(str(tmp_path / 'inventaris.db'))
+    add_item(db, 'KRS-1', '2024-06-01 08:00:00')
+    yield db
+    db.close()
+
+
+def test_keep_takes_open_loans_out_of_the_matched_item(source, target):
+    report = invdb_transfer.import_database(target.db_name, source, invdb_transfer.CONFLICT_KEEP)
+    assert report['items_matched'] == 1
+    assert report['stock_adjusted'] == 1
+    assert target.get_item(1).quantity == 3
+
+    # Returning the imported loan brings the stock back to what it was
+    loan = target.list_transactions(open_only=True)[0]
+    target.process_return(loan.id, 'Pengembalian barang')
+    assert target.get_item(1).quantity == 5
+
+
+def test_rename_twice_imports_the_item_once(source, target):
+    for _ in range(2):
+        invdb_transfer.import_database(target.db_name, source, invdb_transfer.CONFLICT_RENAME)
+
+    items = target.list_items()
+    assert len(items) == 2
+    assert sorted(item.quantity for item in items) == [3, 5]
+    assert len(target.list_transactions()) == 1
+
+
+def test_keep_does_not_match_a_deleted_item(source, target):
+    target.delete_item(1)
+
+    report = invdb_transfer.import_database(target.db_name, source, invdb_transfer.CONFLICT_KEEP)
+
+    assert report['items_matched'] == 0
+    assert [(item.barcode, item.quantity) for item in target.list_items()] == [('KRS-1', 3)]
+
+
+def test_closed_loans_keep_the_day_they_were_returned(tmp_path, target):
+    lab = QuietHandler(str(tmp_path / 'lab.db'))
+    loan = borrow(lab, add_item(lab, 'PRJ-1', '2024-01-01 08:00:00'))
+    lab.process_return(loan, 'Pengembalian barang')
+    path = invdb_transfer.export_database(lab.db_name, str(tmp_path / 'lab.invdb'))
+    lab.close()
+
+    invdb_transfer.import_database(target.db_name, path)
+
+    conn = sqlite3.connect(target.db_name)
+    rows = conn.execute("SELECT returned_at FROM transactions WHERE type = 'borrow'").fetchall()
+    conn.close()
+    assert rows == [(date.today().isoformat(),)]
@@ -0,0 +1,19 @@
+import pytest
+
+labels = pytest.importorskip('labels')
+
+
+def test_label_sheet_is_written_from_selected_items(db, tmp_path):
+    item_id = db.add_item({
+        'name': 'Kursi', 'barcode': 'KRS-001', 'quantity': 2, 'location': 'Lab',
+        'condition': 'Baik', 'status': 'Tersedia', 'photo_path': None,
+    })
+    items = labels.select_items(db, [item_id])
+    assert [item.id for item in items] == [item_id]
+
+    # What the app runs off the Tk thread gets the records, not the handler
+    count, rendered = labels.write_label_sheet(items, str(tmp_path / 'label.pdf'), per_unit=True,
+                                               directory=str(tmp_path / 'barcodes'))
+
+    assert (count, rendered) == (2, 1)
+    assert (tmp_path / 'label.pdf').exists()
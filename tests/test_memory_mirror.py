@@ -0,0 +1,36 @@
+import sqlite3
+from datetime import datetime, timezone
+
+import memory_mirror
+from conftest import borrow, new_item
+
+# 2 March 2025, 10:00 local time
+WRITTEN_AT = datetime(2025, 3, 2, 10, 0).timestamp()
+
+
+class QuietMirror(memory_mirror.MirroredDatabaseHandler):
+    def report_error(self, title, message):
+        raise AssertionError(message)
+
+
+def test_replay_uses_the_time_the_write_ran_at(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    path = str(tmp_path / 'inventaris.db')
+    db = QuietMirror(path)
+    item_id = new_item(db)
+    loan_id = borrow(db, item_id, date='2025-03-01', due_date='2025-03-08')
+
+    # Memory runs the writes now; the file gets them later, on another day
+    with monkeypatch.context() as patch:
+        patch.setattr(memory_mirror.time, 'time', lambda: WRITTEN_AT)
+        db.process_return(loan_id, 'Pengembalian barang')
+        db.delete_item(item_id)
+    db.close()
+
+    conn = sqlite3.connect(path)
+    assert conn.execute('SELECT returned_at FROM transactions WHERE id = ?', (loan_id,)).fetchone() == (
+        '2025-03-02',)
+    assert conn.execute("SELECT date FROM transactions WHERE type = 'return'").fetchone() == ('2025-03-02',)
+    assert conn.execute('SELECT deleted_at FROM items').fetchone() == (
+        datetime.fromtimestamp(WRITTEN_AT, timezone.utc).strftime('%Y-%m-%d %H:%M:%S'),)
+    conn.close()
@@ -0,0 +1,67 @@
+import sqlite3
+
+from conftest import QuietHandler, baseline_database, borrow, new_item
+
+ITEMS = [(1, 'Proyektor', 4, 'Tersedia', '2024-01-05 08:00:00')]
+TRANSACTIONS = [
+    (1, 1, 'borrow', 'Budi', 'Rapat', '2024-02-01', '2024-02-03', 1, 1),
+    (2, 1, 'return', 'System', 'Pengembalian barang', '2024-02-02', None, 0, 1),
+]
+
+
+def change_log(path):
+    conn = sqlite3.connect(path)
+    try:
+        rows = conn.execute('SELECT table_name, op FROM change_log ORDER BY seq').fetchall()
+        conn.execute('DELETE FROM change_log')
+        conn.commit()
+        return rows
+    finally:
+        conn.close()
+
+
+def test_migration_keeps_update_stamps_and_logs_nothing(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    path = baseline_database(tmp_path / 'lama.db', ITEMS, TRANSACTIONS)
+    QuietHandler(path)
+    QuietHandler(path)
+
+    conn = sqlite3.connect(path)
+    assert conn.execute('SELECT updated_at FROM items').fetchall() == [('2024-01-05 08:00:00',)]
+    assert conn.execute('SELECT updated_at FROM transactions ORDER BY id').fetchall() == [
+        ('2024-02-01',), ('2024-02-02',)]
+    assert conn.execute('SELECT COUNT(*) FROM transactions WHERE uid IS NULL').fetchone() == (0,)
+    conn.close()
+    assert change_log(path) == []
+
+
+def test_each_write_logs_one_change_per_row(db):
+    item_id = new_item(db)
+    assert change_log(db.db_name) == [('items', 'I')]
+
+    data = db.get_item(item_id)._asdict()
+    data['location'] = 'Lab Komputer'
+    db.update_item(item_id, data)
+    assert change_log(db.db_name) == [('items', 'U')]
+
+    borrow(db, item_id)
+    assert sorted(change_log(db.db_name)) == [('items', 'U'), ('transactions', 'I')]
+
+
+def test_migration_frees_the_barcodes_of_deleted_items(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    path = baseline_database(tmp_path / 'lama.db', ITEMS, TRANSACTIONS)
+    conn = sqlite3.connect(path)
+    conn.execute("UPDATE items SET barcode = 'PRJ-1'")
+    conn.commit()
+    conn.close()
+    db = QuietHandler(path)
+
+    assert db.delete_item(1)
+    assert new_item(db, barcode='PRJ-1') == 2
+    assert db.errors == []
+    # The rebuilt table kept its rows, and its history still points at them
+    conn = sqlite3.connect(path)
+    assert conn.execute('SELECT COUNT(*) FROM transactions WHERE item_id = 1').fetchone() == (2,)
+    assert conn.execute('PRAGMA foreign_key_check').fetchall() == []
+    conn.close()
@@ -0,0 +1,117 @@
+import sqlite3
+from datetime import date
+
+import pytest
+
+import replica_merge
+from conftest import QuietHandler, borrow
+
+
+def add_item(db, barcode, name='Kursi', quantity=5):
+    return db.add_item({
+        'name': name, 'barcode': barcode, 'quantity': quantity, 'location': 'Aula',
+        'condition': 'Baik', 'status': 'Tersedia', 'photo_path': None,
+    })
+
+
+@pytest.fixture
+def stations(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    local = QuietHandler(str(tmp_path / 'bawah.db'))
+    remote = QuietHandler(str(tmp_path / 'koperasi.db'))
+    yield local, remote
+    local.close()
+    remote.close()
+
+
+def test_item_deleted_at_the_other_station_is_deleted_here(stations):
+    local, remote = stations
+    item_id = add_item(remote, 'KRS-1')
+    replica_merge.merge_databases(local.db_name, remote.db_name)
+    assert [item.name for item in local.list_items()] == ['Kursi']
+
+    remote.delete_item(item_id)
+    counts, _ = replica_merge.merge_databases(local.db_name, remote.db_name)
+
+    assert counts['items_deleted'] == 1
+    assert local.list_items() == []
+
+
+def test_deleted_remote_only_item_arrives_deleted(stations):
+    local, remote = stations
+    remote.delete_item(add_item(remote, 'KRS-1'))
+
+    counts, _ = replica_merge.merge_databases(local.db_name, remote.db_name)
+
+    assert counts['items_added'] == 1
+    assert local.list_items() == []
+
+
+def test_barcode_reused_after_a_delete_matches_the_item_in_use(stations):
+    local, remote = stations
+    remote.delete_item(add_item(remote, 'KRS-1', name='Kursi lama'))
+    add_item(remote, 'KRS-1', name='Kursi baru')
+    add_item(local, 'KRS-1', name='Kursi baru')
+
+    counts, _ = replica_merge.merge_databases(local.db_name, remote.db_name)
+
+    assert counts['items_deleted'] == 0
+    assert [item.name for item in local.list_items()] == ['Kursi baru']
+
+
+def test_items_without_barcode_are_merged_once(stations):
+    local, remote = stations
+    add_item(remote, None)
+
+    for _ in range(3):
+        replica_merge.merge_databases(local.db_name, remote.db_name)
+    # ... and come back to their own station as the same item
+    counts, _ = replica_merge.merge_databases(remote.db_name, local.db_name)
+
+    assert [item.name for item in local.list_items()] == ['Kursi']
+    assert [item.name for item in remote.list_items()] == ['Kursi']
+    assert counts['items_added'] == 0
+
+
+def test_copies_made_before_items_had_uids_still_match(stations):
+    local, remote = stations
+    add_item(remote, None)
+    replica_merge.merge_databases(local.db_name, remote.db_name)
+    # Both sides stamped their own uid on the copies when they were migrated
+    conn = sqlite3.connect(local.db_name)
+    conn.execute("UPDATE items SET uid = 'bawah:1'")
+    conn.commit()
+    conn.close()
+
+    counts, _ = replica_merge.merge_databases(local.db_name, remote.db_name)
+
+    assert counts['items_added'] == 0
+    assert len(local.list_items()) == 1
+
+
+def returned_at(db):
+    conn = sqlite3.connect(db.db_name)
+    try:
+        return conn.execute(
+            "SELECT returned, returned_at FROM transactions WHERE type = 'borrow' ORDER BY date"
+        ).fetchall()
+    finally:
+        conn.close()
+
+
+def test_merged_loans_keep_the_day_they_were_returned(stations):
+    local, remote = stations
+    item_id = add_item(remote, 'KRS-1')
+    returned = borrow(remote, item_id, date='2025-03-01')
+    remote.process_return(returned, 'Pengembalian barang')
+    still_out = borrow(remote, item_id, date='2025-03-02')
+    replica_merge.merge_databases(local.db_name, remote.db_name)
+    today = date.today().isoformat()
+    assert returned_at(local) == [(1, today), (0, None)]
+
+    # Closed at the other station after it was copied here
+    remote.process_return(still_out, 'Pengembalian barang')
+    counts, _ = replica_merge.merge_databases(local.db_name, remote.db_name)
+
+    assert counts['returns_applied'] == 1
+    assert returned_at(local) == [(1, today), (1, today)]
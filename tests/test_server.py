@@ -0,0 +1,53 @@
+import threading
+
+import pytest
+
+import inventory_server
+from conftest import new_item
+
+
+class QuietRemote(inventory_server.RemoteDatabaseHandler):
+    def __init__(self, *args, **kwargs):
+        self.errors = []
+        super().__init__(*args, **kwargs)
+
+    def report_error(self, title, message):
+        self.errors.append((title, message))
+
+
+@pytest.fixture
+def server(db, monkeypatch):
+    monkeypatch.delenv(inventory_server.TOKEN_ENV, raising=False)
+    new_item(db, 'Kursi')
+    server = inventory_server.InventoryServer(('127.0.0.1', 0), db, token='rahasia')
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_address[1]}'
+    server.shutdown()
+    server.server_close()
+
+
+def test_desk_with_the_token_is_served(server):
+    remote = QuietRemote(server, token='rahasia')
+
+    assert [item.name for item in remote.list_items()] == ['Kursi']
+    assert remote.errors == []
+
+
+@pytest.mark.parametrize('token', [None, 'salah'])
+def test_requests_without_the_token_are_refused(server, db, token):
+    remote = QuietRemote(server, token=token)
+
+    assert remote.list_items() == []
+    remote.delete_item(1)
+    assert remote.errors == [("Server Error", "Token server salah atau tidak ada"),
+                             ("Database Error", "Token server salah atau tidak ada")]
+    assert [item.name for item in db.list_items()] == ['Kursi']
+
+
+@pytest.mark.parametrize('host, local', [
+    ('127.0.0.1', True), ('localhost', True), ('::1', True),
+    ('0.0.0.0', False), ('192.168.1.10', False), ('server-sarpras', False),
+])
+def test_only_loopback_hosts_count_as_local(host, local):
+    assert inventory_server.is_local_host(host) is local
@@ -0,0 +1,161 @@
+import os
+import shutil
+
+import pytest
+from tkinter import filedialog, messagebox
+
+import soak_test
+from conftest import new_item
+
+
+class Entry:
+    def __init__(self, values=()):
+        self.text = ''
+        self.values = values
+
+    def __getitem__(self, key):
+        return self.values
+
+    def delete(self, first, last):
+        self.text = ''
+
+    def insert(self, index, text):
+        self.text = text
+
+    def set(self, text):
+        self.text = text
+
+    def get(self):
+        return self.text
+
+
+class Tree:
+    def __init__(self):
+        self.rows = ()
+        self.selected = None
+
+    def get_children(self):
+        return self.rows
+
+    def selection_set(self, row):
+        self.selected = row
+
+
+class Window:
+    def withdraw(self):
+        pass
+
+
+class Root:
+    def update(self):
+        pass
+
+
+class DeskApp:
+    """The parts of InventoryApp the runner drives, on a real database"""
+
+    def __init__(self, db, borrowing_works=True):
+        self.db = db
+        self.borrowing_works = borrowing_works
+        self.root = Root()
+        self.search_entry = Entry()
+        self.results_tree = Tree()
+        self.detail_loading = False
+        self.detail_window = Window()
+        self.borrow_item_combobox = Entry()
+        self.borrower_entry = Entry()
+        self.purpose_entry = Entry()
+        self.return_trans_combobox = Entry()
+        self.exported = []
+        self.refresh()
+
+    def refresh(self):
+        self.borrow_item_combobox.values = tuple(
+            f"{item.name} (ID: {item.id})" for item in self.db.list_items() if item.quantity > 0)
+        self.return_trans_combobox.values = tuple(
+            f"{row.borrower} (ID: {row.id})" for row in self.db.list_transactions(open_only=True))
+
+    def search_items(self):
+        self.results_tree.rows = tuple(str(item.id) for item in self.db.list_items())
+
+    def view_item_details(self):
+        self.detail_loading = False
+
+    def process_borrowing(self):
+        item_id = int(self.borrow_item_combobox.get().split('ID: ')[1].rstrip(')'))
+        if not self.borrowing_works:
+            messagebox.showerror("Error", "Gagal mencatat peminjaman")
+            return
+        self.db.add_transaction({
+            'item_id': item_id, 'type': 'borrow', 'borrower': self.borrower_entry.get(),
+            'purpose': self.purpose_entry.get(), 'date': '2025-03-01', 'due_date': '2025-03-08', 'quantity': 1,
+        })
+        self.refresh()
+
+    def process_return(self):
+        trans_id = int(self.return_trans_combobox.get().split('ID: ')[1].rstrip(')'))
+        self.db.process_return(trans_id, 'Pengembalian barang')
+        self.refresh()
+
+    def export_to_json(self):
+        self.exported.append('json')
+
+    def export_to_pdf(self):
+        self.exported.append('pdf')
+
+    def export_to_spreadsheet(self):
+        self.exported.append('xlsx')
+
+
+@pytest.fixture
+def dialogs(tmp_path, monkeypatch):
+    # Let monkeypatch put back what Dialogs.install replaces
+    for name in ('showinfo', 'showwarning', 'showerror', 'askyesno'):
+        monkeypatch.setattr(messagebox, name, getattr(messagebox, name))
+    monkeypatch.setattr(filedialog, 'asksaveasfilename', filedialog.asksaveasfilename)
+    dialogs = soak_test.Dialogs(str(tmp_path))
+    dialogs.install()
+    return dialogs
+
+
+def soak(app, dialogs, cycles=6):
+    runner = soak_test.SoakRunner(app, dialogs, seed=1, export_every=2)
+    samples, _ = soak_test.soak(runner, cycles, 2, lambda number: dict.fromkeys(soak_test.METRICS, 0))
+    limits = {key: 0 for key in soak_test.METRICS}
+    return runner, samples, soak_test.judge(samples, limits, len(dialogs.errors))
+
+
+def test_cycles_borrow_return_and_rotate_exports(db, dialogs):
+    new_item(db, 'Kursi', quantity=3)
+    new_item(db, 'Meja', quantity=3)
+    app = DeskApp(db)
+
+    runner, samples, failures = soak(app, dialogs)
+
+    assert len(samples) == 4
+    assert app.exported == ['json', 'pdf', 'xlsx']
+    assert runner.exports == 3
+    assert app.results_tree.selected is not None
+    assert len(db.list_transactions(filters={'type': 'borrow'})) == 6
+    assert len(db.list_transactions(filters={'type': 'return'})) == 6
+    assert failures == {}
+
+
+def test_error_messages_fail_the_run(db, dialogs):
+    new_item(db, 'Kursi', quantity=3)
+    app = DeskApp(db, borrowing_works=False)
+
+    _, _, failures = soak(app, dialogs)
+
+    assert dialogs.errors == ["Gagal mencatat peminjaman"] * 6
+    assert failures == {'dialog_errors': 6}
+
+
+@pytest.mark.skipif(not os.environ.get('DISPLAY') and not shutil.which('Xvfb'),
+                    reason="butuh DISPLAY atau Xvfb")
+def test_real_app_survives_a_few_cycles(tmp_path, dialogs):
+    # run() installs its own Dialogs; the fixture only restores the originals
+    report = soak_test.run(str(tmp_path / 'kosong.db'), cycles=6, sample_every=2, export_every=2, seed=1)
+
+    assert report['dialog_errors'] == 0, report['first_errors']
+    assert report['exports'] == 3
@@ -0,0 +1,26 @@
+from conftest import new_item
+
+
+def test_deleted_item_gives_its_barcode_back(db):
+    old = new_item(db, 'Kursi lama', barcode='KRS-1')
+    assert new_item(db, 'Kursi kedua', barcode='KRS-1') is None
+    db.errors.clear()
+
+    db.delete_item(old)
+    new = new_item(db, 'Kursi baru', barcode='KRS-1')
+
+    assert new is not None and db.errors == []
+    assert [item.name for item in db.list_items()] == ['Kursi baru']
+
+
+def test_import_skips_only_barcodes_still_in_use(db):
+    db.delete_item(new_item(db, 'Kursi lama', barcode='KRS-1'))
+    new_item(db, 'Meja', barcode='MJ-1')
+
+    imported, duplicates, failed = db.import_items([
+        {'name': 'Kursi baru', 'barcode': 'KRS-1', 'quantity': 3},
+        {'name': 'Meja', 'barcode': 'MJ-1', 'quantity': 1},
+    ])
+
+    assert (imported, duplicates, failed) == (1, 1, [])
+    assert sorted(item.name for item in db.list_items()) == ['Kursi baru', 'Meja']
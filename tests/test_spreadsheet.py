@@ -0,0 +1,33 @@
+import sqlite3
+
+import pytest
+
+import spreadsheet
+
+
+@pytest.mark.parametrize('text', ['inf', '-inf', '1e400', 'nan', '1e30', '-1', '2.5', 'dua'])
+def test_invalid_quantity_is_reported_per_row(text):
+    with pytest.raises(ValueError):
+        spreadsheet.parse_item_row(['Kursi', text], {0: 'name', 1: 'quantity'}, 2, lambda row: f'B{row}')
+
+
+@pytest.mark.parametrize('text, quantity', [('3', 3), ('3.0', 3), (' 12 ', 12)])
+def test_whole_quantities_are_accepted(text, quantity):
+    row = spreadsheet.parse_item_row(['Kursi', text], {0: 'name', 1: 'quantity'}, 2, lambda row: f'B{row}')
+    assert row['quantity'] == quantity
+
+
+def test_rows_rejected_by_the_database_are_reported(db, tmp_path):
+    conn = sqlite3.connect(db.db_name)
+    conn.execute('''
+    CREATE TRIGGER tolak_rusak BEFORE INSERT ON items WHEN NEW.name = 'Rusak'
+    BEGIN SELECT RAISE(ABORT, 'barang ditolak'); END
+    ''')
+    conn.close()
+    path = tmp_path / 'barang.csv'
+    path.write_text('Nama Barang,Jumlah\nRusak,1\nKursi,dua\nMeja,2\nLemari,1\n', encoding='utf-8')
+
+    report = spreadsheet.import_items(db, str(path), lambda row: f'B{row}', chunk_size=2)
+
+    assert report.imported == 2
+    assert report.errors == [(2, 'barang ditolak'), (3, "Jumlah tidak valid: 'dua'")]
@@ -0,0 +1,31 @@
+import sqlite3
+from datetime import date
+
+import stock_history
+from conftest import borrow, new_item
+
+
+def test_item_created_after_the_checkpoint_is_included(db):
+    old_id = new_item(db, name='Meja', quantity=4)
+    conn = sqlite3.connect(db.db_name)
+    with conn:
+        conn.execute("UPDATE items SET created_at = '2024-12-01 09:00:00' WHERE id = ?", (old_id,))
+    with conn:
+        conn.execute('BEGIN IMMEDIATE')
+        stock_history.take_checkpoint(conn.cursor(), as_of='2025-01-01')
+
+    new_id = new_item(db, name='Proyektor', quantity=10)
+    with conn:
+        conn.execute("UPDATE items SET created_at = '2025-01-05 09:00:00' WHERE id = ?", (new_id,))
+    loan_id = borrow(db, new_id, quantity=2, date='2025-01-10', due_date='2025-01-20')
+
+    def stock(day):
+        return {row.item_id: row.quantity for row in stock_history.stock_on(conn, day)}
+
+    assert stock('2025-01-04') == {old_id: 4}
+    assert stock('2025-01-07') == {old_id: 4, new_id: 10}
+    assert stock('2025-01-12') == {old_id: 4, new_id: 8}
+    db.process_return(loan_id, 'Pengembalian barang')
+    assert stock(date.today().isoformat()) == {old_id: 4, new_id: 10}
+    assert [row.quantity for row in stock_history.stock_on(conn, '2025-01-12', new_id)] == [8]
+    conn.close()
@@ -0,0 +1,48 @@
+import pytest
+
+from conftest import borrow, new_item
+from inventaris_barang import StaleItemError
+
+
+def edit_form(db, item_id):
+    """Item data as the edit form sends it: read once, changed, saved"""
+    item = db.get_item(item_id)
+    data = item._asdict()
+    data['original_quantity'] = item.quantity
+    return data
+
+
+def test_edit_keeps_borrows_made_while_the_form_was_open(db):
+    item_id = new_item(db, quantity=10)
+    data = edit_form(db, item_id)
+    borrow(db, item_id, quantity=3)
+
+    data['location'] = 'Lab Komputer'
+    assert db.update_item(item_id, data)
+
+    item = db.get_item(item_id)
+    assert item.location == 'Lab Komputer'
+    assert item.quantity == 7
+
+
+def test_quantity_change_after_a_borrow_is_rejected(db):
+    item_id = new_item(db, quantity=10)
+    data = edit_form(db, item_id)
+    borrow(db, item_id, quantity=3)
+
+    data['quantity'] = 12
+    with pytest.raises(StaleItemError):
+        db._write('update_item', item_id, data)
+    assert not db.update_item(item_id, data)
+    assert db.errors
+    assert db.get_item(item_id).quantity == 7
+
+
+def test_quantity_change_on_a_fresh_read_is_saved(db):
+    item_id = new_item(db, quantity=10)
+    borrow(db, item_id, quantity=3)
+    data = edit_form(db, item_id)
+
+    data['quantity'] = 12
+    assert db.update_item(item_id, data)
+    assert db.get_item(item_id).quantity == 12
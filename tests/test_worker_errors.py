@@ -0,0 +1,23 @@
+import threading
+
+import inventaris_barang
+from inventaris_barang import DatabaseHandler, InventoryApp
+
+
+def test_errors_on_a_worker_thread_are_collected(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    shown = []
+    monkeypatch.setattr(inventaris_barang.messagebox, 'showerror', lambda *args: shown.append(args))
+    db = DatabaseHandler(str(tmp_path / 'inventaris.db'))
+    monkeypatch.setattr(db, 'get_item', lambda item_id: db.report_error("Database Error", "disk I/O error"))
+
+    result = {}
+    worker = threading.Thread(target=lambda: result.update(InventoryApp.fetch_item_details(db, 1)))
+    worker.start()
+    worker.join()
+
+    assert shown == []
+    assert result['errors'] == [("Database Error", "disk I/O error")]
+    # Outside collect_errors the handler shows them as before
+    db.report_error("Database Error", "disk I/O error")
+    assert shown == [("Database Error", "disk I/O error")]